@@ -8,11 +8,21 @@
 
 import os
 import logging
+import tempfile
 import psycopg2
 from datetime import datetime, timedelta
 from airflow import DAG
+from airflow.datasets import Dataset
 from airflow.operators.python import PythonOperator, BranchPythonOperator
 from airflow.operators.bash import BashOperator
+from airflow.exceptions import AirflowException
+from airflow.models import Variable
+from soda_runner import run_quality_checks
+from quality_incremental import (
+    has_partition_checkpoints,
+    run_incremental_checks,
+    write_residual_checks,
+)
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -46,65 +56,104 @@ checks_path = os.path.join(
     soda_dir, "checks"
 )  # checks_directory = "/opt/airflow/soda/checks"
 
+# Nombre de sessions de scan Soda exécutées en parallèle (une connexion chacune)
+soda_max_workers = int(os.getenv("SODA_MAX_WORKERS", "2"))
 
-# Fonction pour vérifier l'existence de la base de données
-def check_database_exists():
+# Mode incrémental : les tables de faits ne sont vérifiées que sur les mois chargés depuis
+# le dernier scan réussi, les métriques des autres mois venant du cache dq_partition_metrics
+soda_incremental = os.getenv("SODA_INCREMENTAL", "true").lower() == "true"
+incremental_tables = ["fact_yellow_taxi"]
+
+# Dataset mis à jour par le DAG taxi_pipeline : les contrôles ne tournent qu'après un chargement
+datamart_dataset = Dataset("postgres://db-datamart/tp_datamart")
+
+# Variable Airflow mémorisant l'activité (n_changes) des tables au dernier scan réussi
+soda_state_variable = "soda_quality_table_state"
+
+
+# Connexion au data mart (une seule par tâche)
+def connect_to_datamart():
+    return psycopg2.connect(
+        host=dm_dbms_ip,
+        port=dm_dbms_port,
+        user=dm_dbms_username,
+        password=dm_dbms_password,
+        dbname=dm_dbms_database,
+    )
+
+
+# Requête unique sur le catalogue : existence, lignes estimées et activité de chaque table
+def preflight_catalog():
     try:
-        conn = psycopg2.connect(
-            host=dm_dbms_ip,
-            port=dm_dbms_port,
-            user=dm_dbms_username,
-            password=dm_dbms_password,
-            dbname=dm_dbms_database,
-        )
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        logging.info("La base de données est accessible.")
-        conn.close()
-        return True
+        conn = connect_to_datamart()
     except Exception as e:
         logging.error(f"Erreur lors de la connexion à la base de données : {e}")
-        return False
+        return None
 
-
-# Fonction pour vérifier l'existence des tables spécifiques dans la base de données
-def check_tables_exists():
     try:
-        conn = psycopg2.connect(
-            host=dm_dbms_ip,
-            port=dm_dbms_port,
-            user=dm_dbms_username,
-            password=dm_dbms_password,
-            dbname=dm_dbms_database,
-        )
         cursor = conn.cursor()
-
-        # Vérifier l'existence de chaque table
-        for table in table_tasks:
-            cursor.execute(f"SELECT to_regclass('public.{table}')")
-            result = cursor.fetchone()
-            if result[0] is None:
-                logging.error(f"Table {table} n'existe pas.")
-                conn.close()
-                return False
+        cursor.execute(
+            """
+            SELECT c.relname,
+                   -- NULL si la table n'a jamais été analysée ni écrite (estimation inconnue)
+                   CASE WHEN c.reltuples < 0 AND COALESCE(s.n_live_tup, 0) = 0 THEN NULL
+                        ELSE GREATEST(c.reltuples, COALESCE(s.n_live_tup, 0))::BIGINT
+                   END AS estimated_rows,
+                   GREATEST(s.last_analyze, s.last_autoanalyze) AS last_analyzed_at,
+                   COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0) AS n_changes
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND c.relname = ANY(%s)
+            """,
+            (table_tasks,),
+        )
+        found = {row[0]: row for row in cursor.fetchall()}
+
+        # Une estimation nulle ne suffit pas (table jamais analysée, statistiques remises à
+        # zéro) : la table n'est déclarée vide qu'après lecture d'une ligne au plus
+        empty = set()
+        for table, row in found.items():
+            if row[1] == 0:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table} LIMIT 1)")
+                if not cursor.fetchone()[0]:
+                    empty.add(table)
+        cursor.close()
+    finally:
         conn.close()
-        return True
-    except Exception as e:
-        logging.error(f"Erreur lors de la vérification des tables : {e}")
-        return False
+
+    # Résultat sérialisable pour XCom
+    catalog = {}
+    for table in table_tasks:
+        row = found.get(table)
+        estimated_rows = int(row[1]) if row and row[1] is not None else None
+        if estimated_rows == 0 and table not in empty:
+            estimated_rows = None
+        catalog[table] = {
+            "exists": row is not None,
+            "estimated_rows": estimated_rows,
+            "last_analyzed_at": row[2].isoformat() if row and row[2] else None,
+            "n_changes": int(row[3]) if row else 0,
+        }
+    logging.info("La base de données est accessible.")
+    return catalog
 
 
 # Fonction de branchement pour décider si on exécute les vérifications de qualité des données
 def choose_next_task(**kwargs):
-    if not check_database_exists():
+    catalog = preflight_catalog()
+    if catalog is None:
         logging.error("La base de données n'existe pas.")
         return "no_database_or_tables"
 
-    if not check_tables_exists():
-        logging.error("Certaines tables sont manquantes.")
+    missing_tables = [table for table, state in catalog.items() if not state["exists"]]
+    if missing_tables:
+        logging.error(f"Certaines tables sont manquantes : {', '.join(missing_tables)}")
         return "no_database_or_tables"
 
-    return "soda_quality_check_connection"
+    # Transmis aux tâches suivantes pour ignorer les tables vides ou inchangées
+    kwargs["ti"].xcom_push(key="catalog", value=catalog)
+    return "soda_quality_scan"
 
 
 # Vérification de l'existence des fichiers Soda avant d'exécuter les étapes suivantes
@@ -133,6 +182,76 @@ def verify_soda_files():
     logging.info("Tous les fichiers de configuration Soda sont présents.")
 
 
+# Vérifications de qualité de toutes les tables en un seul passage
+def soda_quality_scan(**kwargs):
+    incremental = kwargs["params"].get("incremental", soda_incremental)
+    catalog = kwargs["ti"].xcom_pull(task_ids="choose_next_task", key="catalog") or {}
+    previous_state = Variable.get(soda_state_variable, default_var={}, deserialize_json=True)
+    failures = []
+    check_files = {}
+    residual_dir = tempfile.mkdtemp(prefix="soda_checks_")
+
+    # Tables vides (confirmées par preflight_catalog) : row_count > 0 échoue sans lancer Soda
+    # Tables inchangées depuis le dernier scan réussi : rien à vérifier
+    tables = []
+    for table in table_tasks:
+        state = catalog.get(table)
+        if state is None:
+            tables.append(table)
+        elif state["estimated_rows"] == 0:
+            failures.append(f"{table} : table vide")
+        elif previous_state.get(table) == state["n_changes"]:
+            logging.info(f"{table} inchangée depuis le dernier scan réussi, ignorée.")
+        else:
+            tables.append(table)
+
+    if incremental:
+        conn = connect_to_datamart()
+        try:
+            if has_partition_checkpoints(conn):
+                for table in [t for t in incremental_tables if t in tables]:
+                    table_failures, other_checks = run_incremental_checks(
+                        conn, table, os.path.join(checks_path, f"{table}_check.yml")
+                    )
+                    failures.extend(f"{table} : {failure}" for failure in table_failures)
+                    # Les checks non additifs (schéma) restent exécutés par Soda
+                    check_files[table] = write_residual_checks(
+                        other_checks,
+                        table,
+                        os.path.join(residual_dir, f"{table}_check.yml"),
+                    )
+            else:
+                logging.warning(
+                    "Aucun checkpoint de construction par mois : vérification complète."
+                )
+        finally:
+            conn.close()
+
+    failed_tables = []
+    if tables:
+        failed_tables = run_quality_checks(
+            tables,
+            dm_dbms_datasource,
+            os.path.join(soda_dir, "configuration.yml"),
+            checks_path,
+            max_workers=soda_max_workers,
+            check_files=check_files,
+        )
+    failures.extend(failed_tables)
+
+    # Mémorisation de l'activité des tables vérifiées avec succès
+    for table in tables:
+        if table not in failed_tables and table in catalog:
+            previous_state[table] = catalog[table]["n_changes"]
+    Variable.set(soda_state_variable, previous_state, serialize_json=True)
+
+    if failures:
+        raise AirflowException(
+            f"Contrôles de qualité en échec pour : {', '.join(failures)}"
+        )
+    logging.info("Tous les contrôles de qualité sont passés.")
+
+
 # Création du DAG
 with DAG(
     "soda_quality_checks_with_db_verification",
@@ -142,9 +261,10 @@ with DAG(
         "retry_delay": timedelta(minutes=1),
     },
     description="Vérification de la base de données et des tables avant les contrôles de qualité avec Soda",
-    schedule_interval="@daily",
+    schedule=[datamart_dataset],
     start_date=datetime(2025, 1, 11),
     catchup=False,
+    params={"incremental": soda_incremental},
 ) as dag:
 
     # Tâche pour vérifier l'existence des fichiers Soda
@@ -162,29 +282,13 @@ with DAG(
         dag=dag,
     )
 
-    soda_quality_check_connection = BashOperator(
-        task_id="soda_quality_check_connection",
-        bash_command=f"soda test-connection -d {dm_dbms_datasource} -c {soda_dir}/configuration.yml",
+    # Une seule tâche pour les vérifications de toutes les tables
+    soda_quality_check_task = PythonOperator(
+        task_id="soda_quality_scan",
+        python_callable=soda_quality_scan,
         dag=dag,
     )
 
-    # Liste pour stocker les tâches de qualité
-    soda_quality_check_tasks = []
-
-    # Créer une tâche `BashOperator` pour chaque élément de `tasks`
-    for i, task_file in enumerate(table_tasks):
-        task_id = f"task_{i}_soda_quality_check"  # ID unique pour chaque tâche
-        bash_command = f"soda scan -d {dm_dbms_datasource} -c {soda_dir}/configuration.yml {checks_path}/{task_file}_check.yml"
-
-        soda_quality_check_task = BashOperator(
-            task_id=task_id,
-            bash_command=bash_command,
-            dag=dag,
-        )
-
-        # Ajouter chaque tâche à la liste
-        soda_quality_check_tasks.append(soda_quality_check_task)
-
     # Tâche pour indiquer l'absence de base de données ou de tables
     no_database_or_tables = BashOperator(
         task_id="no_database_or_tables",
@@ -194,6 +298,4 @@ with DAG(
 
     # Définir les dépendances
     verify_files >> branching_task
-    branching_task >> [no_database_or_tables, soda_quality_check_connection]
-    for soda_quality_check_task in soda_quality_check_tasks:
-        (soda_quality_check_connection >> soda_quality_check_task)
+    branching_task >> [no_database_or_tables, soda_quality_check_task]
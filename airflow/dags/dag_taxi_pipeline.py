@@ -0,0 +1,138 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime, timedelta
+from airflow.decorators import dag, task, task_group
+from airflow.datasets import Dataset
+from airflow.exceptions import AirflowException
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+
+# Modules du pipeline (src/data monté dans le conteneur, voir docker-compose.yml)
+pipeline_src_dir = os.getenv("PIPELINE_SRC_DIR", "/opt/airflow/src/data")
+if pipeline_src_dir not in sys.path:
+    sys.path.append(pipeline_src_dir)
+
+# Jeux de données traités en parallèle (registre dans src/data/datasets.py)
+pipeline_datasets = [
+    name.strip()
+    for name in os.getenv("PIPELINE_DATASETS", "yellow,green,fhv,fhvhv").split(",")
+    if name.strip()
+]
+
+# Nombre de mois publiés vérifiés à chaque exécution
+pipeline_months = int(os.getenv("PIPELINE_MONTHS", "12"))
+
+# Pools Airflow bornant le parallélisme selon la capacité de Postgres et de Minio
+postgres_pool = "postgres_pool"
+minio_pool = "minio_pool"
+
+# Dataset mis à jour par le pipeline : déclenche le DAG de qualité des données
+datamart_dataset = Dataset("postgres://db-datamart/tp_datamart")
+
+
+@dag(
+    dag_id="taxi_pipeline",
+    default_args={
+        "owner": "airflow",
+        "retries": 2,
+        "retry_delay": timedelta(minutes=2),
+    },
+    description="Téléchargement, Minio, entrepôt et data mart des seuls mois modifiés de chaque jeu de données",
+    schedule="@monthly",
+    start_date=datetime(2025, 1, 9),
+    catchup=False,
+    max_active_runs=1,
+)
+def taxi_pipeline():
+
+    # Mois publiés par la TLC sur la période suivie, pour chaque jeu de données
+    @task
+    def list_month_files():
+        # Imports locaux : les modules du pipeline ne sont chargés que par les tâches
+        from data_function import list_recent_month_files
+
+        file_names = []
+        for dataset in pipeline_datasets:
+            file_names.extend(list_recent_month_files(pipeline_months, dataset=dataset))
+        return file_names
+
+    # Copie d'un mois dans le bucket de son jeu de données s'il est nouveau ou modifié
+    @task(pool=minio_pool)
+    def sync_month(file_name):
+        from data_function import sync_file_to_minio
+
+        sync_file_to_minio(file_name)
+        return file_name
+
+    # Seuls les mois dont la version copiée n'a pas encore été chargée passent aux étapes
+    # suivantes : un mois dont le chargement a échoué est repris à l'exécution suivante
+    @task(pool=minio_pool)
+    def select_changed(file_names):
+        from data_function import needs_loading
+
+        changed = [file_name for file_name in file_names if needs_loading(file_name)]
+        logging.info(f"{len(changed)} mois à charger : {', '.join(changed) or 'aucun'}")
+        return changed
+
+    @task_group
+    def load_month(file_name):
+
+        # Rechargement du mois dans l'entrepôt (les lignes précédentes sont supprimées)
+        @task(pool=postgres_pool)
+        def load_warehouse(file_name):
+            from data_function import get_minio_client
+            from datasets import dataset_of_file, get_dataset
+            from dump_to_sql import load_file_to_warehouse
+
+            bucket_name = get_dataset(dataset_of_file(file_name))["bucket"]
+            if not load_file_to_warehouse(bucket_name, file_name, get_minio_client()):
+                raise AirflowException(f"Échec du chargement de {file_name} dans l'entrepôt")
+            return file_name
+
+        # Reconstruction du mois et des deux mois voisins dans le data mart
+        @task(pool=postgres_pool, outlets=[datamart_dataset])
+        def load_datamart(file_name):
+            from data_cleaning import period_from_file_name
+            from data_function import mark_file_loaded
+            from datasets import dataset_of_file
+            from datawarehouse_to_datamart_olap import rebuild_datamart_month
+
+            period = period_from_file_name(file_name)
+            # Le fichier contient aussi des prises en charge des mois voisins (±1 jour)
+            if period is None or not rebuild_datamart_month(
+                period[0], dataset=dataset_of_file(file_name), neighbours=True
+            ):
+                raise AirflowException(
+                    f"Échec de la reconstruction de {file_name} dans le data mart"
+                )
+
+            # Marqué chargé seulement une fois l'entrepôt et le data mart à jour
+            mark_file_loaded(file_name)
+
+        load_datamart(load_warehouse(file_name))
+
+    # Instantané Arrow des panneaux du dashboard, lu par les serveurs Streamlit
+    # (une fois tous les mois rechargés : ignoré si aucun mois n'a changé)
+    @task(pool=postgres_pool)
+    def write_snapshot():
+        from dashboard_snapshot import write_dashboard_snapshot
+
+        if not write_dashboard_snapshot():
+            raise AirflowException("Échec de l'écriture de l'instantané du dashboard")
+
+    # Une instance de tâche par mois : fan-out dynamique
+    changed = select_changed(sync_month.expand(file_name=list_month_files()))
+    load_month.expand(file_name=changed) >> write_snapshot()
+
+
+taxi_pipeline()
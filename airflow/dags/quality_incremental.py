@@ -0,0 +1,196 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import re
+import logging
+import operator
+import yaml
+
+# Métriques additives : la valeur d'une table est la somme des valeurs de ses partitions
+ADDITIVE_METRIC_PATTERN = re.compile(
+    r"^\s*(row_count|missing_count\((\w+)\))\s*(>=|<=|!=|=|>|<)\s*(-?\d+(?:\.\d+)?)\s*$"
+)
+THRESHOLD_PATTERN = re.compile(r"^\s*when\s*(>=|<=|!=|=|>|<)\s*(-?\d+(?:\.\d+)?)\s*$")
+
+OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# Colonne du fait portant la clé de temps (epoch) qui délimite les partitions mensuelles
+PARTITION_COLUMN = "id_time_pickup"
+
+
+# Lecture d'un fichier de checks : séparation des checks additifs et des autres
+def split_checks(check_file, table):
+    with open(check_file, "r") as file:
+        definition = yaml.safe_load(file)
+    checks = definition[f"checks for {table}"]
+
+    additive_checks = []
+    other_checks = []
+    for check in checks:
+        expression = check if isinstance(check, str) else next(iter(check))
+        config = {} if isinstance(check, str) else (check[expression] or {})
+        match = ADDITIVE_METRIC_PATTERN.match(expression.split("#")[0])
+        if match is None:
+            other_checks.append(check)
+            continue
+        additive_checks.append(
+            {
+                "expression": expression,
+                "metric": match.group(1),
+                "column": match.group(2),
+                "operator": match.group(3),
+                "threshold": float(match.group(4)),
+                "name": config.get("name", expression),
+                "fail": config.get("fail"),
+                "warn": config.get("warn"),
+            }
+        )
+    return additive_checks, other_checks
+
+
+# Écriture d'un fichier de checks ne contenant que les checks non additifs (schéma, ...)
+def write_residual_checks(other_checks, table, path):
+    with open(path, "w") as file:
+        yaml.safe_dump({f"checks for {table}": other_checks}, file, allow_unicode=True)
+    return path
+
+
+# Partitions chargées depuis le dernier scan réussi (filigrane) d'après les checkpoints du build
+def partitions_to_scan(cursor, table):
+    cursor.execute(
+        "SELECT c.chunk_key, c.period_start, c.period_end, c.completed_at "
+        "FROM datamart_build_checkpoint c "
+        "LEFT JOIN dq_scan_watermark w ON w.table_name = %s "
+        "WHERE c.fact_table = %s "
+        "AND (w.last_loaded_at IS NULL OR c.completed_at > w.last_loaded_at "
+        "     OR NOT EXISTS (SELECT 1 FROM dq_partition_metrics m "
+        "                    WHERE m.table_name = %s AND m.partition_key = c.chunk_key)) "
+        "ORDER BY c.chunk_key",
+        (table, table, table),
+    )
+    return cursor.fetchall()
+
+
+# Calcul des métriques additives d'une partition en une seule requête d'agrégation
+def compute_partition_metrics(cursor, table, metrics, period_start, period_end):
+    expressions = []
+    for metric, column in metrics:
+        if column is None:
+            expressions.append("COUNT(*)")
+        else:
+            expressions.append(f"COUNT(*) - COUNT({column})")
+
+    cursor.execute(
+        f"SELECT {', '.join(expressions)} FROM {table} "
+        f"WHERE {PARTITION_COLUMN} >= EXTRACT(EPOCH FROM %s::timestamp)::INTEGER "
+        f"AND {PARTITION_COLUMN} < EXTRACT(EPOCH FROM %s::timestamp)::INTEGER",
+        (period_start, period_end),
+    )
+    return dict(zip(metrics, cursor.fetchone()))
+
+
+# Évaluation d'un check sur la valeur combinée : renvoie "fail", "warn" ou None
+def evaluate_check(check, value):
+    configured = False
+    for level in ("fail", "warn"):
+        condition = check[level]
+        match = THRESHOLD_PATTERN.match(condition) if isinstance(condition, str) else None
+        if match is not None:
+            configured = True
+            if OPERATORS[match.group(1)](value, float(match.group(2))):
+                return level
+    # Sans seuil fail/warn, c'est la condition du check lui-même qui doit être vraie
+    if not configured and not OPERATORS[check["operator"]](value, check["threshold"]):
+        return "fail"
+    return None
+
+
+# Vérifications incrémentales d'une table de faits : seules les nouvelles partitions sont lues
+def run_incremental_checks(conn, table, check_file):
+    additive_checks, other_checks = split_checks(check_file, table)
+    metrics = sorted(
+        {(check["metric"].split("(")[0], check["column"]) for check in additive_checks},
+        key=str,
+    )
+    cursor = conn.cursor()
+
+    # Oubli des partitions qui ne sont plus dans le data mart (reconstruction complète)
+    cursor.execute(
+        "DELETE FROM dq_partition_metrics m WHERE m.table_name = %s AND NOT EXISTS "
+        "(SELECT 1 FROM datamart_build_checkpoint c "
+        " WHERE c.fact_table = m.table_name AND c.chunk_key = m.partition_key)",
+        (table,),
+    )
+
+    partitions = partitions_to_scan(cursor, table)
+    logging.info(
+        f"{table} : {len(partitions)} partitions à scanner "
+        f"({', '.join(row[0] for row in partitions) or 'aucune'})"
+    )
+    for partition_key, period_start, period_end, _ in partitions:
+        values = compute_partition_metrics(cursor, table, metrics, period_start, period_end)
+        for (metric, column), value in values.items():
+            cursor.execute(
+                "INSERT INTO dq_partition_metrics (table_name, partition_key, metric, value) "
+                "VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (table_name, partition_key, metric) "
+                "DO UPDATE SET value = EXCLUDED.value, computed_at = now()",
+                (table, partition_key, f"{metric}:{column or ''}", value),
+            )
+
+    # Résultats au niveau table : somme des métriques en cache de toutes les partitions
+    cursor.execute(
+        "SELECT metric, SUM(value) FROM dq_partition_metrics "
+        "WHERE table_name = %s GROUP BY metric",
+        (table,),
+    )
+    totals = {metric: float(value) for metric, value in cursor.fetchall()}
+
+    failures = []
+    for check in additive_checks:
+        key = f"{check['metric'].split('(')[0]}:{check['column'] or ''}"
+        value = totals.get(key, 0.0)
+        level = evaluate_check(check, value)
+        if level == "fail":
+            failures.append(f"{check['name']} (valeur : {value:g})")
+        elif level == "warn":
+            logging.warning(f"{table} : {check['name']} (valeur : {value:g})")
+        else:
+            logging.info(f"{table} : {check['name']} OK (valeur : {value:g})")
+
+    # Le filigrane n'avance que si les vérifications sont passées
+    if not failures and partitions:
+        cursor.execute(
+            "INSERT INTO dq_scan_watermark (table_name, last_loaded_at, last_scan_at) "
+            "VALUES (%s, %s, now()) ON CONFLICT (table_name) "
+            "DO UPDATE SET last_loaded_at = EXCLUDED.last_loaded_at, last_scan_at = now()",
+            (table, max(row[3] for row in partitions)),
+        )
+    conn.commit()
+    cursor.close()
+    return failures, other_checks
+
+
+# Vrai si le data mart a été construit par mois (condition du mode incrémental)
+def has_partition_checkpoints(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('public.datamart_build_checkpoint')")
+    exists = cursor.fetchone()[0] is not None
+    if exists:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM datamart_build_checkpoint)")
+        exists = cursor.fetchone()[0]
+    cursor.close()
+    conn.commit()
+    return exists
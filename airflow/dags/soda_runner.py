@@ -0,0 +1,86 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Codes de sortie de Scan.execute() : 0 succès, 1 avertissements, 2 échecs, 3 erreurs
+SCAN_FAILURE_EXIT_CODE = 2
+
+# Tables volumineuses scannées chacune dans leur propre session
+LARGE_TABLES = ["fact_yellow_taxi"]
+
+
+# Répartition des tables en groupes indépendants, un groupe par session de scan
+def group_tables(tables, max_workers):
+    if max_workers <= 1:
+        return [list(tables)]
+
+    large = [table for table in tables if table in LARGE_TABLES]
+    small = [table for table in tables if table not in LARGE_TABLES]
+
+    groups = [[table] for table in large]
+    small_groups = max(1, max_workers - len(groups))
+    for i in range(min(small_groups, len(small))):
+        groups.append(small[i::small_groups])
+    return groups
+
+
+# Exécution d'une session de scan Soda pour un groupe de tables
+def run_scan_session(tables, data_source, configuration_path, check_files):
+    # Import local : soda n'est chargé que par la tâche, pas au parsing du DAG
+    from soda.scan import Scan
+
+    scan = Scan()
+    scan.set_data_source_name(data_source)
+    scan.set_scan_definition_name(f"quality_{'_'.join(tables)}")
+    scan.add_configuration_yaml_file(configuration_path)
+    for table in tables:
+        scan.add_sodacl_yaml_file(check_files[table])
+
+    # Une seule connexion par session : Soda regroupe les métriques de chaque table
+    # (row_count, missing_count, ...) dans une seule requête d'agrégation
+    exit_code = scan.execute()
+    return {
+        "tables": tables,
+        "exit_code": exit_code,
+        "logs": scan.get_logs_text(),
+    }
+
+
+# Exécution de toutes les vérifications en un seul passage, sessions indépendantes en parallèle
+# `check_files` remplace le fichier `{table}_check.yml` de certaines tables (mode incrémental)
+def run_quality_checks(
+    tables, data_source, configuration_path, checks_path, max_workers=2, check_files=None
+):
+    check_files = {
+        **{table: os.path.join(checks_path, f"{table}_check.yml") for table in tables},
+        **(check_files or {}),
+    }
+    groups = group_tables(tables, max_workers)
+    logging.info(f"Scan Soda de {len(tables)} tables en {len(groups)} sessions : {groups}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as executor:
+        futures = [
+            executor.submit(
+                run_scan_session, group, data_source, configuration_path, check_files
+            )
+            for group in groups
+        ]
+        results = [future.result() for future in futures]
+
+    failed_tables = []
+    for result in results:
+        logging.info(result["logs"])
+        if result["exit_code"] >= SCAN_FAILURE_EXIT_CODE:
+            failed_tables.extend(result["tables"])
+        elif result["exit_code"] > 0:
+            logging.warning(f"Avertissements Soda pour : {', '.join(result['tables'])}")
+
+    return failed_tables
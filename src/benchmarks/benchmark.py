@@ -0,0 +1,534 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import sys
+import json
+import glob
+import shutil
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Modules of the pipeline (src/data), of the dashboard (src/visualization) and of the quality
+# checks (airflow/dags)
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.abspath(os.path.join(benchmark_dir, "..", ".."))
+sys.path.append(os.path.join(root_dir, "src", "data"))
+sys.path.append(os.path.join(root_dir, "src", "visualization"))
+sys.path.append(os.path.join(root_dir, "airflow", "dags"))
+
+from data_cleaning import clean_trips, period_from_file_name
+from dimension import payment_members, time_members, vendor_members
+from instrumentation import StageMetrics, stage
+from key_mapping import KeyMap, map_fact_batch
+from parquet_reader import TRIP_SCHEMA, iter_trip_batches, trip_table_to_pandas
+from profiling import new_fact_profile, update_fact_profile
+from synthetic_data import ZONE_COUNT, write_synthetic_month
+
+# Directory of the JSON results, one file per run
+results_dir = os.getenv("BENCHMARK_RESULTS_DIR", os.path.join(benchmark_dir, "results"))
+
+# Minio bucket receiving the synthetic file in services mode (never a bucket of the pipeline)
+benchmark_bucket = os.getenv("BENCHMARK_BUCKET", "benchmark-tripdata")
+
+# Rows read, cleaned and written at a time, as WAREHOUSE_BATCH_SIZE in the pipeline
+BATCH_SIZE = 500000
+
+# Slowdown reported as a regression against the baseline (10 %)
+REGRESSION_THRESHOLD = 0.10
+
+# Steps timed by the benchmark, in execution order
+STEPS = [
+    "parquet_read",
+    "cleaning",
+    "warehouse_load",
+    "datamart_build",
+    "dashboard_page",
+    "dashboard_panels",
+    "soda_scan",
+]
+
+# Fact columns read by the dashboard panels
+DASHBOARD_FACT_COLUMNS = [
+    "id_vendor",
+    "id_time_pickup",
+    "id_zone_pickup",
+    "id_zone_dropoff",
+    "id_payment_type",
+    "total_amount",
+]
+
+# Panels of the dashboard (PANEL_QUERIES of panel_loader.py) computed by pandas on a fact part
+# in filesystem mode; the partial results of the parts are summed
+DASHBOARD_PANELS = {
+    "indicateurs": lambda part: pd.Series(
+        {
+            "total_amount": part["total_amount"].sum(),
+            "trajets_annules": (part["total_amount"] == 0).sum(),
+            "trajets": len(part),
+        }
+    ),
+    "zones_prise_en_charge": lambda part: part["id_zone_pickup"].value_counts(),
+    "zones_depot": lambda part: part["id_zone_dropoff"].value_counts(),
+    "trajets_par_mois": lambda part: part["pickup"].dt.month.value_counts(),
+    "trajets_par_jour_semaine": lambda part: (part["pickup"].dt.dayofweek + 1).value_counts(),
+    "trajets_par_jour": lambda part: part["pickup"].dt.day.value_counts(),
+    "trajets_par_heure": lambda part: part["pickup"].dt.hour.value_counts(),
+    "paiements": lambda part: part["id_payment_type"].value_counts(),
+    "fournisseurs": lambda part: part.groupby("id_vendor")["total_amount"].agg(["size", "sum"]),
+}
+
+
+def git_version() -> Dict[str, Optional[str]]:
+    """
+    Return the commit and the description (tag, dirty tree) of the benchmarked version.
+    """
+    version = {}
+    for key, command in [
+        ("commit", ["git", "rev-parse", "HEAD"]),
+        ("describe", ["git", "describe", "--always", "--dirty"]),
+    ]:
+        try:
+            version[key] = subprocess.run(
+                command, cwd=root_dir, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except Exception:
+            version[key] = None
+    return version
+
+
+def iter_file_batches(path: str, batch_size: int):
+    """
+    Stream the synthetic file as pandas batches, as load_file_to_warehouse does.
+    """
+    for table in iter_trip_batches(path, batch_size):
+        yield trip_table_to_pandas(table)
+
+
+def run_step(name: str, function: Callable, context: Dict, timed_stage: str = None) -> Dict:
+    """
+    Run one step of the benchmark in a stage and return its result.
+
+    Parameters:
+        - name (str): The step, one of STEPS
+        - function (Callable): Called with the context and the StageMetrics of the step, returns
+        "skipped" when the step does not apply to the mode
+        - context (Dict): Paths and settings of the run, shared between the steps
+        - timed_stage (str): Nested stage whose duration is the one of the step (the cleaning
+        step also decodes the file, only the cleaning is reported)
+
+    Returns:
+        - Dict: The stage record (duration, rows, bytes, round trips, peak RSS, breakdown)
+    """
+    print(f"Benchmark step: {name}")
+    with stage(f"benchmark_{name}", mode=context["mode"], rows=context["rows"]) as metrics:
+        try:
+            if function(context, metrics) == "skipped":
+                metrics.status = "skipped"
+        except Exception as e:
+            print(f"Benchmark step {name} failed: {e}")
+            metrics.status = "error"
+
+    record = metrics.to_record()
+    if timed_stage is not None and timed_stage in record["breakdown"]:
+        record["duration_s"] = record["breakdown"][timed_stage]["duration_s"]
+        duration = record["duration_s"]
+        record["rows_per_s"] = round(record["rows"] / duration, 1) if duration > 0 else None
+    return record
+
+
+def step_parquet_read(context: Dict, metrics: StageMetrics) -> None:
+    for batch in iter_file_batches(context["file_path"], context["batch_size"]):
+        metrics.add(rows=len(batch), bytes=batch.memory_usage(deep=True).sum())
+
+
+def step_cleaning(context: Dict, metrics: StageMetrics) -> None:
+    batches = iter_file_batches(context["file_path"], context["batch_size"])
+    while True:
+        with stage("parquet_decode"):
+            batch = next(batches, None)
+        if batch is None:
+            break
+        with stage("clean"):
+            clean_trips(batch, context["period"])
+        metrics.add(rows=len(batch))
+
+
+def step_warehouse_load(context: Dict, metrics: StageMetrics) -> None:
+    if context["mode"] == "services":
+        from data_function import get_minio_client
+        from dump_to_sql import load_file_to_warehouse
+
+        if not load_file_to_warehouse(
+            benchmark_bucket,
+            context["file_name"],
+            get_minio_client(),
+            batch_size=context["batch_size"],
+        ):
+            raise RuntimeError("load_file_to_warehouse failed")
+        return
+
+    # Filesystem fallback: the clean rows are written as Parquet parts instead of tables
+    warehouse_dir = os.path.join(context["work_dir"], "warehouse")
+    shutil.rmtree(warehouse_dir, ignore_errors=True)
+    os.makedirs(warehouse_dir)
+    batches = iter_file_batches(context["file_path"], context["batch_size"])
+    for part, batch in enumerate(batches):
+        with stage("clean"):
+            clean, _, _ = clean_trips(batch, context["period"])
+        with stage("warehouse_write") as write:
+            table = pa.Table.from_pandas(clean, schema=TRIP_SCHEMA, preserve_index=False)
+            part_path = os.path.join(warehouse_dir, f"part-{part:05d}.parquet")
+            pq.write_table(table, part_path)
+            write.add(rows=len(clean), bytes=os.path.getsize(part_path))
+        metrics.add(rows=len(clean))
+
+
+def step_datamart_build(context: Dict, metrics: StageMetrics) -> None:
+    if context["mode"] == "services":
+        from datawarehouse_to_datamart_olap import rebuild_datamart_month
+
+        if not rebuild_datamart_month(context["period"][0], context["batch_size"]):
+            raise RuntimeError("rebuild_datamart_month failed")
+        return
+
+    # Filesystem fallback: same mapping and profiling as load_fact_rows, facts as Parquet parts
+    fact_dir = os.path.join(context["work_dir"], "fact")
+    shutil.rmtree(fact_dir, ignore_errors=True)
+    os.makedirs(fact_dir)
+    vendors = vendor_members([1, 2])
+    payments = payment_members()
+    zones = np.arange(1, ZONE_COUNT + 1)
+    key_maps = {
+        "vendor": KeyMap(vendors["id_vendor"], vendors["id_vendor"]),
+        "payment": KeyMap(payments["id_payment_type"], payments["id_payment_type"]),
+        "zone": KeyMap(zones, zones),
+    }
+    profile = new_fact_profile()
+
+    parts = sorted(glob.glob(os.path.join(context["work_dir"], "warehouse", "*.parquet")))
+    for part, part_path in enumerate(parts):
+        with stage("warehouse_fetch"):
+            batch = trip_table_to_pandas(pq.read_table(part_path))
+        with stage("time_dimension"):
+            members = time_members(
+                pd.concat([batch["tpep_pickup_datetime"], batch["tpep_dropoff_datetime"]])
+            )
+        with stage("key_mapping"):
+            fact, _ = map_fact_batch(
+                batch, dict(key_maps, time=KeyMap(members["id_time"], members["id_time"]))
+            )
+        with stage("fact_copy"):
+            pq.write_table(
+                pa.Table.from_pandas(fact, preserve_index=False),
+                os.path.join(fact_dir, f"part-{part:05d}.parquet"),
+            )
+        with stage("profiling"):
+            update_fact_profile(profile, fact)
+        metrics.add(rows=len(fact))
+
+
+def iter_fact_parts(context: Dict):
+    """
+    Stream the fact parts of the filesystem datamart, only the columns read by the dashboard.
+    """
+    columns = DASHBOARD_FACT_COLUMNS
+    for path in sorted(glob.glob(os.path.join(context["work_dir"], "fact", "*.parquet"))):
+        part = pd.read_parquet(path, columns=columns)
+        part["pickup"] = pd.to_datetime(part["id_time_pickup"], unit="s")
+        yield part
+
+
+def aggregate_panel(context: Dict, panel: str):
+    """
+    Aggregate the whole filesystem datamart for one panel, part by part as Postgres would.
+    """
+    total = None
+    for part in iter_fact_parts(context):
+        partial = DASHBOARD_PANELS[panel](part)
+        total = partial if total is None else total.add(partial, fill_value=0)
+    return total
+
+
+def datamart_pool(size: int):
+    """
+    Open a pool of datamart connections, as the dashboard does (see get_connection_pool).
+    """
+    import psycopg2.pool
+    from config import datamart_params
+
+    return psycopg2.pool.ThreadedConnectionPool(1, size, **datamart_params())
+
+
+def step_dashboard_page(context: Dict, metrics: StageMetrics) -> None:
+    if context["mode"] == "services":
+        # Every panel query sent at the same time, as show_dashboard does
+        from streamlit_pages.panel_loader import PANEL_QUERIES, load_concurrently, query_panel
+
+        pool = datamart_pool(len(PANEL_QUERIES))
+        try:
+            results = load_concurrently(
+                lambda name: query_panel(pool, PANEL_QUERIES[name]),
+                list(PANEL_QUERIES),
+                len(PANEL_QUERIES),
+            )
+            for name, result, error in results:
+                if error is not None:
+                    raise error
+                metrics.add(rows=result[1]["rows"], bytes=result[1]["bytes"])
+        finally:
+            pool.closeall()
+        return
+
+    # Filesystem fallback: one pass over the facts computing every panel
+    totals = {}
+    for part in iter_fact_parts(context):
+        for panel, compute in DASHBOARD_PANELS.items():
+            partial = compute(part)
+            totals[panel] = partial if panel not in totals else totals[panel].add(
+                partial, fill_value=0
+            )
+        metrics.add(rows=len(part))
+
+
+def step_dashboard_panels(context: Dict, metrics: StageMetrics) -> None:
+    if context["mode"] == "services":
+        # Each panel query alone, to see which one bounds the page
+        from streamlit_pages.panel_loader import PANEL_QUERIES, query_panel
+
+        pool = datamart_pool(1)
+        try:
+            for name, sql in PANEL_QUERIES.items():
+                with stage(f"panel_{name}") as panel:
+                    _, query_info = query_panel(pool, sql)
+                    panel.add(rows=query_info["rows"], bytes=query_info["bytes"])
+        finally:
+            pool.closeall()
+        return
+
+    for panel in DASHBOARD_PANELS:
+        with stage(f"panel_{panel}"):
+            aggregate_panel(context, panel)
+
+
+def step_soda_scan(context: Dict, metrics: StageMetrics) -> Optional[str]:
+    if context["mode"] != "services":
+        return "skipped"
+    try:
+        import soda.scan  # noqa: F401
+    except ImportError:
+        print("Soda is not installed, scan skipped")
+        return "skipped"
+    from soda_runner import run_quality_checks
+
+    soda_dir = os.path.join(root_dir, "soda")
+    tables = [
+        os.path.basename(path)[: -len("_check.yml")]
+        for path in sorted(glob.glob(os.path.join(soda_dir, "checks", "*_check.yml")))
+    ]
+    failed_tables = run_quality_checks(
+        tables,
+        os.getenv("DOCKER_DBMS_DATASOURCE", "tp_datamart"),
+        os.path.join(soda_dir, "configuration.yml"),
+        os.path.join(soda_dir, "checks"),
+        max_workers=int(os.getenv("SODA_MAX_WORKERS", "2")),
+    )
+    if failed_tables:
+        print(f"Soda checks failed for: {', '.join(failed_tables)}")
+
+
+STEP_FUNCTIONS = {
+    "parquet_read": (step_parquet_read, None),
+    "cleaning": (step_cleaning, "clean"),
+    "warehouse_load": (step_warehouse_load, None),
+    "datamart_build": (step_datamart_build, None),
+    "dashboard_page": (step_dashboard_page, None),
+    "dashboard_panels": (step_dashboard_panels, None),
+    "soda_scan": (step_soda_scan, None),
+}
+
+
+def run_benchmark(
+    rows: int,
+    mode: str = "filesystem",
+    month: str = "2024-01",
+    seed: int = 42,
+    batch_size: int = BATCH_SIZE,
+    steps: Optional[List[str]] = None,
+    work_dir: Optional[str] = None,
+) -> Dict:
+    """
+    Generate a synthetic month and time every step of the pipeline and of the dashboard on it.
+
+    Parameters:
+        - rows (int): Number of synthetic trips (1M to 100M)
+        - mode (str): "filesystem" (no service needed, the warehouse and the datamart are Parquet
+        files) or "services" (local Postgres and Minio configured in .env)
+        - month (str): Month of the synthetic trips, YYYY-MM
+        - seed (int): Seed of the generator, the same seed gives the same file
+        - batch_size (int): Rows read, cleaned and written at a time
+        - steps (Optional[List[str]]): Steps to run, every step of STEPS by default
+        - work_dir (Optional[str]): Directory of the generated files, kept between runs so that
+        a file of the same size and seed is generated only once
+
+    Returns:
+        - Dict: The run (version, settings, platform) and the record of each step
+    """
+    year, month_number = (int(value) for value in month.split("-"))
+    work_dir = work_dir or os.path.join(results_dir, "work")
+    os.makedirs(work_dir, exist_ok=True)
+
+    file_name = f"yellow_tripdata_{year}-{month_number:02d}.parquet"
+    file_dir = os.path.join(work_dir, f"source_{rows}_{seed}")
+    file_path = os.path.join(file_dir, file_name)
+    if not os.path.exists(file_path):
+        print(f"Generating {rows} synthetic trips in {file_path}")
+        os.makedirs(file_dir, exist_ok=True)
+        write_synthetic_month(f"{file_path}.tmp", rows, year, month_number, seed)
+        os.replace(f"{file_path}.tmp", file_path)
+
+    context = {
+        "mode": mode,
+        "rows": rows,
+        "batch_size": batch_size,
+        "work_dir": work_dir,
+        "file_name": file_name,
+        "file_path": file_path,
+        "period": period_from_file_name(file_name),
+    }
+
+    if mode == "services":
+        from data_function import get_minio_client
+
+        minio_client = get_minio_client()
+        if not minio_client.bucket_exists(benchmark_bucket):
+            minio_client.make_bucket(benchmark_bucket)
+        minio_client.fput_object(benchmark_bucket, file_name, file_path)
+
+    results = {}
+    for name in steps or STEPS:
+        function, timed_stage = STEP_FUNCTIONS[name]
+        results[name] = run_step(name, function, context, timed_stage)
+
+    return {
+        "benchmark": "taxi_pipeline",
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "mode": mode,
+        "rows": rows,
+        "month": month,
+        "seed": seed,
+        "batch_size": batch_size,
+        "file_bytes": os.path.getsize(file_path),
+        "platform": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "pyarrow": pa.__version__,
+        },
+        "steps": results,
+    }
+
+
+def save_results(results: Dict, path: Optional[str] = None) -> str:
+    """
+    Write the results of a run as JSON, under results_dir by default.
+    """
+    if path is None:
+        commit = (results["version"]["commit"] or "unknown")[:8]
+        stamp = results["timestamp"].replace(":", "").replace("-", "")
+        path = os.path.join(
+            results_dir, f"benchmark_{results['mode']}_{results['rows']}_{stamp}_{commit}.json"
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, default=str)
+    return path
+
+
+def compare_results(
+    current: Dict, baseline: Dict, threshold: float = REGRESSION_THRESHOLD
+) -> List[str]:
+    """
+    Compare the step durations of two runs and return the regressions.
+
+    Only the steps that succeeded in both runs are compared, and only runs of the same mode and
+    size: the durations of different machines or scales are not comparable.
+
+    Parameters:
+        - current (Dict): The results of the run to check
+        - baseline (Dict): The results of the reference run
+        - threshold (float): Relative slowdown reported as a regression
+
+    Returns:
+        - List[str]: One line per step slower than the baseline by more than the threshold
+    """
+    if (current["mode"], current["rows"]) != (baseline["mode"], baseline["rows"]):
+        print(
+            f"Baseline not comparable: {baseline['mode']} with {baseline['rows']} rows, "
+            f"current run {current['mode']} with {current['rows']} rows"
+        )
+        return []
+
+    regressions = []
+    print(f"{'step':<20} {'baseline s':>12} {'current s':>12} {'change':>9}")
+    for name, record in current["steps"].items():
+        reference = baseline["steps"].get(name)
+        if reference is None or record["status"] != "ok" or reference["status"] != "ok":
+            continue
+        before, after = reference["duration_s"], record["duration_s"]
+        change = (after - before) / before if before > 0 else 0.0
+        print(f"{name:<20} {before:>12.3f} {after:>12.3f} {change:>+9.1%}")
+        if change > threshold:
+            regressions.append(f"{name}: {before:.3f}s -> {after:.3f}s ({change:+.1%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the ETL and dashboard hot paths")
+    parser.add_argument("--rows", type=int, default=1000000, help="Synthetic trips (1M-100M)")
+    parser.add_argument("--mode", choices=["filesystem", "services"], default="filesystem")
+    parser.add_argument("--month", default="2024-01", help="Month of the trips, YYYY-MM")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--steps", default=",".join(STEPS), help="Comma separated steps")
+    parser.add_argument("--work-dir", default=None, help="Directory of the generated files")
+    parser.add_argument("--output", default=None, help="JSON file of the results")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    steps = [name.strip() for name in args.steps.split(",") if name.strip()]
+    unknown = [name for name in steps if name not in STEP_FUNCTIONS]
+    if unknown:
+        parser.error(f"Unknown steps {', '.join(unknown)}, expected some of {', '.join(STEPS)}")
+
+    results = run_benchmark(
+        args.rows, args.mode, args.month, args.seed, args.batch_size, steps, args.work_dir
+    )
+    print(f"Results written to {save_results(results, args.output)}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare_results(results, json.load(file), args.threshold)
+        if regressions:
+            print("Regressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
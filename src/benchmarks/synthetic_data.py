@@ -0,0 +1,164 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Schema of the yellow taxi files as published by the TLC (2024 layout)
+TLC_YELLOW_SCHEMA = pa.schema(
+    [
+        ("VendorID", pa.int32()),
+        ("tpep_pickup_datetime", pa.timestamp("us")),
+        ("tpep_dropoff_datetime", pa.timestamp("us")),
+        ("passenger_count", pa.int64()),
+        ("trip_distance", pa.float64()),
+        ("RatecodeID", pa.int64()),
+        ("store_and_fwd_flag", pa.string()),
+        ("PULocationID", pa.int32()),
+        ("DOLocationID", pa.int32()),
+        ("payment_type", pa.int64()),
+        ("fare_amount", pa.float64()),
+        ("extra", pa.float64()),
+        ("mta_tax", pa.float64()),
+        ("tip_amount", pa.float64()),
+        ("tolls_amount", pa.float64()),
+        ("improvement_surcharge", pa.float64()),
+        ("total_amount", pa.float64()),
+        ("congestion_surcharge", pa.float64()),
+        ("Airport_fee", pa.float64()),
+    ]
+)
+
+# Rows generated and written at a time, so that 100M rows never sit in memory together
+GENERATION_BATCH_SIZE = 1000000
+
+# Share of the rows breaking a cleaning rule, close to the rejects of the real files
+INVALID_FRACTION = 0.02
+
+# Number of taxi zones of the TLC taxi_zone_lookup.csv file
+ZONE_COUNT = 265
+
+# Zones skewed toward a few busy ones (Manhattan, airports), as in the real data
+ZONE_IDS = np.random.default_rng(0).permutation(np.arange(1, ZONE_COUNT + 1)).astype(np.int32)
+ZONE_WEIGHTS = 1.0 / np.arange(1, ZONE_COUNT + 1) ** 1.1
+ZONE_WEIGHTS /= ZONE_WEIGHTS.sum()
+
+
+def generate_trip_batch(
+    rng: np.random.Generator,
+    rows: int,
+    year: int,
+    month: int,
+    invalid_fraction: float = INVALID_FRACTION,
+) -> pa.Table:
+    """
+    Generate synthetic yellow taxi trips of one month with the TLC schema.
+
+    Parameters:
+        - rng (np.random.Generator): The random generator, seeded by the caller
+        - rows (int): Number of trips to generate
+        - year (int): Year of the trips
+        - month (int): Month of the trips
+        - invalid_fraction (float): Share of the trips made invalid for the cleaning stage
+        (negative amounts, dropoff before pickup, missing pickup time)
+
+    Returns:
+        - pa.Table: The trips, typed as in the published files
+    """
+    start = np.datetime64(f"{year}-{month:02d}-01T00:00:00", "us")
+    month_seconds = pd.Timestamp(year, month, 1).days_in_month * 86400
+
+    # Pickups spread over the month, busier in the evening like the real files
+    day_seconds = rng.integers(0, month_seconds // 86400, rows) * 86400
+    hour_seconds = np.clip(rng.normal(15.5, 5.0, rows), 0, 23.99) * 3600
+    pickup = start + ((day_seconds + hour_seconds) * 1e6).astype("timedelta64[us]")
+    duration = np.clip(rng.lognormal(6.6, 0.6, rows), 60, 3 * 3600)
+    dropoff = pickup + (duration * 1e6).astype("timedelta64[us]")
+
+    distance = np.round(np.clip(rng.lognormal(0.6, 0.9, rows), 0.01, 80.0), 2)
+    fare = np.round(3.0 + distance * 2.5 + duration / 60 * 0.5, 2)
+    extra = rng.choice([0.0, 1.0, 2.5], rows)
+    mta_tax = np.full(rows, 0.5)
+    tipped = rng.random(rows) < 0.7
+    tip = np.round(np.where(tipped, fare * rng.uniform(0.1, 0.25, rows), 0.0), 2)
+    tolls = np.where(rng.random(rows) < 0.05, 6.94, 0.0)
+    improvement = np.full(rows, 1.0)
+    congestion = np.where(rng.random(rows) < 0.9, 2.5, 0.0)
+    airport = np.where(rng.random(rows) < 0.08, 1.75, 0.0)
+    surcharges = extra + mta_tax + improvement + congestion + airport
+    total = np.round(fare + surcharges + tip + tolls, 2)
+
+    # Invalid trips for the cleaning stage
+    invalid = rng.random(rows) < invalid_fraction
+    kind = rng.integers(0, 3, rows)
+    fare = np.where(invalid & (kind == 0), -fare, fare)
+    total = np.where(invalid & (kind == 0), -total, total)
+    dropoff = np.where(invalid & (kind == 1), pickup - np.timedelta64(60, "s"), dropoff)
+    missing_pickup = invalid & (kind == 2)
+
+    columns = {
+        "VendorID": rng.choice([1, 2], rows, p=[0.3, 0.7]).astype(np.int32),
+        "tpep_pickup_datetime": pa.array(pickup, pa.timestamp("us"), mask=missing_pickup),
+        "tpep_dropoff_datetime": dropoff,
+        "passenger_count": rng.choice(
+            [1, 2, 3, 4, 5, 6], rows, p=[0.7, 0.15, 0.05, 0.03, 0.04, 0.03]
+        ),
+        "trip_distance": distance,
+        "RatecodeID": rng.choice([1, 2, 5], rows, p=[0.95, 0.04, 0.01]),
+        "store_and_fwd_flag": pa.array(np.where(rng.random(rows) < 0.005, "Y", "N")),
+        "PULocationID": rng.choice(ZONE_IDS, rows, p=ZONE_WEIGHTS),
+        "DOLocationID": rng.choice(ZONE_IDS, rows, p=ZONE_WEIGHTS),
+        "payment_type": rng.choice([1, 2, 3, 4], rows, p=[0.78, 0.2, 0.01, 0.01]),
+        "fare_amount": fare,
+        "extra": extra,
+        "mta_tax": mta_tax,
+        "tip_amount": tip,
+        "tolls_amount": tolls,
+        "improvement_surcharge": improvement,
+        "total_amount": total,
+        "congestion_surcharge": congestion,
+        "Airport_fee": airport,
+    }
+    return pa.table(columns, schema=TLC_YELLOW_SCHEMA)
+
+
+def write_synthetic_month(
+    path: str,
+    rows: int,
+    year: int,
+    month: int,
+    seed: int = 42,
+    batch_size: int = GENERATION_BATCH_SIZE,
+) -> int:
+    """
+    Write a synthetic yellow taxi file of one month, one row group per generated batch.
+
+    The same seed gives the same file, so that the runs of the benchmark can be compared.
+
+    Parameters:
+        - path (str): The Parquet file to write
+        - rows (int): Number of trips (1M to 100M)
+        - year (int): Year of the trips
+        - month (int): Month of the trips
+        - seed (int): Seed of the random generator
+        - batch_size (int): Number of trips generated and written at a time
+
+    Returns:
+        - int: The size of the file in bytes
+    """
+    rng = np.random.default_rng(seed)
+    with pq.ParquetWriter(path, TLC_YELLOW_SCHEMA, compression="snappy") as writer:
+        written = 0
+        while written < rows:
+            count = min(batch_size, rows - written)
+            writer.write_table(generate_trip_batch(rng, count, year, month))
+            written += count
+    return os.path.getsize(path)
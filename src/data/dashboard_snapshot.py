@@ -0,0 +1,128 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import sys
+import shutil
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+from datamart_version import read_datamart_version
+from datawarehouse_to_datamart_olap import connect_to_db
+from instrumentation import instrumented, stage
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Panel queries of the dashboard (src/visualization/streamlit_pages/panel_loader.py)
+visualization_dir = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "visualization")
+)
+if visualization_dir not in sys.path:
+    sys.path.append(visualization_dir)
+from streamlit_pages.panel_loader import PANEL_QUERIES  # noqa: E402
+
+# Directory shared with the Streamlit servers (src is mounted in the Airflow containers)
+dashboard_snapshot_dir = os.getenv(
+    "DASHBOARD_SNAPSHOT_DIR", os.path.join(visualization_dir, "snapshot")
+)
+
+# File naming the current snapshot, replaced atomically once a new snapshot is complete
+SNAPSHOT_POINTER = "CURRENT"
+
+# Snapshots kept on disk: the current one and the previous one, still mapped by the servers
+SNAPSHOTS_KEPT = 2
+
+
+def write_panel_table(path: str, table: pa.Table) -> None:
+    """
+    Write one panel as an uncompressed Arrow IPC file, so that readers can map it without a copy.
+    """
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+@instrumented()
+def write_dashboard_snapshot(directory: str = None) -> bool:
+    """
+    Write the aggregate datasets of every dashboard panel as memory-mappable Arrow IPC files.
+
+    All the panel queries run in one read-only REPEATABLE READ transaction, so the panels of a
+    snapshot describe the same state of the data mart. The files are written to a new version
+    directory and the CURRENT pointer is switched with an atomic rename, the Streamlit servers
+    never see a partial snapshot.
+
+    Args:
+        directory (str): Directory of the snapshots, DASHBOARD_SNAPSHOT_DIR by default.
+
+    Returns:
+        bool: True if the snapshot was written and published, False otherwise.
+    """
+    directory = directory or dashboard_snapshot_dir
+    staging_dir = None
+    conn = connect_to_db()
+    if conn is None:
+        return False
+
+    try:
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        cursor = conn.cursor()
+        data_version = read_datamart_version(cursor)
+        version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        os.makedirs(directory, exist_ok=True)
+        staging_dir = os.path.join(directory, f".{version}.tmp")
+        os.makedirs(staging_dir, exist_ok=True)
+
+        metadata = {"version": version, "data_version": data_version}
+        for name, query in PANEL_QUERIES.items():
+            with stage("snapshot_panel", panel=name) as panel:
+                cursor.execute(query)
+                df = pd.DataFrame(
+                    cursor.fetchall(), columns=[column[0] for column in cursor.description]
+                )
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                table = table.replace_schema_metadata(metadata)
+                write_panel_table(os.path.join(staging_dir, f"{name}.arrow"), table)
+                panel.add(rows=len(df))
+        cursor.close()
+        conn.rollback()
+
+        # Publication : le répertoire complet puis le pointeur, chacun par un renommage atomique
+        os.replace(staging_dir, os.path.join(directory, version))
+        pointer_tmp = os.path.join(directory, f".{SNAPSHOT_POINTER}.tmp")
+        with open(pointer_tmp, "w") as file:
+            file.write(version)
+        os.replace(pointer_tmp, os.path.join(directory, SNAPSHOT_POINTER))
+
+        # Suppression des anciens instantanés (les fichiers encore mappés restent lisibles)
+        versions = sorted(
+            entry
+            for entry in os.listdir(directory)
+            if not entry.startswith(".") and entry != SNAPSHOT_POINTER
+        )
+        for old_version in versions[:-SNAPSHOTS_KEPT]:
+            shutil.rmtree(os.path.join(directory, old_version), ignore_errors=True)
+
+        print(f"Instantané du dashboard {version} écrit ({len(PANEL_QUERIES)} panneaux).")
+        return True
+
+    except Exception as e:
+        print(f"Erreur lors de l'écriture de l'instantané du dashboard : {e}")
+        conn.rollback()
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return False
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if write_dashboard_snapshot() else 1)
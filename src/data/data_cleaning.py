@@ -0,0 +1,141 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# Reason codes written to the quarantine table, in evaluation order.
+# A row failing several rules is quarantined with the first one.
+REJECT_RULES = [
+    "MISSING_TIMESTAMP",
+    "OUT_OF_RANGE_TIMESTAMP",
+    "DROPOFF_BEFORE_PICKUP",
+    "ZERO_DISTANCE",
+    "NEGATIVE_AMOUNT",
+]
+
+# Amount columns that must never be negative (those present in the dataset)
+AMOUNT_COLUMNS = ["fare_amount", "total_amount"]
+
+# Oldest pickup accepted when the period of the file is unknown
+MIN_PICKUP_DATE = pd.Timestamp("2009-01-01")
+
+# Slack allowed around the month of a file (trips started just before midnight)
+PERIOD_TOLERANCE = pd.Timedelta(days=1)
+
+FILE_PERIOD_PATTERN = re.compile(r"(\d{4})-(\d{2})\.parquet$")
+
+
+def period_from_file_name(file_name: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    Deduce the month covered by a TLC file from its name.
+
+    Parameters:
+        - file_name (str): The file name, e.g. yellow_tripdata_2024-01.parquet
+
+    Returns:
+        - Optional[Tuple[pd.Timestamp, pd.Timestamp]]: The [start, end) bounds of the month, None if
+        the name does not contain a period
+    """
+    match = FILE_PERIOD_PATTERN.search(file_name)
+    if match is None:
+        return None
+    start = pd.Timestamp(year=int(match.group(1)), month=int(match.group(2)), day=1)
+    return start, start + pd.DateOffset(months=1)
+
+
+def _rule_masks(
+    dataframe: pd.DataFrame,
+    period: Optional[Tuple[pd.Timestamp, pd.Timestamp]],
+    rules: List[str],
+) -> Dict[str, np.ndarray]:
+    """
+    Evaluate the given rules over whole columns and return one boolean mask per reason code.
+    """
+    pickup = dataframe["tpep_pickup_datetime"].to_numpy(dtype="datetime64[ns]")
+    dropoff = dataframe["tpep_dropoff_datetime"].to_numpy(dtype="datetime64[ns]")
+
+    if period is None:
+        lower = MIN_PICKUP_DATE
+        upper = pd.Timestamp.now().normalize() + PERIOD_TOLERANCE
+    else:
+        lower = period[0] - PERIOD_TOLERANCE
+        upper = period[1] + PERIOD_TOLERANCE
+    lower = np.datetime64(lower, "ns")
+    upper = np.datetime64(upper, "ns")
+
+    masks = {}
+
+    # NaT compares False with everything, so missing values only hit the first rule
+    if "MISSING_TIMESTAMP" in rules:
+        masks["MISSING_TIMESTAMP"] = np.isnat(pickup) | np.isnat(dropoff)
+    if "OUT_OF_RANGE_TIMESTAMP" in rules:
+        masks["OUT_OF_RANGE_TIMESTAMP"] = (
+            (pickup < lower) | (pickup >= upper) | (dropoff >= upper)
+        )
+    if "DROPOFF_BEFORE_PICKUP" in rules:
+        masks["DROPOFF_BEFORE_PICKUP"] = dropoff < pickup
+
+    if "ZERO_DISTANCE" in rules:
+        distance = dataframe["trip_distance"].to_numpy(dtype="float64", na_value=np.nan)
+        masks["ZERO_DISTANCE"] = ~(distance > 0)
+
+    if "NEGATIVE_AMOUNT" in rules:
+        negative_amount = np.zeros(len(dataframe), dtype=bool)
+        for column in [c for c in AMOUNT_COLUMNS if c in dataframe.columns]:
+            negative_amount |= (
+                dataframe[column].to_numpy(dtype="float64", na_value=np.nan) < 0
+            )
+        masks["NEGATIVE_AMOUNT"] = negative_amount
+
+    return masks
+
+
+def clean_trips(
+    dataframe: pd.DataFrame,
+    period: Optional[Tuple[pd.Timestamp, pd.Timestamp]] = None,
+    rules: Optional[List[str]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, int]]:
+    """
+    Split a trip Dataframe into valid and rejected rows using vectorized masks.
+
+    Parameters:
+        - dataframe (pd.DataFrame): The trips, with lowercase column names
+        - period (Optional[Tuple[pd.Timestamp, pd.Timestamp]]): The [start, end) month the file
+        covers, used for the timestamp range rule
+        - rules (Optional[List[str]]): The rules to apply, in REJECT_RULES order, all of them by
+        default (the FHV files have no distance nor amounts)
+
+    Returns:
+        - Tuple[pd.DataFrame, pd.DataFrame, Dict[str, int]]: The clean rows, the rejected rows with
+        a `reject_reason` column, and the number of rows failing each rule (a row can fail several)
+    """
+    rules = [rule for rule in REJECT_RULES if rules is None or rule in rules]
+    masks = _rule_masks(dataframe, period, rules)
+    reject_counts = {rule: int(masks[rule].sum()) for rule in rules}
+
+    conditions = [masks[rule] for rule in rules]
+    rejected_mask = np.logical_or.reduce(conditions)
+
+    rejected = dataframe[rejected_mask].copy()
+    rejected["reject_reason"] = np.select(
+        [condition[rejected_mask] for condition in conditions], rules, default=""
+    )
+    clean = dataframe[~rejected_mask]
+
+    return clean, rejected, reject_counts
+
+
+def format_reject_counts(reject_counts: Dict[str, int], total_rows: int) -> str:
+    """
+    Render the per-rule reject counts on a single line for the load logs.
+    """
+    details = ", ".join(f"{rule}={count}" for rule, count in reject_counts.items())
+    return f"{total_rows} rows checked: {details}"
@@ -7,10 +7,16 @@
 """
 
 import os
+import io
+import json
+import tempfile
 import urllib.request
 from minio import Minio
+from minio.error import S3Error
 from datetime import datetime
 from dotenv import load_dotenv
+from datasets import dataset_file_name, dataset_file_url, dataset_of_file, get_dataset
+from instrumentation import current_stage, instrumented, stage
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,6 +28,7 @@ access_key = os.getenv("MINIO_ACCESS_KEY")
 secret_key = os.getenv("MINIO_SECRET_KEY")
 
 
+@instrumented()
 def download_all_files():
 
     today = datetime.now()
@@ -65,6 +72,7 @@ def download_all_files():
             try:
                 # Download the file and save it locally
                 urllib.request.urlretrieve(file_url, save_path)
+                current_stage().add(bytes=os.path.getsize(save_path))
                 print(f"Downloaded {data_file} to {save_path}")
                 # upload_to_minio(data_file, save_path)  # Uncomment if needed
             except Exception as e:
@@ -153,6 +161,7 @@ def download_file_csv():
         print(f"The file {data_file} does not exist")
 
 
+@instrumented()
 def write_data_minio():
     # Upload all the file to Minio.
     client = Minio(
@@ -172,6 +181,7 @@ def write_data_minio():
             file_path = os.path.join(save_dir, file_name)
             try:
                 client.fput_object(bucket, file_name, file_path)
+                current_stage().add(bytes=os.path.getsize(file_path))
                 print(f"Uploaded {file_name} to the Minio {bucket} bucket")
             except Exception as e:
                 print(f"Failed to download {file_name} to Minio: {e}")
@@ -204,3 +214,198 @@ def upload_to_minio(file_name, file_path):
             print(f"Uploaded {file_name} to the Minio {bucket} bucket")
         except Exception as e:
             print(f"Failed to download {file_name} to Minio: {e}")
+
+
+def get_minio_client() -> Minio:
+    # Client Minio built from the environment variables
+    return Minio(
+        f"{hostname}:{port}", secure=False, access_key=access_key, secret_key=secret_key
+    )
+
+
+def list_recent_month_files(
+    months: int = 12, today: datetime = None, dataset: str = "yellow"
+) -> list:
+    """
+    List the files of a dataset for the last months that are published by the TLC.
+
+    Parameters:
+        - months (int): Number of months to look back from the previous month
+        - today (datetime): Reference date, now by default
+        - dataset (str): The dataset (yellow, green, fhv, fhvhv, see datasets.py)
+
+    Returns:
+        - list: The published file names, oldest first
+    """
+    today = today or datetime.now()
+    year, month = today.year, today.month
+
+    files = []
+    for _ in range(months):
+        month -= 1
+        if month == 0:
+            month = 12
+            year -= 1
+        data_file = dataset_file_name(dataset, year, month)
+        if get_remote_file_info(dataset_file_url(data_file)) is not None:
+            files.append(data_file)
+    return sorted(files)
+
+
+def get_remote_file_info(file_url: str) -> dict:
+    """
+    Read the ETag and size of a published file with a HEAD request (no download).
+
+    Returns:
+        - dict: {"etag", "size"} of the file, None if it does not exist
+    """
+    try:
+        request = urllib.request.Request(file_url, method="HEAD")
+        with urllib.request.urlopen(request) as response:
+            return {
+                "etag": response.headers.get("ETag", "").strip('"'),
+                "size": int(response.headers.get("Content-Length", 0)),
+            }
+    except urllib.error.HTTPError:
+        return None
+
+
+def manifest_key(file_name: str) -> str:
+    # One manifest per file so that parallel uploads never rewrite the same object
+    return f"_manifest/{file_name}.json"
+
+
+def loaded_marker_key(file_name: str) -> str:
+    # Manifest of the upload last loaded into the warehouse and the data mart
+    return f"_manifest/{file_name}.loaded.json"
+
+
+def read_manifest(client: Minio, bucket: str, file_name: str, key: str = None) -> dict:
+    """
+    Read the manifest written by sync_file_to_minio for a file, None if there is none.
+
+    key reads another object of the file instead, e.g. its loaded marker.
+    """
+    try:
+        response = client.get_object(bucket, key or manifest_key(file_name))
+        try:
+            return json.loads(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+    except S3Error:
+        return None
+
+
+def write_manifest(
+    client: Minio, bucket: str, file_name: str, manifest: dict, key: str = None
+) -> None:
+    """
+    Write the manifest of a file next to it in the bucket (or the object named by key).
+    """
+    data = json.dumps(manifest).encode("utf-8")
+    client.put_object(
+        bucket,
+        key or manifest_key(file_name),
+        io.BytesIO(data),
+        len(data),
+        content_type="application/json",
+    )
+
+
+def _file_bucket(file_name: str, bucket: str = None) -> str:
+    # Bucket of the dataset of a file when none is given
+    return bucket or get_dataset(dataset_of_file(file_name) or "yellow")["bucket"]
+
+
+def needs_loading(file_name: str, bucket: str = None) -> bool:
+    """
+    Tell whether the uploaded version of a file has not been loaded yet.
+
+    The manifest of the upload is compared with the loaded marker written by
+    mark_file_loaded: a month whose load failed after its upload is loaded again by the next
+    run, even though its file is unchanged upstream.
+
+    Parameters:
+        - file_name (str): The TLC file name, e.g. yellow_tripdata_2024-01.parquet
+        - bucket (str): The Minio bucket, the bucket of the dataset of the file by default
+
+    Returns:
+        - bool: True if the file was uploaded and its upload is not the one last loaded
+    """
+    bucket = _file_bucket(file_name, bucket)
+    client = get_minio_client()
+    manifest = read_manifest(client, bucket, file_name)
+    if manifest is None:
+        return False
+    loaded = read_manifest(client, bucket, file_name, loaded_marker_key(file_name))
+    return loaded is None or any(loaded.get(k) != manifest[k] for k in ("etag", "size"))
+
+
+def mark_file_loaded(file_name: str, bucket: str = None) -> None:
+    """
+    Record the current upload of a file as loaded, once the warehouse and the data mart hold it.
+    """
+    bucket = _file_bucket(file_name, bucket)
+    client = get_minio_client()
+    manifest = read_manifest(client, bucket, file_name)
+    if manifest is None:
+        return
+    write_manifest(
+        client,
+        bucket,
+        file_name,
+        dict(manifest, loaded_at=datetime.now().isoformat()),
+        loaded_marker_key(file_name),
+    )
+
+
+def sync_file_to_minio(file_name: str, bucket: str = None) -> bool:
+    """
+    Copy a published TLC file to Minio only when it is new or changed upstream.
+
+    The ETag and size returned by a HEAD request are compared with the manifest stored with
+    the previous upload, so unchanged months cost one HEAD and one small GET. Whether the
+    upload was loaded is told by needs_loading, not by this function.
+
+    Parameters:
+        - file_name (str): The TLC file name, e.g. yellow_tripdata_2024-01.parquet
+        - bucket (str): The Minio bucket, the bucket of the dataset of the file by default
+
+    Returns:
+        - bool: True if the file was uploaded (new or changed), False if it was unchanged
+    """
+    file_url = dataset_file_url(file_name)
+    bucket = _file_bucket(file_name, bucket)
+
+    client = get_minio_client()
+    if not client.bucket_exists(bucket):
+        client.make_bucket(bucket)
+        print(f"Bucket {bucket} created")
+
+    remote = get_remote_file_info(file_url)
+    if remote is None:
+        print(f"The file {file_name} is not published")
+        return False
+
+    manifest = read_manifest(client, bucket, file_name)
+    if manifest is not None and all(manifest.get(k) == v for k, v in remote.items()):
+        print(f"File {file_name} unchanged since its last upload, skipping.")
+        return False
+
+    # Streamed to a temporary file: the whole file is never held in memory
+    with tempfile.NamedTemporaryFile(suffix=".parquet") as tmp:
+        with stage("minio_sync", file=file_name) as metrics:
+            with stage("download"):
+                urllib.request.urlretrieve(file_url, tmp.name)
+            with stage("minio_upload"):
+                client.fput_object(bucket, file_name, tmp.name)
+            metrics.add(bytes=os.path.getsize(tmp.name))
+    write_manifest(
+        client,
+        bucket,
+        file_name,
+        dict(remote, uploaded_at=datetime.now().isoformat()),
+    )
+    print(f"Uploaded {file_name} to the Minio {bucket} bucket")
+    return True
@@ -0,0 +1,34 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+# Version of the content of the data mart, read by the dashboard caches (see
+# src/visualization/streamlit_pages/result_cache.py) and by the dashboard snapshot: every
+# committed load increments it, a full reload or a dimension load included
+
+
+def bump_datamart_version(cursor) -> None:
+    """
+    Increment the version of the data mart, without committing.
+
+    The single row of datamart_version stays locked until the commit, so call it last in
+    the transaction of a load: concurrent loads only wait for each other's commit.
+    """
+    cursor.execute(
+        "INSERT INTO datamart_version (id, version, updated_at) VALUES (TRUE, 1, now()) "
+        "ON CONFLICT (id) DO UPDATE SET version = datamart_version.version + 1, "
+        "updated_at = now()"
+    )
+
+
+def read_datamart_version(cursor) -> str:
+    """
+    Return the version of the data mart, "empty" if nothing was ever loaded.
+    """
+    cursor.execute("SELECT version FROM datamart_version")
+    row = cursor.fetchone()
+    return "empty" if row is None else str(row[0])
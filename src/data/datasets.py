@@ -0,0 +1,192 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from data_cleaning import REJECT_RULES
+from key_mapping import FACT_KEY_COLUMNS, FACT_MEASURE_COLUMNS
+from parquet_reader import FHV_SCHEMA, FHVHV_SCHEMA, TRIP_SCHEMA
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Publication site of the TLC trip record files
+TLC_BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data/"
+
+# Warehouse table of the yellow trips, the historical one
+wh_dbms_table = os.getenv("WH_DBMS_TABLE", "warehouse")
+
+# Columns identifying a yellow or green trip, hashed to drop the duplicates (see trip_dedup.py)
+TRIP_DEDUP_KEYS = [
+    "vendorid",
+    "tpep_pickup_datetime",
+    "tpep_dropoff_datetime",
+    "pulocationid",
+    "dolocationid",
+    "passenger_count",
+    "trip_distance",
+    "payment_type",
+    "total_amount",
+]
+
+# Fact key columns of the datasets without vendor nor payment type
+ZONE_TIME_KEY_COLUMNS = [
+    "id_time_pickup",
+    "id_time_dropoff",
+    "id_zone_pickup",
+    "id_zone_dropoff",
+]
+
+# Registry of the TLC datasets, from the published file to the datamart fact table:
+#   - file_prefix: name of the monthly files, {file_prefix}_{YYYY}-{MM}.parquet
+#   - bucket: Minio bucket of the files
+#   - schema / renames: canonical schema and dataset specific renames of the Parquet reader
+#   - reject_rules: cleaning rules that apply to the columns of the dataset
+#   - warehouse_table: table of the clean trips in the warehouse
+#   - dedup_keys: columns identifying a trip, the duplicates are dropped before the warehouse load
+#     (a trip with a NULL one is always kept, see trip_dedup.py)
+#   - fact_table / fact_keys / fact_measures: target fact table and its columns
+#   - profile: whether the monthly loads are profiled for drift detection (see profiling.py)
+#   - rollup: whether the monthly loads refresh the time rollup pyramid (see rollup.py)
+#   - wide: whether the fact table has a denormalized copy, built when DATAMART_WIDE_FACT=true (see wide_fact.py)
+DATASETS = {
+    "yellow": {
+        "file_prefix": "yellow_tripdata",
+        "bucket": "yellow-tripdata",
+        "schema": TRIP_SCHEMA,
+        "renames": {},
+        "reject_rules": REJECT_RULES,
+        "warehouse_table": wh_dbms_table,
+        "dedup_keys": TRIP_DEDUP_KEYS,
+        "fact_table": "fact_yellow_taxi",
+        "fact_keys": list(FACT_KEY_COLUMNS),
+        "fact_measures": FACT_MEASURE_COLUMNS,
+        "profile": True,
+        "rollup": True,
+        "wide": True,
+    },
+    "green": {
+        "file_prefix": "green_tripdata",
+        "bucket": "green-tripdata",
+        "schema": TRIP_SCHEMA,
+        "renames": {
+            "lpep_pickup_datetime": "tpep_pickup_datetime",
+            "lpep_dropoff_datetime": "tpep_dropoff_datetime",
+        },
+        "reject_rules": REJECT_RULES,
+        "warehouse_table": "warehouse_green",
+        "dedup_keys": TRIP_DEDUP_KEYS,
+        "fact_table": "fact_green_taxi",
+        "fact_keys": list(FACT_KEY_COLUMNS),
+        "fact_measures": FACT_MEASURE_COLUMNS,
+        "profile": False,
+        "rollup": False,
+        "wide": False,
+    },
+    "fhv": {
+        "file_prefix": "fhv_tripdata",
+        "bucket": "fhv-tripdata",
+        "schema": FHV_SCHEMA,
+        "renames": {},
+        "reject_rules": [
+            "MISSING_TIMESTAMP",
+            "OUT_OF_RANGE_TIMESTAMP",
+            "DROPOFF_BEFORE_PICKUP",
+        ],
+        "warehouse_table": "warehouse_fhv",
+        "dedup_keys": [
+            "dispatching_base_num",
+            "tpep_pickup_datetime",
+            "tpep_dropoff_datetime",
+            "pulocationid",
+            "dolocationid",
+            "affiliated_base_number",
+        ],
+        "fact_table": "fact_fhv_trip",
+        "fact_keys": ZONE_TIME_KEY_COLUMNS,
+        "fact_measures": [],
+        "profile": False,
+        "rollup": False,
+        "wide": False,
+    },
+    "fhvhv": {
+        "file_prefix": "fhvhv_tripdata",
+        "bucket": "fhvhv-tripdata",
+        "schema": FHVHV_SCHEMA,
+        "renames": {
+            "trip_miles": "trip_distance",
+            "base_passenger_fare": "fare_amount",
+            "tolls": "tolls_amount",
+            "tips": "tip_amount",
+        },
+        "reject_rules": REJECT_RULES,
+        "warehouse_table": "warehouse_fhvhv",
+        "dedup_keys": [
+            "hvfhs_license_num",
+            "dispatching_base_num",
+            "tpep_pickup_datetime",
+            "tpep_dropoff_datetime",
+            "pulocationid",
+            "dolocationid",
+            "trip_distance",
+            "fare_amount",
+        ],
+        "fact_table": "fact_fhvhv_trip",
+        "fact_keys": ZONE_TIME_KEY_COLUMNS,
+        "fact_measures": [
+            "trip_distance",
+            "trip_time",
+            "fare_amount",
+            "tolls_amount",
+            "bcf",
+            "sales_tax",
+            "congestion_surcharge",
+            "airport_fee",
+            "tip_amount",
+            "driver_pay",
+        ],
+        "profile": False,
+        "rollup": False,
+        "wide": False,
+    },
+}
+
+
+def get_dataset(name: str) -> Dict:
+    """
+    Return the registry entry of a dataset, raise a ValueError for an unknown one.
+    """
+    if name not in DATASETS:
+        raise ValueError(f"Unknown dataset {name}, expected one of {', '.join(DATASETS)}")
+    return DATASETS[name]
+
+
+def dataset_file_name(name: str, year: int, month: int) -> str:
+    """
+    Build the name of the monthly file of a dataset, e.g. green_tripdata_2024-01.parquet.
+    """
+    return f"{get_dataset(name)['file_prefix']}_{year}-{month:02d}.parquet"
+
+
+def dataset_of_file(file_name: str) -> Optional[str]:
+    """
+    Find the dataset of a monthly file from its name, None if no dataset matches.
+    """
+    base_name = os.path.basename(file_name)
+    for name, dataset in DATASETS.items():
+        if base_name.startswith(f"{dataset['file_prefix']}_"):
+            return name
+    return None
+
+
+def dataset_file_url(file_name: str) -> str:
+    """
+    Return the URL of a monthly file on the TLC publication site.
+    """
+    return f"{TLC_BASE_URL}{os.path.basename(file_name)}"
@@ -7,9 +7,34 @@
 """
 
 import psycopg2
-from sqlalchemy import create_engine
 import os
+from io import StringIO
 from data_function import download_file_csv
+from datamart_version import bump_datamart_version
+from datasets import get_dataset
+from instrumentation import CountingCursor, current_stage, instrumented, stage
+from dimension import (
+    payment_members,
+    time_members,
+    upsert_dimension,
+    vendor_members,
+    zone_members,
+)
+from key_mapping import (
+    FACT_KEY_COLUMNS,
+    KeyMap,
+    load_dimension_key_maps,
+    map_fact_batch,
+)
+from kpi_summary import delete_kpi_summary, update_kpi_summary
+from rollup import clear_rollups, refresh_rollups
+from wide_fact import clear_wide_fact, refresh_wide_fact, sync_label_types
+from profiling import (
+    detect_drift,
+    new_fact_profile,
+    save_fact_profile,
+    update_fact_profile,
+)
 import pandas as pd
 from psycopg2 import sql
 from dotenv import load_dotenv
@@ -25,6 +50,20 @@ dm_dbms_ip = os.getenv("DM_DBMS_IP")
 dm_dbms_port = os.getenv("DM_DBMS_PORT")
 dm_dbms_database = os.getenv("DM_DBMS_DATABASE")
 
+# Config warehouse
+wh_dbms_username = os.getenv("WH_DBMS_USERNAME")
+wh_dbms_password = os.getenv("WH_DBMS_PASSWORD")
+wh_dbms_ip = os.getenv("WH_DBMS_IP")
+wh_dbms_port = os.getenv("WH_DBMS_PORT")
+wh_dbms_database = os.getenv("WH_DBMS_DATABASE")
+wh_dbms_table = os.getenv("WH_DBMS_TABLE")
+
+# Number of warehouse rows mapped and copied per batch
+FACT_BATCH_SIZE = 100000
+
+# Build the denormalized copy of the fact tables that have one (see wide_fact.py)
+datamart_wide_fact = os.getenv("DATAMART_WIDE_FACT", "false").lower() == "true"
+
 
 def execute_sql_script(conn, script_path):
     """
@@ -50,6 +89,7 @@ def execute_sql_script(conn, script_path):
         return False
 
 
+@instrumented()
 def create_datamart_olap() -> bool:
     """
     Create the Data Mart OLAP schema and tables by executing creation.sql and insertion.sql.
@@ -91,7 +131,7 @@ def create_datamart_olap() -> bool:
             f"{db_config['dbms_engine']}://{db_config['dbms_username']}:{db_config['dbms_password']}@"
             f"{db_config['dbms_ip']}:{db_config['dbms_port']}/{db_config['dbms_database']}"
         )
-        conn = psycopg2.connect(db_config["database_url"])
+        conn = psycopg2.connect(db_config["database_url"], cursor_factory=CountingCursor)
         conn.autocommit = True
 
         # Path to SQL scripts
@@ -133,6 +173,7 @@ def connect_to_db():
             user=dm_dbms_username,
             password=dm_dbms_password,
             dbname=dm_dbms_database,
+            cursor_factory=CountingCursor,
         )
         return connection
     except Exception as e:
@@ -140,6 +181,538 @@ def connect_to_db():
         return None
 
 
+# Fonction pour se connecter au data warehouse
+def connect_to_warehouse():
+    try:
+        connection = psycopg2.connect(
+            host=wh_dbms_ip,
+            port=wh_dbms_port,
+            user=wh_dbms_username,
+            password=wh_dbms_password,
+            dbname=wh_dbms_database,
+            cursor_factory=CountingCursor,
+        )
+        return connection
+    except Exception as e:
+        print(f"Erreur de connexion au data warehouse : {e}")
+        return None
+
+
+def copy_fact_batch(cursor, fact: pd.DataFrame, table: str = "fact_yellow_taxi") -> None:
+    """
+    Append mapped fact rows to a fact table with a single COPY.
+
+    Args:
+        cursor (psycopg2.cursor): Cursor on the datamart.
+        fact (pd.DataFrame): Rows returned by key_mapping.map_fact_batch.
+        table (str): The fact table.
+    """
+    buffer = StringIO()
+    fact.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(fact.columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def key_map_names(dataset: str = "yellow") -> list:
+    """
+    Return the dimensions whose key maps a dataset needs, the time dimension being mapped per batch.
+    """
+    fact_keys = get_dataset(dataset)["fact_keys"]
+    names = {FACT_KEY_COLUMNS[column][1] for column in fact_keys}
+    return sorted(names - {"time"})
+
+
+def load_fact_rows(
+    dm_conn,
+    wh_conn,
+    key_maps,
+    period=None,
+    batch_size: int = FACT_BATCH_SIZE,
+    on_batch=None,
+    dataset: str = "yellow",
+    dim_conn=None,
+):
+    """
+    Map and copy the warehouse trips of a period into the fact table of a dataset, without committing.
+
+    The time members of each batch are upserted first and the batch is mapped against them,
+    so the (large) time dimension never has to be held in memory. The counters of
+    kpi_fact_summary are added batch by batch in the same transaction as the copies.
+
+    With dim_conn, the time members are upserted and committed on that connection batch by
+    batch: their rows are not locked until the end of the load, so the loads of adjacent
+    months, which share time members, can run concurrently.
+
+    Args:
+        dm_conn (psycopg2.connection): Connection to the datamart.
+        wh_conn (psycopg2.connection): Connection to the warehouse.
+        key_maps (dict): Key maps of the vendor, zone and payment dimensions.
+        period (tuple): [start, end) bounds on the pickup time, the whole warehouse if None.
+        batch_size (int): Number of warehouse rows fetched, mapped and copied at a time.
+        on_batch (callable): Called with each mapped fact batch (profiling, ...).
+        dataset (str): The dataset (see datasets.py), yellow taxis by default.
+        dim_conn (psycopg2.connection): Connection committing the time members, dm_conn if None.
+
+    Returns:
+        tuple: The number of fact rows and the number of unknown keys per fact key column.
+    """
+    spec = get_dataset(dataset)
+    source_columns = list(
+        dict.fromkeys(FACT_KEY_COLUMNS[column][0] for column in spec["fact_keys"])
+    )
+    source_columns += [c for c in spec["fact_measures"] if c not in source_columns]
+
+    query = f"SELECT {', '.join(source_columns)} FROM {spec['warehouse_table']}"
+    params = None
+    if period is not None:
+        query += " WHERE tpep_pickup_datetime >= %s AND tpep_pickup_datetime < %s"
+        params = period
+
+    # Server-side cursor so that the warehouse is streamed batch by batch
+    wh_cursor = wh_conn.cursor(name=f"{spec['fact_table']}_source")
+    wh_cursor.itersize = batch_size
+    wh_cursor.execute(query, params)
+
+    dm_cursor = dm_conn.cursor()
+    total_rows = 0
+    total_misses = {column: 0 for column in spec["fact_keys"]}
+    while True:
+        with stage("warehouse_fetch") as fetch:
+            rows = wh_cursor.fetchmany(batch_size)
+            fetch.add(rows=len(rows))
+        if not rows:
+            break
+
+        with stage("time_dimension"):
+            batch = pd.DataFrame(rows, columns=source_columns)
+            members = time_members(
+                pd.concat([batch["tpep_pickup_datetime"], batch["tpep_dropoff_datetime"]])
+            )
+            upsert_dimension(
+                dim_conn or dm_conn, "dimension_time", "id_time", members, scd_columns=[]
+            )
+            if dim_conn is not None:
+                dim_conn.commit()
+        batch_key_maps = dict(key_maps, time=KeyMap(members["id_time"], members["id_time"]))
+
+        with stage("key_mapping") as mapping:
+            fact, miss_counts = map_fact_batch(
+                batch, batch_key_maps, spec["fact_keys"], spec["fact_measures"]
+            )
+            mapping.add(rows=len(fact))
+        with stage("fact_copy") as copy:
+            copy_fact_batch(dm_cursor, fact, spec["fact_table"])
+            copy.add(rows=len(fact))
+        # Indicateurs du dashboard mis à jour dans la transaction de la copie
+        with stage("kpi_summary"):
+            update_kpi_summary(dm_cursor, spec["fact_table"], fact)
+        if on_batch is not None:
+            with stage("profiling"):
+                on_batch(fact)
+        current_stage().add(rows=len(fact))
+
+        total_rows += len(fact)
+        for column, count in miss_counts.items():
+            total_misses[column] += count
+
+    wh_cursor.close()
+    dm_cursor.close()
+    return total_rows, total_misses
+
+
+def clear_fact_table(dm_conn, dataset: str = "yellow", truncate: bool = True) -> None:
+    """
+    Empty the fact table of a dataset and everything derived from it, without committing.
+
+    The checkpoints, the KPI counters and, for the datasets that have them, the rollups and
+    the wide fact rows are removed with the facts. TRUNCATE holds an ACCESS EXCLUSIVE lock
+    until the commit, which blocks every dashboard query: it suits a restart committed at
+    once. A load that empties the table in its own long transaction deletes the facts
+    instead (truncate=False), readers keep seeing the previous ones until it commits; its
+    full refreshes of the rollups and the wide fact rows replace them (see rollup.py).
+
+    Args:
+        dm_conn (psycopg2.connection): Connection to the datamart.
+        dataset (str): The dataset (see datasets.py), yellow taxis by default.
+        truncate (bool): TRUNCATE the tables instead of deleting the facts.
+    """
+    spec = get_dataset(dataset)
+    cursor = dm_conn.cursor()
+    if truncate:
+        cursor.execute(f"TRUNCATE {spec['fact_table']}")
+    else:
+        cursor.execute(f"DELETE FROM {spec['fact_table']}")
+    cursor.execute(
+        "DELETE FROM datamart_build_checkpoint WHERE fact_table = %s",
+        (spec["fact_table"],),
+    )
+    delete_kpi_summary(cursor, spec["fact_table"])
+    if truncate and spec["rollup"]:
+        clear_rollups(dm_conn)
+    if truncate and spec["wide"]:
+        clear_wide_fact(dm_conn)
+    cursor.close()
+
+
+def load_fact_yellow_taxi(batch_size: int = FACT_BATCH_SIZE) -> bool:
+    """
+    Populate fact_yellow_taxi from the warehouse through the in-memory key mapping stage.
+
+    The dimension key maps are loaded once, each warehouse batch is mapped vectorially and keys
+    missing from a dimension are routed to its unknown member instead of failing the foreign key.
+    The whole load is one transaction, which first deletes the facts (see clear_fact_table):
+    the dashboard reads the previous facts until the commit, and running it again replaces
+    them instead of duplicating them. It records no checkpoint,
+    see build_datamart_chunked (restart=True after this load) for a resumable load.
+
+    Args:
+        batch_size (int): Number of warehouse rows fetched, mapped and copied at a time.
+
+    Returns:
+        bool: True if the fact table was populated, False otherwise.
+    """
+    dm_conn = connect_to_db()
+    wh_conn = connect_to_warehouse()
+    if dm_conn is None or wh_conn is None:
+        return False
+
+    try:
+        if datamart_wide_fact:
+            sync_label_types(dm_conn)
+        key_maps = load_dimension_key_maps(dm_conn, ["vendor", "zone", "payment"])
+        print(
+            "Key maps loaded: "
+            + ", ".join(f"{name}={len(key_map)}" for name, key_map in key_maps.items())
+        )
+
+        with stage("datamart_full_load", fact_table="fact_yellow_taxi"):
+            # DELETE et non TRUNCATE : le dashboard lit les faits précédents jusqu'au commit,
+            # et un échec du chargement les laisse en place
+            clear_fact_table(dm_conn, truncate=False)
+            total_rows, total_misses = load_fact_rows(
+                dm_conn, wh_conn, key_maps, batch_size=batch_size
+            )
+            with stage("rollup"):
+                refresh_rollups(dm_conn)
+            if datamart_wide_fact:
+                with stage("wide_fact"):
+                    refresh_wide_fact(dm_conn)
+            cursor = dm_conn.cursor()
+            bump_datamart_version(cursor)
+            cursor.close()
+            dm_conn.commit()
+
+        print(f"{total_rows} lignes insérées dans fact_yellow_taxi.")
+        print(
+            "Clés inconnues : "
+            + ", ".join(f"{column}={count}" for column, count in total_misses.items())
+        )
+        return True
+
+    except Exception as e:
+        print(f"Erreur lors du chargement de fact_yellow_taxi : {e}")
+        dm_conn.rollback()
+        return False
+
+    finally:
+        wh_conn.close()
+        dm_conn.close()
+
+
+def list_warehouse_months(wh_conn, table: str = None) -> list:
+    """
+    List the [start, end) bounds of every month with pickups in a warehouse table, oldest first.
+    """
+    table = table or wh_dbms_table
+    cursor = wh_conn.cursor()
+    cursor.execute(
+        f"SELECT DISTINCT date_trunc('month', tpep_pickup_datetime) AS month "
+        f"FROM {table} WHERE tpep_pickup_datetime IS NOT NULL ORDER BY month"
+    )
+    months = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return [(month, month + pd.DateOffset(months=1)) for month in months]
+
+
+def completed_chunks(dm_conn, fact_table: str = "fact_yellow_taxi") -> set:
+    """
+    Return the keys of the chunks of a fact table already recorded in datamart_build_checkpoint.
+    """
+    cursor = dm_conn.cursor()
+    cursor.execute(
+        "SELECT chunk_key FROM datamart_build_checkpoint WHERE fact_table = %s",
+        (fact_table,),
+    )
+    chunks = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    dm_conn.commit()
+    return chunks
+
+
+def load_datamart_chunk(
+    dm_conn,
+    wh_conn,
+    key_maps,
+    start,
+    end,
+    batch_size: int = FACT_BATCH_SIZE,
+    replace: bool = False,
+    dataset: str = "yellow",
+    dim_conn=None,
+):
+    """
+    Load the facts of one month and record its checkpoint in a single transaction.
+
+    The KPI counters and, for the datasets that have them, the rollups and the wide fact rows
+    of the month are refreshed in the same transaction, so readers never see them out of step.
+    The loads of the same month are serialized by an advisory lock, a reload waits for a
+    concurrent one to commit instead of duplicating its facts.
+
+    Args:
+        dm_conn (psycopg2.connection): Connection to the datamart.
+        wh_conn (psycopg2.connection): Connection to the warehouse.
+        key_maps (dict): Key maps of the vendor, zone and payment dimensions.
+        start (datetime): First pickup time of the month (inclus).
+        end (datetime): First pickup time of the next month (exclu).
+        batch_size (int): Number of warehouse rows fetched, mapped and copied at a time.
+        replace (bool): Delete the facts and the checkpoint of the month first (reload).
+        dataset (str): The dataset (see datasets.py), yellow taxis by default.
+        dim_conn (psycopg2.connection): Connection committing the time members (see load_fact_rows).
+
+    Returns:
+        tuple: The number of fact rows and the number of unknown keys per fact key column.
+    """
+    spec = get_dataset(dataset)
+    fact_table = spec["fact_table"]
+    chunk_key = start.strftime("%Y-%m")
+    cursor = dm_conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{fact_table}:{chunk_key}",))
+    if replace:
+        # Readers keep seeing the previous version of the month until the commit
+        cursor.execute(
+            f"DELETE FROM {fact_table} "
+            "WHERE id_time_pickup >= EXTRACT(EPOCH FROM %s::timestamp)::INTEGER "
+            "AND id_time_pickup < EXTRACT(EPOCH FROM %s::timestamp)::INTEGER",
+            (start, end),
+        )
+        cursor.execute(
+            "DELETE FROM datamart_build_checkpoint WHERE fact_table = %s AND chunk_key = %s",
+            (fact_table, chunk_key),
+        )
+        delete_kpi_summary(cursor, fact_table, chunk_key)
+
+    profile = new_fact_profile() if spec["profile"] else None
+    rows, misses = load_fact_rows(
+        dm_conn,
+        wh_conn,
+        key_maps,
+        (start, end),
+        batch_size,
+        on_batch=(
+            None if profile is None else lambda fact: update_fact_profile(profile, fact)
+        ),
+        dataset=dataset,
+        dim_conn=dim_conn,
+    )
+    if profile is not None:
+        save_fact_profile(dm_conn, chunk_key, profile)
+    if spec["rollup"]:
+        with stage("rollup"):
+            refresh_rollups(dm_conn, (start, end), fact_table)
+    if spec["wide"] and datamart_wide_fact:
+        with stage("wide_fact"):
+            refresh_wide_fact(dm_conn, (start, end), fact_table)
+    cursor.execute(
+        "INSERT INTO datamart_build_checkpoint "
+        "(fact_table, chunk_key, period_start, period_end, rows_loaded, unknown_keys) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        (fact_table, chunk_key, start, end, rows, sum(misses.values())),
+    )
+    bump_datamart_version(cursor)
+    cursor.close()
+    dm_conn.commit()
+    wh_conn.commit()
+    print(
+        f"Chunk {fact_table} {chunk_key} : {rows} lignes, "
+        f"{sum(misses.values())} clés inconnues."
+    )
+
+    # Comparaison des distributions du mois avec les mois précédents
+    if profile is not None:
+        for alert in detect_drift(dm_conn, chunk_key):
+            print(f"Dérive détectée sur {chunk_key} - {alert}")
+        dm_conn.commit()
+    return rows, misses
+
+
+def build_datamart_chunked(
+    batch_size: int = FACT_BATCH_SIZE, restart: bool = False, dataset: str = "yellow"
+) -> bool:
+    """
+    Build the fact table of a dataset one warehouse month at a time, committing after each month.
+
+    Each month (chunk) is loaded in its own transaction together with its row in
+    datamart_build_checkpoint, so a chunk is either fully visible and recorded or not at all.
+    After a crash, calling the function again skips the recorded chunks and resumes with the
+    first missing month.
+
+    Args:
+        batch_size (int): Number of warehouse rows fetched, mapped and copied at a time.
+        restart (bool): Empty the fact table and its checkpoints before building.
+        dataset (str): The dataset (see datasets.py), yellow taxis by default.
+
+    Returns:
+        bool: True if every chunk was built, False otherwise.
+    """
+    spec = get_dataset(dataset)
+    dm_conn = connect_to_db()
+    dim_conn = connect_to_db()
+    wh_conn = connect_to_warehouse()
+    if dm_conn is None or dim_conn is None or wh_conn is None:
+        return False
+
+    try:
+        if restart:
+            clear_fact_table(dm_conn, dataset)
+            cursor = dm_conn.cursor()
+            bump_datamart_version(cursor)
+            cursor.close()
+            dm_conn.commit()
+
+        # Committed at once: the dimension rows are not locked during the chunk transactions
+        prepare_dimensions(dm_conn, wh_conn, dataset)
+        dm_conn.commit()
+        if spec["wide"] and datamart_wide_fact:
+            sync_label_types(dm_conn)
+        key_maps = load_dimension_key_maps(dm_conn, key_map_names(dataset))
+        done = completed_chunks(dm_conn, spec["fact_table"])
+        months = list_warehouse_months(wh_conn, spec["warehouse_table"])
+        # Release the snapshot of the catalog queries before the long per-chunk transactions
+        wh_conn.commit()
+
+        for start, end in months:
+            if start.strftime("%Y-%m") in done:
+                print(f"Chunk {start.strftime('%Y-%m')} déjà chargé, ignoré.")
+                continue
+            with stage(
+                "datamart_chunk", fact_table=spec["fact_table"], chunk=start.strftime("%Y-%m")
+            ):
+                load_datamart_chunk(
+                    dm_conn,
+                    wh_conn,
+                    key_maps,
+                    start,
+                    end,
+                    batch_size,
+                    dataset=dataset,
+                    dim_conn=dim_conn,
+                )
+
+        print("Construction du data mart terminée.")
+        return True
+
+    except Exception as e:
+        print(f"Erreur lors de la construction du data mart : {e}")
+        dm_conn.rollback()
+        dim_conn.rollback()
+        return False
+
+    finally:
+        wh_conn.close()
+        dim_conn.close()
+        dm_conn.close()
+
+
+def rebuild_datamart_month(
+    month_start,
+    batch_size: int = FACT_BATCH_SIZE,
+    dataset: str = "yellow",
+    neighbours: bool = False,
+) -> bool:
+    """
+    Reload the facts of a single month, e.g. after its file changed upstream.
+
+    A monthly file also holds the pickups of the last day of the previous month and of the
+    first day of the next one (see data_cleaning.PERIOD_TOLERANCE): after a warehouse reload of
+    a file, its two neighbouring months are reloaded too (neighbours), each in its own
+    transaction, with their KPI counters and rollups. Only the neighbours already recorded in
+    datamart_build_checkpoint are reloaded, the others get their rows from their own load.
+
+    Args:
+        month_start (datetime): First day of the month to reload.
+        batch_size (int): Number of warehouse rows fetched, mapped and copied at a time.
+        dataset (str): The dataset (see datasets.py), yellow taxis by default.
+        neighbours (bool): Also reload the previous and the next month, if already loaded.
+
+    Returns:
+        bool: True if the months were reloaded, False otherwise.
+    """
+    dm_conn = connect_to_db()
+    dim_conn = connect_to_db()
+    wh_conn = connect_to_warehouse()
+    if dm_conn is None or dim_conn is None or wh_conn is None:
+        return False
+
+    try:
+        start = pd.Timestamp(month_start).to_period("M").to_timestamp()
+        starts = [start]
+        if neighbours:
+            # Un voisin sans checkpoint n'a pas encore été chargé depuis son propre fichier :
+            # le recharger l'enregistrerait avec ses seules lignes débordantes, et
+            # build_datamart_chunked l'ignorerait ensuite. Son propre chargement les reprendra.
+            done = completed_chunks(dm_conn, get_dataset(dataset)["fact_table"])
+            starts = [
+                chunk_start
+                for chunk_start in (
+                    start - pd.DateOffset(months=1),
+                    start,
+                    start + pd.DateOffset(months=1),
+                )
+                if chunk_start == start or chunk_start.strftime("%Y-%m") in done
+            ]
+
+        # Committed at once: the dimension rows are not locked during the chunk transactions
+        prepare_dimensions(dm_conn, wh_conn, dataset)
+        dm_conn.commit()
+        if get_dataset(dataset)["wide"] and datamart_wide_fact:
+            sync_label_types(dm_conn)
+        key_maps = load_dimension_key_maps(dm_conn, key_map_names(dataset))
+        wh_conn.commit()
+
+        for chunk_start in starts:
+            with stage(
+                "datamart_chunk",
+                fact_table=get_dataset(dataset)["fact_table"],
+                chunk=chunk_start.strftime("%Y-%m"),
+            ):
+                load_datamart_chunk(
+                    dm_conn,
+                    wh_conn,
+                    key_maps,
+                    chunk_start,
+                    chunk_start + pd.DateOffset(months=1),
+                    batch_size,
+                    replace=True,
+                    dataset=dataset,
+                    dim_conn=dim_conn,
+                )
+        return True
+
+    except Exception as e:
+        print(f"Erreur lors du rechargement du mois {month_start} : {e}")
+        dm_conn.rollback()
+        dim_conn.rollback()
+        return False
+
+    finally:
+        wh_conn.close()
+        dim_conn.close()
+        dm_conn.close()
+
+
 # Fonction pour insérer les données dans la table PostgreSQL
 def insert_data_from_csv():
     # Lire les données CSV avec pandas
@@ -159,27 +732,18 @@ def insert_data_from_csv():
     if connection is None:
         return
 
-    cursor = connection.cursor()
-
-    # Préparer la requête d'insertion SQL
-    insert_query = sql.SQL(
-        """
-        INSERT INTO dimension_zone (id_zone, borough, name_zone, service_zone)
-        VALUES (%s, %s, %s, %s)
-    """
-    )
-
     try:
-        # Insérer les lignes du DataFrame dans la base de données
-        for index, row in df.iterrows():
-            cursor.execute(
-                insert_query,
-                (row["LocationID"], row["Borough"], row["Zone"], row["service_zone"]),
-            )
+        # Insérer ou mettre à jour toutes les zones en une seule requête
+        upserted = upsert_dimension(
+            connection, "dimension_zone", "id_zone", zone_members(df)
+        )
+        cursor = connection.cursor()
+        bump_datamart_version(cursor)
+        cursor.close()
 
         # Commit des modifications
         connection.commit()
-        print(f"{len(df)} lignes insérées avec succès.")
+        print(f"{upserted} lignes insérées ou mises à jour avec succès.")
 
     except Exception as e:
         print(f"Erreur lors de l'insertion des données : {e}")
@@ -187,10 +751,105 @@ def insert_data_from_csv():
 
     finally:
         # Fermeture de la connexion à la base de données
-        cursor.close()
         connection.close()
 
 
+def populate_dimension_time(dm_conn, wh_conn, batch_size: int = FACT_BATCH_SIZE) -> int:
+    """
+    Upsert the dimension_time members of every pickup and dropoff timestamp of the warehouse.
+
+    Args:
+        dm_conn (psycopg2.connection): Connection to the datamart.
+        wh_conn (psycopg2.connection): Connection to the warehouse.
+        batch_size (int): Number of distinct timestamps upserted per statement.
+
+    Returns:
+        int: The number of members inserted.
+    """
+    wh_cursor = wh_conn.cursor(name="dimension_time_source")
+    wh_cursor.itersize = batch_size
+    wh_cursor.execute(
+        f"SELECT tpep_pickup_datetime FROM {wh_dbms_table} "
+        f"UNION SELECT tpep_dropoff_datetime FROM {wh_dbms_table}"
+    )
+
+    inserted = 0
+    while True:
+        rows = wh_cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        members = time_members(pd.to_datetime([row[0] for row in rows]))
+        # Time attributes never change for a given epoch: keep existing members
+        inserted += upsert_dimension(
+            dm_conn, "dimension_time", "id_time", members, scd_columns=[]
+        )
+    wh_cursor.close()
+    return inserted
+
+
+def prepare_dimensions(dm_conn, wh_conn, dataset: str = "yellow") -> None:
+    """
+    Upsert the payment members and the vendors found in the warehouse, without committing.
+
+    Only the dimensions referenced by the fact table of the dataset are prepared. The version
+    of the data mart is incremented in the same transaction (see datamart_version.py).
+    """
+    spec = get_dataset(dataset)
+    if "id_payment_type" in spec["fact_keys"]:
+        upserted = upsert_dimension(
+            dm_conn, "dimension_payment", "id_payment_type", payment_members()
+        )
+        print(f"dimension_payment : {upserted} membres insérés ou mis à jour.")
+
+    if "id_vendor" in spec["fact_keys"]:
+        wh_cursor = wh_conn.cursor()
+        wh_cursor.execute(f"SELECT DISTINCT vendorid FROM {spec['warehouse_table']}")
+        vendor_ids = [row[0] for row in wh_cursor.fetchall()]
+        wh_cursor.close()
+        upserted = upsert_dimension(
+            dm_conn, "dimension_vendor", "id_vendor", vendor_members(vendor_ids)
+        )
+        print(f"dimension_vendor : {upserted} membres insérés ou mis à jour.")
+
+    cursor = dm_conn.cursor()
+    bump_datamart_version(cursor)
+    cursor.close()
+
+
+def populate_dimensions() -> bool:
+    """
+    Populate the vendor, payment and time dimensions from the warehouse through upsert_dimension.
+
+    The zone dimension comes from the TLC lookup file (see insert_data_from_csv). Every call is
+    idempotent: existing members are updated (type 1) or kept, never duplicated.
+
+    Returns:
+        bool: True if the dimensions were populated, False otherwise.
+    """
+    dm_conn = connect_to_db()
+    wh_conn = connect_to_warehouse()
+    if dm_conn is None or wh_conn is None:
+        return False
+
+    try:
+        prepare_dimensions(dm_conn, wh_conn)
+
+        inserted = populate_dimension_time(dm_conn, wh_conn)
+        print(f"dimension_time : {inserted} membres insérés.")
+
+        dm_conn.commit()
+        return True
+
+    except Exception as e:
+        print(f"Erreur lors du chargement des dimensions : {e}")
+        dm_conn.rollback()
+        return False
+
+    finally:
+        wh_conn.close()
+        dm_conn.close()
+
+
 # Fonction principale
 def main() -> None:
     """
@@ -209,6 +868,26 @@ def main() -> None:
     """
     # insert_data_from_csv()
 
+    """
+        Insert the vendor, payment and time dimensions
+    """
+    # populate_dimensions()
+
+    """
+        Insert the facts through the key mapping stage
+    """
+    # load_fact_yellow_taxi()
+
+    """
+        Or insert the facts month by month, resuming after the last completed month
+    """
+    # build_datamart_chunked()
+
+    """
+        Same for the other datasets (green, fhv, fhvhv, see datasets.py)
+    """
+    # build_datamart_chunked(dataset="green")
+
 
 # Call the main function to start the process
 if __name__ == "__main__":
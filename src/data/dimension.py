@@ -0,0 +1,165 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+# Names of the vendors known by the TLC, the others get DEFAULT_VENDOR_NAME
+VENDOR_NAMES = {
+    1: "Creative Mobile Technologies, LLC",
+    2: "VeriFone Inc.",
+}
+DEFAULT_VENDOR_NAME = "Unknown Vendor"
+
+# Payment types of the TLC data dictionary
+PAYMENT_METHODS = {
+    0: "Voided trip",
+    1: "Credit card",
+    2: "Cash",
+    3: "No charge",
+    4: "Dispute",
+    5: "Unknown",
+}
+
+
+def _array_type(column: pd.Series) -> str:
+    """
+    PostgreSQL array type used to ship a DataFrame column to unnest().
+    """
+    if pd.api.types.is_bool_dtype(column):
+        return "boolean[]"
+    if pd.api.types.is_integer_dtype(column):
+        return "bigint[]"
+    if pd.api.types.is_float_dtype(column):
+        return "double precision[]"
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return "timestamp[]"
+    return "text[]"
+
+
+def _column_values(column: pd.Series) -> list:
+    """
+    Convert a column to a list of Python values, missing values becoming None.
+    """
+    return column.astype(object).where(column.notna(), None).tolist()
+
+
+def upsert_dimension(
+    conn,
+    table: str,
+    key_column: str,
+    members,
+    scd_columns: Optional[List[str]] = None,
+) -> int:
+    """
+    Insert or update the members of a dimension in one statement.
+
+    Every column is shipped as one array and expanded server-side with unnest(), so the whole
+    batch costs a single round trip. Attributes listed in scd_columns are slowly changing
+    attributes of type 1: an existing member gets the new value (overwrite, no history).
+
+    Parameters:
+        - conn (psycopg2.connection): Connection to the datamart, committed by the caller
+        - table (str): The dimension table
+        - key_column (str): The column with a UNIQUE constraint identifying a member
+        - members (pd.DataFrame | pa.Table): The members, one column per dimension column
+        - scd_columns (Optional[List[str]]): Attributes overwritten on existing members, every
+        non-key column by default, an empty list keeps existing members untouched
+
+    Returns:
+        - int: The number of members inserted or updated
+    """
+    if not isinstance(members, pd.DataFrame):
+        members = members.to_pandas()
+    if members.empty:
+        return 0
+
+    members = members.drop_duplicates(subset=[key_column], keep="last")
+    columns = list(members.columns)
+    if scd_columns is None:
+        scd_columns = [column for column in columns if column != key_column]
+
+    unnest_args = ", ".join(f"%s::{_array_type(members[column])}" for column in columns)
+    query = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT * FROM unnest({unnest_args}) "
+        f"ON CONFLICT ({key_column}) "
+    )
+    if scd_columns:
+        assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in scd_columns)
+        current = ", ".join(f"{table}.{column}" for column in scd_columns)
+        incoming = ", ".join(f"EXCLUDED.{column}" for column in scd_columns)
+        # Skip the write (and its dead tuple) when nothing changed
+        query += f"DO UPDATE SET {assignments} WHERE ({current}) IS DISTINCT FROM ({incoming})"
+    else:
+        query += "DO NOTHING"
+
+    cursor = conn.cursor()
+    cursor.execute(query, [_column_values(members[column]) for column in columns])
+    upserted = cursor.rowcount
+    cursor.close()
+    return upserted
+
+
+def vendor_members(vendor_ids) -> pd.DataFrame:
+    """
+    Build the dimension_vendor members of the given vendor ids.
+    """
+    vendor_ids = pd.Series(vendor_ids).dropna().astype("int64").unique()
+    names = pd.Series(vendor_ids).map(VENDOR_NAMES).fillna(DEFAULT_VENDOR_NAME)
+    return pd.DataFrame({"id_vendor": vendor_ids, "vendor_name": names.to_numpy()})
+
+
+def payment_members() -> pd.DataFrame:
+    """
+    Build the dimension_payment members of the TLC payment types.
+    """
+    return pd.DataFrame(
+        {
+            "id_payment_type": list(PAYMENT_METHODS.keys()),
+            "payment_method": list(PAYMENT_METHODS.values()),
+        }
+    )
+
+
+def zone_members(zone_lookup: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the dimension_zone members from the TLC taxi_zone_lookup.csv file.
+    """
+    return pd.DataFrame(
+        {
+            "id_zone": zone_lookup["LocationID"].astype("int64"),
+            "borough": zone_lookup["Borough"],
+            "name_zone": zone_lookup["Zone"],
+            "service_zone": zone_lookup["service_zone"],
+        }
+    )
+
+
+def time_members(timestamps) -> pd.DataFrame:
+    """
+    Build the dimension_time members of the given timestamps, one per distinct second.
+
+    The key is the UNIX epoch in seconds, as EXTRACT(EPOCH ...) in the former SQL load.
+    """
+    values = np.unique(pd.Series(timestamps).dropna().to_numpy(dtype="datetime64[s]"))
+    moments = pd.DatetimeIndex(values)
+    return pd.DataFrame(
+        {
+            "id_time": values.astype(np.int64),
+            "year": moments.year,
+            "month": moments.month,
+            "day": moments.day,
+            "hour": moments.hour,
+            "minute": moments.minute,
+            "seconde": moments.second,
+            "week": moments.isocalendar().week.to_numpy(dtype="int64"),
+            "trimester": moments.quarter,
+        }
+    )
@@ -9,14 +9,31 @@
 import os
 import gc
 import sys
+import tempfile
 from xmlrpc.client import ResponseError
-import pandas as pd
-from io import BytesIO
-from sqlalchemy import create_engine
 from minio import Minio
-from typing import List
+from typing import List, Tuple
 import psycopg2
 from dotenv import load_dotenv
+from data_cleaning import clean_trips, format_reject_counts, period_from_file_name
+from datasets import DATASETS, dataset_of_file, get_dataset
+from instrumentation import (
+    CountingCursor,
+    instrumented,
+    stage,
+)
+from parquet_reader import iter_trip_batches, trip_table_to_pandas
+from trip_dedup import TripHashIndex, drop_boundary_duplicates, drop_duplicate_trips
+from warehouse_schema import (
+    copy_warehouse_batch,
+    create_staging_table,
+    create_warehouse_table,
+    lock_warehouse_table,
+    reject_table_ddl,
+    replace_rejected_rows,
+    swap_warehouse_month,
+    validate_staging,
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -34,92 +51,64 @@ wh_dbms_ip = os.getenv("WH_DBMS_IP")
 wh_dbms_port = os.getenv("WH_DBMS_PORT")
 wh_dbms_database = os.getenv("WH_DBMS_DATABASE")
 wh_dbms_table = os.getenv("WH_DBMS_TABLE")
+wh_dbms_reject_table = os.getenv("WH_DBMS_REJECT_TABLE", f"{wh_dbms_table}_rejected")
 
+# Number of Parquet rows cleaned and written to the warehouse at a time
+WAREHOUSE_BATCH_SIZE = 500000
 
-def write_data_postgres(dataframe: pd.DataFrame) -> bool:
-    """
-    Dumps a Dataframe to the DBMS engine
 
-    Parameters:
-        - dataframe (pd.Dataframe) : The dataframe to dump into the DBMS engine
+def create_warehouse_database() -> bool:
+    """
+    Create the warehouse database (WH_DBMS_DATABASE) if it does not exist yet.
 
     Returns:
-        - bool : True if the connection to the DBMS and the dump to the DBMS is successful, False if either
-        execution is failed
+        - bool: True if the database exists or was created, False otherwise
     """
-    db_config = {
-        "dbms_engine": "postgresql",
-        "dbms_username": f"{wh_dbms_username}",
-        "dbms_password": f"{wh_dbms_password}",
-        "dbms_ip": f"{wh_dbms_ip}",
-        "dbms_port": f"{wh_dbms_port}",
-        "dbms_database": f"{wh_dbms_database}",
-        "dbms_table": f"{wh_dbms_table}",
-    }
-
     # URL de connexion pour créer la base de données
-    base_url = f"{db_config['dbms_engine']}://{db_config['dbms_username']}:{db_config['dbms_password']}@{db_config['dbms_ip']}:{db_config['dbms_port']}/postgres"
+    base_url = f"postgresql://{wh_dbms_username}:{wh_dbms_password}@{wh_dbms_ip}:{wh_dbms_port}/postgres"
 
     # Se connecter à la base de données "postgres" (base par défaut)
     try:
-        conn = psycopg2.connect(base_url)
+        conn = psycopg2.connect(base_url, cursor_factory=CountingCursor)
         conn.autocommit = True  # Nécessaire pour créer une base de données sans une transaction en cours
         cursor = conn.cursor()
 
         # Vérifier si la base de données existe
         cursor.execute(
-            f"SELECT 1 FROM pg_database WHERE datname = '{db_config['dbms_database']}';"
+            f"SELECT 1 FROM pg_database WHERE datname = '{wh_dbms_database}';"
         )
         if cursor.fetchone() is None:
-            print(
-                f"Database '{db_config['dbms_database']}' does not exist. Creating it..."
-            )
-            cursor.execute(f"CREATE DATABASE {db_config['dbms_database']};")
-            print(f"Database '{db_config['dbms_database']}' created successfully.")
+            print(f"Database '{wh_dbms_database}' does not exist. Creating it...")
+            cursor.execute(f"CREATE DATABASE {wh_dbms_database};")
+            print(f"Database '{wh_dbms_database}' created successfully.")
         else:
-            print(f"Database '{db_config['dbms_database']}' already exists.")
+            print(f"Database '{wh_dbms_database}' already exists.")
 
         cursor.close()
         conn.close()
+        return True
 
     except Exception as e:
         print(f"Error while checking/creating the database: {e}")
         return False
 
-    # Connexion à la base de données "tp_warehouse" pour insérer les données
-    db_config["database_url"] = (
-        f"{db_config['dbms_engine']}://{db_config['dbms_username']}:{db_config['dbms_password']}@"
-        f"{db_config['dbms_ip']}:{db_config['dbms_port']}/{db_config['dbms_database']}"
-    )
-    try:
-        # Connexion avec SQLAlchemy pour insérer les données
-        engine = create_engine(db_config["database_url"])
-        with engine.connect():
-            success: bool = True
-            print("Connection successful! Processing parquet file")
-            dataframe.to_sql(
-                db_config["dbms_table"], engine, index=False, if_exists="append"
-            )
-
-    except Exception as e:
-        success: bool = False
-        print(f"Error connection to the database: {e}")
-        return success
-
-    return success
 
-
-def clean_column_name(dataframe: pd.DataFrame) -> pd.DataFrame:
+def connect_warehouse():
     """
-    Take a Dataframe and rewrite it columns into a lowercase format.
-    Parameters:
-        - dataframe (pd.DataFrame) : The dataframe columns to change
-
-    Returns:
-        - pd.Dataframe : The changed Dataframe into lowercase format
+    Open a connection to the warehouse database, None if the connection fails.
     """
-    dataframe.columns = map(str.lower, dataframe.columns)
-    return dataframe
+    try:
+        return psycopg2.connect(
+            host=wh_dbms_ip,
+            port=wh_dbms_port,
+            user=wh_dbms_username,
+            password=wh_dbms_password,
+            dbname=wh_dbms_database,
+            cursor_factory=CountingCursor,
+        )
+    except Exception as e:
+        print(f"Error connection to the database: {e}")
+        return None
 
 
 def get_parquet_files_from_minio(bucket_name: str, minio_client: Minio) -> List[str]:
@@ -147,31 +136,181 @@ def get_parquet_files_from_minio(bucket_name: str, minio_client: Minio) -> List[
     return files
 
 
-def download_parquet_from_minio(
-    bucket_name: str, file_key: str, minio_client: Minio
-) -> pd.DataFrame:
+def warehouse_tables(dataset: str = "yellow") -> Tuple[str, str]:
+    """
+    Return the warehouse table of a dataset and the table of its rejected rows.
+    """
+    table = get_dataset(dataset)["warehouse_table"]
+    if table == wh_dbms_table:
+        return table, wh_dbms_reject_table
+    return table, f"{table}_rejected"
+
+
+def load_file_to_warehouse(
+    bucket_name: str,
+    file_key: str,
+    minio_client: Minio,
+    batch_size: int = WAREHOUSE_BATCH_SIZE,
+) -> bool:
     """
-    Download a Parquet file from MinIO and load it into a Pandas DataFrame.
+    Download, clean and load one Parquet file of MinIO into the warehouse.
+
+    The dataset (yellow, green, fhv, fhvhv) is deduced from the file name. The file is copied
+    to a temporary file and streamed batch by batch, so its size does not bound the memory.
+
+    The clean rows are copied into an UNLOGGED staging table (see warehouse_schema.py), which is
+    validated and then swapped in as the partition of the file, in the same transaction:
+    readers see the previous rows of the file until the new ones are complete, and loading a
+    file twice replaces its rows instead of duplicating them. The rows of a file whose month
+    cannot be read from its name are appended to the default partition. The rejected rows
+    follow the same path: staged, then swapped in place of the quarantined rows of the previous
+    load of the file, in the same transaction.
+
+    The duplicated trips are dropped (see trip_dedup.py): the repeated rows of the file before
+    the copy, and the trips near a month boundary already loaded from the previous or next
+    file from the staging table, under the lock of the swap.
 
     Parameters:
         - bucket_name (str): The MinIO bucket name
         - file_key (str): The key (path) of the file in the bucket
         - minio_client: The initialized Minio client
+        - batch_size (int): Number of rows read, cleaned and written at a time
 
     Returns:
-        - pd.DataFrame: The DataFrame containing the Parquet file data
+        - bool: True if the clean rows (and the rejected ones) were written, False otherwise
     """
-    try:
-        # Download the object from MinIO using the correct parameter names
-        obj = minio_client.get_object(bucket_name=bucket_name, object_name=file_key)
-
-        # Read the object data into a DataFrame
-        file_data = obj.read()
-        return pd.read_parquet(BytesIO(file_data), engine="pyarrow")
-
-    except Exception as e:
-        print(f"Error downloading or reading the Parquet file: {e}")
-        return pd.DataFrame()  # Return an empty DataFrame in case of error
+    print(f"Processing file: {file_key}")
+    dataset = dataset_of_file(file_key) or "yellow"
+    spec = get_dataset(dataset)
+    table, reject_table = warehouse_tables(dataset)
+    period = period_from_file_name(file_key)
+
+    with stage("warehouse_load", dataset=dataset, file=file_key) as metrics:
+        if not create_warehouse_database():
+            metrics.status = "error"
+            return False
+        conn = connect_warehouse()
+        if conn is None:
+            metrics.status = "error"
+            return False
+
+        try:
+            cursor = conn.cursor()
+            partitioned = create_warehouse_table(cursor, table, spec["schema"])
+            cursor.execute(reject_table_ddl(reject_table, spec["schema"]))
+            conn.commit()
+
+            if period is None:
+                target, reject_target = table, reject_table
+                replace_rejected_rows(cursor, reject_table, file_key)
+            else:
+                target = create_staging_table(cursor, table, period)
+                reject_target = create_staging_table(
+                    cursor, reject_table, period, source_month=False
+                )
+                # Committed at once: CREATE TABLE ... LIKE locks the warehouse table
+                conn.commit()
+
+            # Hashes of the trips already copied from the file
+            seen = TripHashIndex()
+
+            with tempfile.NamedTemporaryFile(suffix=".parquet") as tmp:
+                with stage("minio_download"):
+                    minio_client.fget_object(bucket_name, file_key, tmp.name)
+                metrics.add(bytes=os.path.getsize(tmp.name))
+
+                total_rows = 0
+                clean_rows = 0
+                batches = iter_trip_batches(
+                    tmp.name, batch_size, schema=spec["schema"], renames=spec["renames"]
+                )
+                while True:
+                    with stage("parquet_decode") as decode:
+                        table_batch = next(batches, None)
+                        if table_batch is None:
+                            break
+                        batch_df = trip_table_to_pandas(table_batch)
+                        decode.add(rows=len(batch_df))
+                    total_rows += len(batch_df)
+                    metrics.add(rows=len(batch_df))
+
+                    # Validate the rows and set the rejected ones aside
+                    with stage("clean") as clean:
+                        clean_df, rejected_df, reject_counts = clean_trips(
+                            batch_df, period, spec["reject_rules"]
+                        )
+                        clean.add(rows=len(batch_df))
+                    summary = format_reject_counts(reject_counts, len(batch_df))
+                    print(f"Cleaning {file_key}: {summary}")
+                    del batch_df
+
+                    # Quarantine the rejected rows with their reason code
+                    if not rejected_df.empty:
+                        rejected_df["source_file"] = file_key
+                        with stage("reject_copy") as reject_copy:
+                            copy_warehouse_batch(cursor, rejected_df, reject_target)
+                            reject_copy.add(rows=len(rejected_df))
+                    del rejected_df
+
+                    # Drop the trips already copied from this file
+                    if spec["dedup_keys"]:
+                        with stage("dedup") as dedup:
+                            clean_df, duplicates = drop_duplicate_trips(
+                                clean_df, spec["dedup_keys"], seen
+                            )
+                            dedup.add(rows=len(clean_df) + duplicates)
+                        if duplicates:
+                            print(f"Dedup {file_key}: {duplicates} duplicated trips dropped")
+
+                    # Copy the clean rows into the staging table
+                    with stage("warehouse_copy") as copy:
+                        copy_warehouse_batch(cursor, clean_df, target)
+                        copy.add(rows=len(clean_df))
+                    clean_rows += len(clean_df)
+
+                    # Cleanup memory after each batch
+                    del clean_df
+                    gc.collect()
+
+            if total_rows == 0:
+                print(f"No data read from {file_key}")
+                conn.rollback()
+                metrics.status = "error"
+                return False
+
+            # Swap of the month: the validated staging table replaces the previous rows
+            if period is not None:
+                # Held until the commit: the swaps of the other files of the table wait for it
+                lock_warehouse_table(cursor, table)
+
+                # Drop the trips already loaded from a neighbouring file
+                if spec["dedup_keys"]:
+                    with stage("boundary_dedup") as dedup:
+                        duplicates = drop_boundary_duplicates(
+                            cursor, table, target, period, spec["dedup_keys"]
+                        )
+                        dedup.add(rows=clean_rows)
+                    clean_rows -= duplicates
+                    if duplicates:
+                        print(f"Dedup {file_key}: {duplicates} trips of a neighbouring month dropped")
+
+                with stage("warehouse_swap") as swap:
+                    validate_staging(cursor, table, target, period, clean_rows)
+                    swap_warehouse_month(cursor, table, target, period, partitioned)
+                    replace_rejected_rows(cursor, reject_table, file_key, reject_target)
+                    swap.add(rows=clean_rows)
+            conn.commit()
+            cursor.close()
+            return True
+
+        except Exception as e:
+            print(f"Error while loading {file_key} into {table}: {e}")
+            conn.rollback()
+            metrics.status = "error"
+            return False
+
+        finally:
+            conn.close()
 
 
 # Recovers data from Minio and backups in postgres
@@ -181,55 +320,19 @@ def main() -> None:
         f"{hostname}:{port}", secure=False, access_key=access_key, secret_key=secret_key
     )
 
-    bucket_name = "yellow-tripdata"
-
-    # List Parquet files in the MinIO bucket
-    parquet_files = get_parquet_files_from_minio(bucket_name, client)
-
-    # Process each Parquet file
-    for file_key in parquet_files:
-        print(f"Processing file: {file_key}")
-
-        # Download the Parquet file from MinIO
-        parquet_df = download_parquet_from_minio(bucket_name, file_key, client)
+    # One bucket per dataset (see datasets.py)
+    for dataset in DATASETS.values():
+        bucket_name = dataset["bucket"]
+        if not client.bucket_exists(bucket_name):
+            continue
 
-        # Clean column names (convert to lowercase)
-        clean_column_name(parquet_df)
+        # List Parquet files in the MinIO bucket
+        parquet_files = get_parquet_files_from_minio(bucket_name, client)
 
-        # Write the data to PostgreSQL
-        if not write_data_postgres(parquet_df):
-            del parquet_df
-            gc.collect()
-            return  # Stop processing on failure
-
-        # Cleanup memory after each insertion
-        del parquet_df
-        gc.collect()
-
-
-"""
-# Retrieves data from a local directory and saves it in postgres
-def main() -> None:
-    # folder_path: str = r'..\..\data\raw'
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Construct the relative path to the folder
-    folder_path = os.path.join(script_dir, '..', '..', 'data', 'raw')
-
-    parquet_files = [f for f in os.listdir(folder_path) if
-                     f.lower().endswith('.parquet') and os.path.isfile(os.path.join(folder_path, f))]
-
-    for parquet_file in parquet_files:
-        parquet_df: pd.DataFrame = pd.read_parquet(os.path.join(folder_path, parquet_file), engine='pyarrow')
-
-        clean_column_name(parquet_df)
-        if not write_data_postgres(parquet_df):
-            del parquet_df
-            gc.collect()
-            return
-
-        del parquet_df
-        gc.collect()
-"""
+        # Process each Parquet file
+        for file_key in parquet_files:
+            if not load_file_to_warehouse(bucket_name, file_key, client):
+                return  # Stop processing on failure
 
 
 if __name__ == "__main__":
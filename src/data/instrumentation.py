@@ -0,0 +1,335 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import resource
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# JSON lines file receiving one record per pipeline stage (stdout only if unset)
+metrics_log_path = os.getenv("PIPELINE_METRICS_LOG")
+
+# Directory read by the node_exporter textfile collector (no Prometheus file if unset)
+metrics_prom_dir = os.getenv("PIPELINE_METRICS_PROM_DIR")
+
+# Measurements summed for every stage (duration in seconds)
+TOTAL_KEYS = ["runs", "duration_s", "rows", "bytes", "db_round_trips"]
+
+# Stages open in the current thread, outermost first
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+class StageMetrics:
+    """
+    Measurements of one run of a pipeline stage.
+
+    The rows and bytes are reported by the stage itself through add(), the duration, the peak
+    RSS and the database round trips are measured around it. The stages nested in a stage are
+    summed into its breakdown instead of being logged one by one.
+    """
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+        self.rows = 0
+        self.bytes = 0
+        self.db_round_trips = 0
+        self.duration = 0.0
+        self.status = "ok"
+        self.breakdown = {}
+
+    def add(self, rows: int = 0, bytes: int = 0) -> None:
+        self.rows += int(rows)
+        self.bytes += int(bytes)
+
+    def merge_child(self, child: "StageMetrics") -> None:
+        for name, totals in [(child.name, child.totals())] + list(child.breakdown.items()):
+            current = self.breakdown.setdefault(name, dict.fromkeys(TOTAL_KEYS, 0))
+            for key in TOTAL_KEYS:
+                current[key] += totals[key]
+
+    def totals(self) -> Dict[str, float]:
+        return {
+            "runs": 1,
+            "duration_s": self.duration,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "db_round_trips": self.db_round_trips,
+        }
+
+    def to_record(self) -> Dict:
+        return {
+            "event": "pipeline_stage",
+            "stage": self.name,
+            "labels": self.labels,
+            "status": self.status,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "duration_s": round(self.duration, 3),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "rows_per_s": round(self.rows / self.duration, 1) if self.duration > 0 else None,
+            "db_round_trips": self.db_round_trips,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "breakdown": {
+                name: dict(totals, duration_s=round(totals["duration_s"], 3))
+                for name, totals in sorted(
+                    self.breakdown.items(), key=lambda item: -item[1]["duration_s"]
+                )
+            },
+        }
+
+
+def _stack() -> List[StageMetrics]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def peak_rss_bytes() -> int:
+    """
+    Return the peak resident set size of the process in bytes.
+
+    ru_maxrss is in KiB on Linux and in bytes on macOS.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def count_round_trip(count: int = 1) -> None:
+    """
+    Add database round trips to every stage open in the current thread.
+    """
+    for metrics in _stack():
+        metrics.db_round_trips += count
+
+
+@contextmanager
+def stage(name: str, **labels) -> Iterator[StageMetrics]:
+    """
+    Time a pipeline stage and report its measurements when it ends.
+
+    Usage:
+        with stage("warehouse_load", file=file_key) as metrics:
+            ...
+            metrics.add(rows=len(df), bytes=size)
+
+    The outermost stage of a thread is written as one JSON record (stdout and
+    PIPELINE_METRICS_LOG) and, when PIPELINE_METRICS_PROM_DIR is set, as a Prometheus text file.
+    """
+    metrics = StageMetrics(name, {key: str(value) for key, value in labels.items()})
+    stack = _stack()
+    stack.append(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException:
+        metrics.status = "error"
+        raise
+    finally:
+        metrics.duration = time.perf_counter() - start
+        stack.pop()
+        if stack:
+            stack[-1].merge_child(metrics)
+        else:
+            emit_stage(metrics)
+
+
+def instrumented(name: Optional[str] = None):
+    """
+    Decorator running a whole function as a stage (named after the function by default).
+
+    The function reports its rows and bytes through current_stage().add(...).
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name or function.__name__):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def current_stage() -> StageMetrics:
+    """
+    Return the innermost open stage, or a detached one (never reported) outside of any stage.
+    """
+    stack = _stack()
+    return stack[-1] if stack else StageMetrics("detached", {})
+
+
+def emit_stage(metrics: StageMetrics) -> None:
+    """
+    Write the record of a finished outermost stage to the configured outputs.
+    """
+    line = json.dumps(metrics.to_record())
+    print(line)
+    with _write_lock:
+        if metrics_log_path:
+            with open(metrics_log_path, "a") as file:
+                file.write(line + "\n")
+        if metrics_prom_dir:
+            write_prometheus_file(metrics, metrics_prom_dir)
+
+
+def _prom_labels(labels: Dict[str, str]) -> str:
+    escaped = []
+    for key, value in sorted(labels.items()):
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def write_prometheus_file(metrics: StageMetrics, directory: str) -> str:
+    """
+    Write the measurements of a stage and of its nested stages in the Prometheus text format.
+
+    One file per stage and labels, replaced atomically so that the collector never reads a
+    partial file.
+    """
+    series = [(metrics.name, metrics.totals())] + list(metrics.breakdown.items())
+    gauges = [
+        ("duration_seconds", "duration_s", "Time spent in the stage during the last run"),
+        ("rows", "rows", "Rows processed by the stage during the last run"),
+        ("bytes", "bytes", "Bytes processed by the stage during the last run"),
+        ("db_round_trips", "db_round_trips", "Database round trips during the last run"),
+        ("runs", "runs", "Number of executions during the last run"),
+    ]
+
+    lines = []
+    for suffix, key, help_text in gauges:
+        lines.append(f"# HELP pipeline_stage_{suffix} {help_text}")
+        lines.append(f"# TYPE pipeline_stage_{suffix} gauge")
+        for name, totals in series:
+            labels = dict(metrics.labels, stage=name, root=metrics.name)
+            lines.append(f"pipeline_stage_{suffix}{_prom_labels(labels)} {totals[key]}")
+
+    root_labels = _prom_labels(dict(metrics.labels, root=metrics.name))
+    lines += [
+        "# HELP pipeline_peak_rss_bytes Peak resident set size of the process",
+        "# TYPE pipeline_peak_rss_bytes gauge",
+        f"pipeline_peak_rss_bytes{root_labels} {peak_rss_bytes()}",
+        "# HELP pipeline_last_run_timestamp_seconds End of the last run",
+        "# TYPE pipeline_last_run_timestamp_seconds gauge",
+        f"pipeline_last_run_timestamp_seconds{root_labels} {time.time():.0f}",
+        "# HELP pipeline_last_run_success 1 if the last run succeeded, 0 otherwise",
+        "# TYPE pipeline_last_run_success gauge",
+        f"pipeline_last_run_success{root_labels} {int(metrics.status == 'ok')}",
+    ]
+
+    suffix = "_".join(str(value) for _, value in sorted(metrics.labels.items()))
+    file_name = f"pipeline_{metrics.name}_{suffix}".rstrip("_")
+    file_name = re.sub(r"[^A-Za-z0-9_.-]", "_", file_name)
+    path = os.path.join(directory, f"{file_name}.prom")
+    os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w") as file:
+        file.write("\n".join(lines) + "\n")
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """
+    psycopg2 cursor counting its round trips to the server in the open stages.
+
+    Use it with psycopg2.connect(..., cursor_factory=CountingCursor). Fetches only cost a round
+    trip on named (server-side) cursors.
+    """
+
+    def execute(self, query, vars=None):
+        count_round_trip()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        count_round_trip(len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        count_round_trip()
+        return super().copy_expert(sql, file, size)
+
+    def fetchmany(self, size=None):
+        if self.name is not None:
+            count_round_trip()
+        return super().fetchmany(size) if size is not None else super().fetchmany()
+
+    def fetchall(self):
+        if self.name is not None:
+            count_round_trip()
+        return super().fetchall()
+
+
+def load_stage_records(path: str) -> List[Dict]:
+    """
+    Read the records written to a PIPELINE_METRICS_LOG file.
+    """
+    records = []
+    with open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def stage_report(records: List[Dict], root: Optional[str] = None) -> str:
+    """
+    Summarize stage records as a text table, the slowest stages first.
+
+    Every outermost stage is summed with its nested stages, so the table shows where the time
+    of a run went (download, decode, cleaning, writes, ...).
+    """
+    totals = {}
+    for record in records:
+        if root is not None and record["stage"] != root:
+            continue
+        entries = [(record["stage"], dict(record, runs=1))]
+        entries += [
+            (f"{record['stage']} > {name}", values)
+            for name, values in record["breakdown"].items()
+        ]
+        for name, values in entries:
+            current = totals.setdefault(name, dict.fromkeys(TOTAL_KEYS, 0))
+            for key in TOTAL_KEYS:
+                current[key] += values[key]
+
+    lines = [
+        f"{'stage':<45} {'runs':>6} {'seconds':>10} {'rows':>12} {'MB':>10} "
+        f"{'rows/s':>10} {'db trips':>9}"
+    ]
+    for name, values in sorted(totals.items(), key=lambda item: -item[1]["duration_s"]):
+        rate = values["rows"] / values["duration_s"] if values["duration_s"] > 0 else 0
+        lines.append(
+            f"{name:<45} {values['runs']:>6} {values['duration_s']:>10.2f} {values['rows']:>12} "
+            f"{values['bytes'] / 1e6:>10.1f} {rate:>10.0f} {values['db_round_trips']:>9}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python instrumentation.py metrics.jsonl [stage]
+    if len(sys.argv) < 2:
+        print("Usage: python instrumentation.py <PIPELINE_METRICS_LOG file> [stage]")
+        sys.exit(1)
+    print(stage_report(load_stage_records(sys.argv[1]), *sys.argv[2:3]))
@@ -0,0 +1,168 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# Surrogate key of the "unknown" member present in every dimension (see creation.sql)
+UNKNOWN_KEY = -1
+
+# Dimension name: (table, natural key column, surrogate key column)
+DIMENSIONS = {
+    "vendor": ("dimension_vendor", "id_vendor", "id_vendor"),
+    "time": ("dimension_time", "id_time", "id_time"),
+    "zone": ("dimension_zone", "id_zone", "id_zone"),
+    "payment": ("dimension_payment", "id_payment_type", "id_payment_type"),
+}
+
+# Fact key column: (warehouse column, dimension name)
+FACT_KEY_COLUMNS = {
+    "id_vendor": ("vendorid", "vendor"),
+    "id_time_pickup": ("tpep_pickup_datetime", "time"),
+    "id_time_dropoff": ("tpep_dropoff_datetime", "time"),
+    "id_zone_pickup": ("pulocationid", "zone"),
+    "id_zone_dropoff": ("dolocationid", "zone"),
+    "id_payment_type": ("payment_type", "payment"),
+}
+
+# Measures copied as is from the warehouse to the fact table
+FACT_MEASURE_COLUMNS = [
+    "fare_amount",
+    "extra",
+    "mta_tax",
+    "tip_amount",
+    "tolls_amount",
+    "improvement_surcharge",
+    "total_amount",
+    "congestion_surcharge",
+    "airport_fee",
+]
+
+
+class KeyMap:
+    """
+    Natural to surrogate key lookup of one dimension, held as two sorted NumPy arrays.
+    """
+
+    def __init__(self, natural_keys: np.ndarray, surrogate_keys: np.ndarray):
+        order = np.argsort(natural_keys, kind="stable")
+        self.natural_keys = np.asarray(natural_keys, dtype=np.int64)[order]
+        self.surrogate_keys = np.asarray(surrogate_keys, dtype=np.int64)[order]
+
+    def __len__(self) -> int:
+        return len(self.natural_keys)
+
+    def map(self, values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Look up a whole column of natural keys at once.
+
+        Parameters:
+            - values (np.ndarray): The natural keys as int64
+            - valid (np.ndarray): False where the source value is missing
+
+        Returns:
+            - Tuple[np.ndarray, np.ndarray]: The surrogate keys (UNKNOWN_KEY when not found) and
+            the mask of the keys that were not found
+        """
+        if len(self.natural_keys) == 0:
+            return np.full(len(values), UNKNOWN_KEY, dtype=np.int64), np.ones(
+                len(values), dtype=bool
+            )
+
+        positions = np.searchsorted(self.natural_keys, values)
+        positions = np.minimum(positions, len(self.natural_keys) - 1)
+        found = valid & (self.natural_keys[positions] == values)
+        keys = np.where(found, self.surrogate_keys[positions], UNKNOWN_KEY)
+        return keys, ~found
+
+
+def load_key_map(conn, table: str, natural_column: str, surrogate_column: str) -> KeyMap:
+    """
+    Load the key map of one dimension in a single query.
+
+    Parameters:
+        - conn (psycopg2.connection): Connection to the datamart
+        - table (str): The dimension table
+        - natural_column (str): The column holding the natural (source) key
+        - surrogate_column (str): The column referenced by the fact table
+
+    Returns:
+        - KeyMap: The in-memory lookup, without the unknown member
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {natural_column}, {surrogate_column} FROM {table} "
+        f"WHERE {surrogate_column} <> %s",
+        (UNKNOWN_KEY,),
+    )
+    rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    cursor.close()
+    return KeyMap(rows[:, 0], rows[:, 1])
+
+
+def load_dimension_key_maps(conn, names: Optional[List[str]] = None) -> Dict[str, KeyMap]:
+    """
+    Load the key maps of the given dimensions, every dimension of the fact table by default.
+    """
+    names = list(DIMENSIONS) if names is None else names
+    return {name: load_key_map(conn, *DIMENSIONS[name]) for name in names}
+
+
+def natural_key_values(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert a warehouse key column to int64 natural keys and a validity mask.
+
+    Timestamps become UNIX epochs in seconds, the key of dimension_time.
+    """
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = column.to_numpy(dtype="datetime64[s]")
+        valid = ~np.isnat(values)
+        return values.astype(np.int64), valid
+
+    values = column.to_numpy(dtype="float64", na_value=np.nan)
+    valid = ~np.isnan(values)
+    return np.where(valid, values, 0).astype(np.int64), valid
+
+
+def map_fact_batch(
+    batch: pd.DataFrame,
+    key_maps: Dict[str, KeyMap],
+    key_columns: Optional[List[str]] = None,
+    measure_columns: Optional[List[str]] = None,
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Build the fact rows of a warehouse batch by mapping every key column vectorially.
+
+    Parameters:
+        - batch (pd.DataFrame): Warehouse rows with their canonical column names
+        - key_maps (Dict[str, KeyMap]): The key maps returned by load_dimension_key_maps
+        - key_columns (Optional[List[str]]): Fact key columns to build, those of fact_yellow_taxi
+        by default (see datasets.py for the other fact tables)
+        - measure_columns (Optional[List[str]]): Measures to copy, those of fact_yellow_taxi by default
+
+    Returns:
+        - Tuple[pd.DataFrame, Dict[str, int]]: The fact rows, keys first then measures, and the
+        number of keys routed to the unknown member for each fact key column
+    """
+    key_columns = list(FACT_KEY_COLUMNS) if key_columns is None else key_columns
+    measure_columns = FACT_MEASURE_COLUMNS if measure_columns is None else measure_columns
+
+    fact = {}
+    miss_counts = {}
+    for fact_column in key_columns:
+        source_column, dimension = FACT_KEY_COLUMNS[fact_column]
+        values, valid = natural_key_values(batch[source_column])
+        keys, missing = key_maps[dimension].map(values, valid)
+        fact[fact_column] = keys
+        miss_counts[fact_column] = int(missing.sum())
+
+    for column in measure_columns:
+        fact[column] = batch[column].to_numpy()
+
+    return pd.DataFrame(fact, index=batch.index), miss_counts
@@ -0,0 +1,133 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+
+# Counters of a batch, added to the stored ones by update_kpi_summary
+KPI_COLUMNS = [
+    "trip_count",
+    "total_amount_sum",
+    "zero_amount_count",
+    "min_pickup",
+    "max_pickup",
+]
+
+
+def batch_kpis(fact: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute the headline counters of a batch of mapped fact rows, one row per pickup month.
+
+    Parameters:
+        - fact (pd.DataFrame): Rows returned by key_mapping.map_fact_batch, id_time_pickup
+        being the pickup time in epoch seconds
+
+    Returns:
+        - pd.DataFrame: chunk_key (YYYY-MM) and the KPI_COLUMNS of every month of the batch,
+        the amounts being None for the datasets without total_amount
+    """
+    pickup = pd.to_datetime(fact["id_time_pickup"].to_numpy(dtype=np.int64), unit="s")
+    frame = pd.DataFrame({"chunk_key": pickup.strftime("%Y-%m"), "pickup": pickup})
+    if "total_amount" in fact.columns:
+        total = fact["total_amount"].to_numpy(dtype="float64", na_value=np.nan)
+        frame["total_amount"] = total
+        frame["zero_amount"] = total == 0
+
+    grouped = frame.groupby("chunk_key", sort=True)
+    kpis = grouped["pickup"].agg(trip_count="size", min_pickup="min", max_pickup="max")
+    if "total_amount" in frame.columns:
+        kpis["total_amount_sum"] = grouped["total_amount"].sum().round(2)
+        kpis["zero_amount_count"] = grouped["zero_amount"].sum()
+    else:
+        kpis["total_amount_sum"] = None
+        kpis["zero_amount_count"] = None
+    return kpis.reset_index()[["chunk_key"] + KPI_COLUMNS]
+
+
+def update_kpi_summary(cursor, fact_table: str, fact: pd.DataFrame) -> None:
+    """
+    Add the counters of a fact batch to kpi_fact_summary, without committing.
+
+    Counts and sums are added and the date bounds widened, so the stored rows always
+    describe what has been copied in the same transaction.
+
+    Parameters:
+        - cursor (psycopg2.cursor): Cursor on the datamart, in the transaction of the fact copy
+        - fact_table (str): The fact table the batch was copied to
+        - fact (pd.DataFrame): The mapped fact rows of the batch
+    """
+    if fact.empty:
+        return
+    for row in batch_kpis(fact).itertuples(index=False):
+        cursor.execute(
+            "INSERT INTO kpi_fact_summary "
+            "(fact_table, chunk_key, trip_count, total_amount_sum, zero_amount_count, "
+            "min_pickup, max_pickup) VALUES (%s, %s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (fact_table, chunk_key) DO UPDATE SET "
+            "trip_count = kpi_fact_summary.trip_count + EXCLUDED.trip_count, "
+            "total_amount_sum = kpi_fact_summary.total_amount_sum + EXCLUDED.total_amount_sum, "
+            "zero_amount_count = kpi_fact_summary.zero_amount_count + EXCLUDED.zero_amount_count, "
+            "min_pickup = LEAST(kpi_fact_summary.min_pickup, EXCLUDED.min_pickup), "
+            "max_pickup = GREATEST(kpi_fact_summary.max_pickup, EXCLUDED.max_pickup), "
+            "updated_at = now()",
+            (
+                fact_table,
+                row.chunk_key,
+                int(row.trip_count),
+                None if row.total_amount_sum is None else float(row.total_amount_sum),
+                None if row.zero_amount_count is None else int(row.zero_amount_count),
+                row.min_pickup.to_pydatetime(),
+                row.max_pickup.to_pydatetime(),
+            ),
+        )
+
+
+def delete_kpi_summary(cursor, fact_table: str, chunk_key: str = None) -> None:
+    """
+    Remove the counters of one month (reload) or of a whole fact table (restart), without committing.
+    """
+    if chunk_key is None:
+        cursor.execute("DELETE FROM kpi_fact_summary WHERE fact_table = %s", (fact_table,))
+    else:
+        cursor.execute(
+            "DELETE FROM kpi_fact_summary WHERE fact_table = %s AND chunk_key = %s",
+            (fact_table, chunk_key),
+        )
+
+
+def rebuild_kpi_summary(conn, fact_table: str, has_amount: bool = True) -> None:
+    """
+    Recompute kpi_fact_summary from a fact table in one aggregate pass, without committing.
+
+    Only needed once for a data mart loaded before the table existed, the builds keep
+    it up to date afterwards.
+
+    Parameters:
+        - conn (psycopg2.connection): Connection to the datamart
+        - fact_table (str): The fact table to summarize
+        - has_amount (bool): Whether the fact table has a total_amount column
+    """
+    amounts = (
+        "SUM(total_amount), COUNT(*) FILTER (WHERE total_amount = 0)"
+        if has_amount
+        else "NULL, NULL"
+    )
+    cursor = conn.cursor()
+    delete_kpi_summary(cursor, fact_table)
+    cursor.execute(
+        "INSERT INTO kpi_fact_summary "
+        "(fact_table, chunk_key, trip_count, total_amount_sum, zero_amount_count, "
+        "min_pickup, max_pickup) "
+        f"SELECT %s, to_char(to_timestamp(id_time_pickup) AT TIME ZONE 'UTC', 'YYYY-MM'), "
+        f"COUNT(*), {amounts}, "
+        "MIN(to_timestamp(id_time_pickup) AT TIME ZONE 'UTC'), "
+        "MAX(to_timestamp(id_time_pickup) AT TIME ZONE 'UTC') "
+        f"FROM {fact_table} GROUP BY 2",
+        (fact_table,),
+    )
+    cursor.close()
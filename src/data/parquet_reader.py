@@ -0,0 +1,270 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from typing import Dict, Iterator, List, Optional
+
+# Canonical schema of the warehouse: only the columns the warehouse, the cleaning stage and
+# the datamart need, with the most compact types that hold the TLC values
+TRIP_SCHEMA = pa.schema(
+    [
+        ("vendorid", pa.int8()),
+        ("tpep_pickup_datetime", pa.timestamp("us")),
+        ("tpep_dropoff_datetime", pa.timestamp("us")),
+        ("passenger_count", pa.int8()),
+        ("trip_distance", pa.float32()),
+        ("pulocationid", pa.int16()),
+        ("dolocationid", pa.int16()),
+        ("payment_type", pa.int8()),
+        ("fare_amount", pa.float32()),
+        ("extra", pa.float32()),
+        ("mta_tax", pa.float32()),
+        ("tip_amount", pa.float32()),
+        ("tolls_amount", pa.float32()),
+        ("improvement_surcharge", pa.float32()),
+        ("total_amount", pa.float32()),
+        ("congestion_surcharge", pa.float32()),
+        ("airport_fee", pa.float32()),
+    ]
+)
+
+# Canonical schema of the For-Hire Vehicle trips (no fares in these files)
+FHV_SCHEMA = pa.schema(
+    [
+        ("dispatching_base_num", pa.string()),
+        ("tpep_pickup_datetime", pa.timestamp("us")),
+        ("tpep_dropoff_datetime", pa.timestamp("us")),
+        ("pulocationid", pa.int16()),
+        ("dolocationid", pa.int16()),
+        ("sr_flag", pa.int8()),
+        ("affiliated_base_number", pa.string()),
+    ]
+)
+
+# Canonical schema of the High Volume For-Hire Vehicle trips, amounts under the yellow names
+FHVHV_SCHEMA = pa.schema(
+    [
+        ("hvfhs_license_num", pa.string()),
+        ("dispatching_base_num", pa.string()),
+        ("tpep_pickup_datetime", pa.timestamp("us")),
+        ("tpep_dropoff_datetime", pa.timestamp("us")),
+        ("pulocationid", pa.int16()),
+        ("dolocationid", pa.int16()),
+        ("trip_distance", pa.float32()),
+        ("trip_time", pa.int32()),
+        ("fare_amount", pa.float32()),
+        ("tolls_amount", pa.float32()),
+        ("bcf", pa.float32()),
+        ("sales_tax", pa.float32()),
+        ("congestion_surcharge", pa.float32()),
+        ("airport_fee", pa.float32()),
+        ("tip_amount", pa.float32()),
+        ("driver_pay", pa.float32()),
+    ]
+)
+
+# Names used by some years of the TLC files (compared in lowercase) and their canonical name
+COLUMN_RENAMES = {
+    "vendor_id": "vendorid",
+    "pickup_datetime": "tpep_pickup_datetime",
+    "dropoff_datetime": "tpep_dropoff_datetime",
+    "trip_pickup_datetime": "tpep_pickup_datetime",
+    "trip_dropoff_datetime": "tpep_dropoff_datetime",
+    "pu_location_id": "pulocationid",
+    "do_location_id": "dolocationid",
+    "fare_amt": "fare_amount",
+    "tip_amt": "tip_amount",
+    "tolls_amt": "tolls_amount",
+    "total_amt": "total_amount",
+}
+
+# Pandas nullable dtypes used for the integer columns so that missing values do not widen them
+PANDAS_TYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def canonical_column_name(name: str, renames: Optional[Dict[str, str]] = None) -> str:
+    """
+    Map a column name of any TLC file version to its canonical warehouse name.
+
+    The dataset renames (see datasets.py) are applied before the common ones.
+    """
+    lower = name.lower()
+    if renames and lower in renames:
+        return renames[lower]
+    return COLUMN_RENAMES.get(lower, lower)
+
+
+def _physical_columns(
+    parquet_file: pq.ParquetFile, schema: pa.Schema, renames: Optional[Dict[str, str]]
+) -> Dict[str, str]:
+    """
+    Resolve which physical column of the file holds each canonical column (first match wins).
+    """
+    physical_names = {}
+    for name in parquet_file.schema_arrow.names:
+        physical_names.setdefault(canonical_column_name(name, renames), name)
+    return {
+        field.name: physical_names[field.name]
+        for field in schema
+        if field.name in physical_names
+    }
+
+
+def _target_range(column_type: pa.DataType, target: pa.DataType):
+    """
+    Return the (min, max) a numeric column can keep once cast to its canonical type, None
+    when the cast cannot overflow.
+    """
+    if column_type == target or not (
+        pa.types.is_integer(column_type) or pa.types.is_floating(column_type)
+    ):
+        return None
+    if pa.types.is_integer(target):
+        bounds = np.iinfo(target.to_pandas_dtype())
+        return int(bounds.min), int(bounds.max)
+    if pa.types.is_floating(target) and target.bit_width < column_type.bit_width:
+        bounds = np.finfo(target.to_pandas_dtype())
+        return float(bounds.min), float(bounds.max)
+    return None
+
+
+def null_out_of_range(column, target: pa.DataType):
+    """
+    Replace by nulls the values of a numeric column its canonical type cannot hold.
+
+    An integer column keeps the values within the bounds of its type (a passenger_count of
+    300 does not fit an int8), NaN and infinite values included; a float32 column the finite
+    values of a float32. The cleaning stage then handles the nulls like missing values.
+
+    Parameters:
+        - column (pa.Array | pa.ChunkedArray): The column read from the file
+        - target (pa.DataType): Its canonical type
+
+    Returns:
+        - Tuple[pa.Array | pa.ChunkedArray, int]: The column and the number of values nulled
+    """
+    bounds = _target_range(column.type, target)
+    if bounds is None:
+        return column, 0
+    # NaN compares False with both bounds, a null stays null
+    in_range = pc.and_(pc.greater_equal(column, bounds[0]), pc.less_equal(column, bounds[1]))
+    nulled = pc.sum(pc.invert(in_range)).as_py() or 0
+    if nulled == 0:
+        return column, 0
+    return pc.if_else(in_range, column, pa.scalar(None, type=column.type)), nulled
+
+
+def _cast_to_schema(data, schema: pa.Schema, physical_names: Dict[str, str]) -> pa.Table:
+    """
+    Cast a table or a record batch read from the file to the canonical schema.
+
+    The values out of the range of their canonical type are nulled first (see
+    null_out_of_range): the casts keep the overflow checks, a value they would wrap raises
+    instead of being loaded as a wrong number.
+    """
+    arrays = []
+    for field in schema:
+        if field.name in physical_names:
+            column, nulled = null_out_of_range(
+                data.column(physical_names[field.name]), field.type
+            )
+            if nulled:
+                print(f"{field.name}: {nulled} values out of the {field.type} range set to null")
+            # Float counts (1.0) become integers, nanosecond timestamps microseconds
+            arrays.append(
+                pc.cast(
+                    column,
+                    options=pc.CastOptions(
+                        field.type, allow_float_truncate=True, allow_time_truncate=True
+                    ),
+                )
+            )
+        else:
+            arrays.append(pa.nulls(data.num_rows, type=field.type))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _project_schema(schema: pa.Schema, columns: Optional[List[str]]) -> pa.Schema:
+    if columns is None:
+        return schema
+    return pa.schema([schema.field(name) for name in columns])
+
+
+def read_trip_parquet(
+    source,
+    columns: Optional[List[str]] = None,
+    schema: pa.Schema = TRIP_SCHEMA,
+    renames: Optional[Dict[str, str]] = None,
+) -> pa.Table:
+    """
+    Read a trip Parquet file with column projection and cast it to the canonical schema.
+
+    Parameters:
+        - source: A path or a file-like object holding the Parquet data
+        - columns (Optional[List[str]]): Canonical columns to keep, every column of the schema by default
+        - schema (pa.Schema): The canonical schema to cast to
+        - renames (Optional[Dict[str, str]]): Dataset specific renames (lowercase name: canonical name)
+
+    Returns:
+        - pa.Table: The table with the canonical column names and types, columns missing from the
+        file are filled with nulls
+    """
+    schema = _project_schema(schema, columns)
+    parquet_file = pq.ParquetFile(source)
+    physical_names = _physical_columns(parquet_file, schema, renames)
+
+    table = parquet_file.read(columns=list(physical_names.values()))
+    return _cast_to_schema(table, schema, physical_names)
+
+
+def iter_trip_batches(
+    source,
+    batch_size: int,
+    columns: Optional[List[str]] = None,
+    schema: pa.Schema = TRIP_SCHEMA,
+    renames: Optional[Dict[str, str]] = None,
+) -> Iterator[pa.Table]:
+    """
+    Stream a trip Parquet file as canonical tables of at most `batch_size` rows.
+
+    Only one batch is decoded at a time, so the memory used does not grow with the file (the
+    High Volume FHV files are several times larger than the yellow ones).
+
+    Parameters:
+        - source: A path or a file-like object holding the Parquet data
+        - batch_size (int): Maximum number of rows per batch
+        - columns, schema, renames: See read_trip_parquet
+
+    Returns:
+        - Iterator[pa.Table]: The batches with the canonical column names and types
+    """
+    schema = _project_schema(schema, columns)
+    parquet_file = pq.ParquetFile(source)
+    physical_names = _physical_columns(parquet_file, schema, renames)
+
+    for batch in parquet_file.iter_batches(
+        batch_size=batch_size, columns=list(physical_names.values())
+    ):
+        yield _cast_to_schema(batch, schema, physical_names)
+
+
+def trip_table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert a canonical trip table to pandas while keeping its compact types.
+    """
+    return table.to_pandas(types_mapper=PANDAS_TYPES.get)
@@ -0,0 +1,371 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+# Alert thresholds of detect_drift
+PSI_ALERT = 0.2  # Population stability index between two distributions
+QUANTILE_SHIFT_ALERT = 0.2  # Relative shift of the median or the 90th percentile
+DISTINCT_SHIFT_ALERT = 0.3  # Relative change of a distinct count
+
+# Number of previous batches merged into the drift baseline
+BASELINE_BATCHES = 3
+
+
+class TDigest:
+    """
+    Merging t-digest: quantile sketch of a stream, updated with whole arrays at once.
+    """
+
+    def __init__(self, compression: float = 100.0):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype="float64")
+        values = values[np.isfinite(values)]
+        self._merge(values, np.ones(len(values)))
+
+    def merge(self, other: "TDigest") -> None:
+        self._merge(other.means, other.weights)
+
+    def _merge(self, means: np.ndarray, weights: np.ndarray) -> None:
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        if len(means) == 0:
+            return
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        # Centroids whose mid quantile falls in the same unit of the k1 scale are merged,
+        # which keeps small centroids (precise quantiles) in the tails
+        cumulative = np.cumsum(weights)
+        quantiles = (cumulative - weights / 2) / cumulative[-1]
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1)
+        clusters = np.floor(scale - scale.min()).astype(np.int64)
+
+        cluster_weights = np.bincount(clusters, weights=weights)
+        cluster_sums = np.bincount(clusters, weights=means * weights)
+        kept = cluster_weights > 0
+        self.weights = cluster_weights[kept]
+        self.means = cluster_sums[kept] / self.weights
+
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def quantile(self, q: float) -> float:
+        if len(self.means) == 0:
+            return float("nan")
+        cumulative = np.cumsum(self.weights)
+        return float(np.interp(q * cumulative[-1], cumulative - self.weights / 2, self.means))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "compression": np.array([self.compression]),
+            "means": self.means,
+            "weights": self.weights,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "TDigest":
+        digest = cls(float(arrays["compression"][0]))
+        digest.means = arrays["means"]
+        digest.weights = arrays["weights"]
+        return digest
+
+
+def hash_int64(values: np.ndarray) -> np.ndarray:
+    """
+    Mix int64 values into well spread uint64 hashes (splitmix64 finalizer).
+    """
+    x = np.asarray(values).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """
+    Number of significant bits of each uint64 value, by binary search over the shifts.
+    """
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= (np.uint64(1) << np.uint64(shift))
+        lengths += high * shift
+        values = np.where(high, values >> np.uint64(shift), values)
+    return lengths + (values > 0)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct count sketch with 2**precision one-byte registers.
+    """
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: np.ndarray) -> None:
+        hashes = hash_int64(values)
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        # The guard bit bounds the rank when the remaining bits are all zero
+        remaining = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = (65 - _bit_length(remaining)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype("float64")))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"registers": self.registers}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "HyperLogLog":
+        sketch = cls(int(np.log2(len(arrays["registers"]))))
+        sketch.registers = arrays["registers"].astype(np.uint8)
+        return sketch
+
+
+class Histogram:
+    """
+    Counts over fixed bin edges, values outside the edges go to the first or last bin.
+    """
+
+    def __init__(self, edges: np.ndarray):
+        self.edges = np.asarray(edges, dtype="float64")
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype="float64")
+        values = values[np.isfinite(values)]
+        bins = np.searchsorted(self.edges, values, side="right") - 1
+        bins = np.clip(bins, 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts += other.counts
+
+    def count(self) -> float:
+        return float(self.counts.sum())
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"edges": self.edges, "counts": self.counts}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "Histogram":
+        histogram = cls(arrays["edges"])
+        histogram.counts = arrays["counts"].astype(np.int64)
+        return histogram
+
+
+SKETCH_TYPES = {"tdigest": TDigest, "hll": HyperLogLog, "histogram": Histogram}
+
+
+def new_fact_profile() -> Dict[Tuple[str, str], object]:
+    """
+    Create the empty sketches profiled for each load batch of fact_yellow_taxi.
+    """
+    return {
+        ("fare_amount", "tdigest"): TDigest(),
+        ("fare_amount", "histogram"): Histogram(np.arange(0, 202, 2)),
+        ("total_amount", "tdigest"): TDigest(),
+        ("tip_rate", "tdigest"): TDigest(),
+        ("tip_rate", "histogram"): Histogram(np.linspace(0, 1, 51)),
+        # One bin per payment type and per zone (-1 is the unknown member)
+        ("payment_mix", "histogram"): Histogram(np.arange(-1.5, 7.5)),
+        ("zone_mix", "histogram"): Histogram(np.arange(-1.5, 266.5)),
+        ("zone_pair", "hll"): HyperLogLog(),
+    }
+
+
+def update_fact_profile(profile: Dict[Tuple[str, str], object], fact: pd.DataFrame) -> None:
+    """
+    Add a batch of mapped fact rows to the profile, one vectorized pass per feature.
+    """
+    fare = fact["fare_amount"].to_numpy(dtype="float64", na_value=np.nan)
+    total = fact["total_amount"].to_numpy(dtype="float64", na_value=np.nan)
+    tip = fact["tip_amount"].to_numpy(dtype="float64", na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tip_rate = np.where(fare > 0, tip / fare, np.nan)
+
+    pickup = fact["id_zone_pickup"].to_numpy(dtype=np.int64)
+    dropoff = fact["id_zone_dropoff"].to_numpy(dtype=np.int64)
+
+    profile[("fare_amount", "tdigest")].update(fare)
+    profile[("fare_amount", "histogram")].update(fare)
+    profile[("total_amount", "tdigest")].update(total)
+    profile[("tip_rate", "tdigest")].update(tip_rate)
+    profile[("tip_rate", "histogram")].update(tip_rate)
+    profile[("payment_mix", "histogram")].update(fact["id_payment_type"].to_numpy())
+    profile[("zone_mix", "histogram")].update(pickup)
+    profile[("zone_pair", "hll")].update(pickup * 1000 + dropoff)
+
+
+def sketch_to_bytes(sketch) -> bytes:
+    """
+    Serialize a sketch to a compressed NumPy archive.
+    """
+    buffer = BytesIO()
+    np.savez_compressed(buffer, **sketch.to_arrays())
+    return buffer.getvalue()
+
+
+def sketch_from_bytes(sketch_type: str, payload: bytes):
+    """
+    Rebuild a sketch serialized by sketch_to_bytes.
+    """
+    with np.load(BytesIO(bytes(payload))) as arrays:
+        return SKETCH_TYPES[sketch_type].from_arrays({k: arrays[k] for k in arrays.files})
+
+
+def save_fact_profile(conn, batch_key: str, profile: Dict[Tuple[str, str], object]) -> None:
+    """
+    Store the sketches of a load batch in profile_fact_yellow_taxi, without committing.
+    """
+    cursor = conn.cursor()
+    for (feature, sketch_type), sketch in profile.items():
+        cursor.execute(
+            "INSERT INTO profile_fact_yellow_taxi (batch_key, feature, sketch_type, row_count, payload) "
+            "VALUES (%s, %s, %s, %s, %s) "
+            "ON CONFLICT (batch_key, feature, sketch_type) "
+            "DO UPDATE SET row_count = EXCLUDED.row_count, payload = EXCLUDED.payload",
+            (batch_key, feature, sketch_type, int(sketch.count()), sketch_to_bytes(sketch)),
+        )
+    cursor.close()
+
+
+def load_fact_profiles(conn, batch_keys: List[str]) -> Dict[str, Dict[Tuple[str, str], object]]:
+    """
+    Load the stored profiles of the given load batches.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT batch_key, feature, sketch_type, payload FROM profile_fact_yellow_taxi "
+        "WHERE batch_key = ANY(%s)",
+        (list(batch_keys),),
+    )
+    profiles = {}
+    for batch_key, feature, sketch_type, payload in cursor.fetchall():
+        profiles.setdefault(batch_key, {})[(feature, sketch_type)] = sketch_from_bytes(
+            sketch_type, payload
+        )
+    cursor.close()
+    return profiles
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray) -> float:
+    """
+    PSI between two binned distributions, empty bins smoothed with a small epsilon.
+    """
+    epsilon = 1e-6
+    expected = expected / max(expected.sum(), 1) + epsilon
+    actual = actual / max(actual.sum(), 1) + epsilon
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def baseline_profile(profiles: List[Dict]) -> Tuple[Dict, Dict]:
+    """
+    Build the drift baseline of the profiles of the previous batches.
+
+    The t-digests and the histograms are merged. The HyperLogLog sketches are not: merged,
+    they would count the distinct values of the union of the batches, more than any single
+    batch holds. The mean of their per-batch estimates is kept instead.
+
+    Returns:
+        - Tuple[Dict, Dict]: The merged sketches and the mean distinct counts, keyed by
+        (feature, sketch type)
+    """
+    baseline = {}
+    distinct_counts = {}
+    for profile in profiles:
+        for name, sketch in profile.items():
+            if name[1] == "hll":
+                distinct_counts.setdefault(name, []).append(sketch.count())
+            elif name in baseline:
+                baseline[name].merge(sketch)
+            else:
+                baseline[name] = sketch
+    return baseline, {name: float(np.mean(counts)) for name, counts in distinct_counts.items()}
+
+
+def compare_profiles(current: Dict, baseline: Dict, distinct_counts: Dict = None) -> List[str]:
+    """
+    Compare a batch profile with a baseline profile and describe every drift found.
+
+    The distinct counts are compared with distinct_counts (see baseline_profile).
+    """
+    alerts = []
+    for (feature, sketch_type), sketch in current.items():
+        if sketch.count() == 0:
+            continue
+        if sketch_type == "hll":
+            before, after = (distinct_counts or {}).get((feature, sketch_type)), sketch.count()
+            if before and abs(after - before) / before > DISTINCT_SHIFT_ALERT:
+                alerts.append(f"{feature}: distinct {before:.0f} -> {after:.0f}")
+            continue
+
+        reference = baseline.get((feature, sketch_type))
+        if reference is None or reference.count() == 0:
+            continue
+
+        if sketch_type == "histogram":
+            psi = population_stability_index(reference.counts, sketch.counts)
+            if psi > PSI_ALERT:
+                alerts.append(f"{feature}: PSI {psi:.3f} > {PSI_ALERT}")
+        elif sketch_type == "tdigest":
+            for q in (0.5, 0.9):
+                before, after = reference.quantile(q), sketch.quantile(q)
+                if before and abs(after - before) / abs(before) > QUANTILE_SHIFT_ALERT:
+                    alerts.append(f"{feature}: p{int(q * 100)} {before:.2f} -> {after:.2f}")
+    return alerts
+
+
+def detect_drift(conn, batch_key: str) -> List[str]:
+    """
+    Compare the profile of a load batch with the profiles of the previous batches.
+
+    Only the stored sketches are read, the fact history is never scanned again.
+
+    Returns:
+        - List[str]: One message per drifting feature, empty without drift or history
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT DISTINCT batch_key FROM profile_fact_yellow_taxi "
+        "WHERE batch_key < %s ORDER BY batch_key DESC LIMIT %s",
+        (batch_key, BASELINE_BATCHES),
+    )
+    previous = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    if not previous:
+        return []
+
+    profiles = load_fact_profiles(conn, previous + [batch_key])
+    if batch_key not in profiles:
+        return []
+
+    baseline, distinct_counts = baseline_profile([profiles.get(key, {}) for key in previous])
+    return compare_profiles(profiles[batch_key], baseline, distinct_counts)
@@ -0,0 +1,85 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+# Levels of the time rollup pyramid of fact_yellow_taxi, finest first: each level is
+# aggregated from the previous one, the hourly level from the fact table itself
+ROLLUP_LEVELS = [
+    ("hour", "rollup_hourly_yellow_taxi"),
+    ("day", "rollup_daily_yellow_taxi"),
+    ("month", "rollup_monthly_yellow_taxi"),
+]
+
+# Dimensions kept at every level of the pyramid
+ROLLUP_KEYS = ["id_zone_pickup", "id_vendor", "id_payment_type"]
+
+
+def _period_filter(column: str, period) -> tuple:
+    """
+    Return the WHERE clause and the parameters restricting a column to a [start, end) period.
+    """
+    if period is None:
+        return "", ()
+    return f" WHERE {column} >= %s AND {column} < %s", tuple(period)
+
+
+def refresh_rollups(conn, period=None, fact_table: str = "fact_yellow_taxi") -> None:
+    """
+    Recompute the rollup pyramid of a period from the fact table, without committing.
+
+    The hourly trip counts and amounts per pickup zone, vendor and payment type are
+    aggregated from the facts in one pass, the daily level from the hourly one and the
+    monthly level from the daily one, so a month reload only touches its own rows.
+
+    Parameters:
+        - conn (psycopg2.connection): Connection to the datamart
+        - period (tuple): [start, end) bounds on the pickup time, aligned on months,
+        the whole fact table if None
+        - fact_table (str): The fact table summarized by the pyramid
+    """
+    keys = ", ".join(ROLLUP_KEYS)
+    cursor = conn.cursor()
+    for _, table in ROLLUP_LEVELS:
+        where, params = _period_filter("period_start", period)
+        cursor.execute(f"DELETE FROM {table}{where}", params)
+
+    # Niveau horaire : id_time_pickup est l'epoch de la prise en charge
+    where, params = "", ()
+    if period is not None:
+        where = (
+            " WHERE id_time_pickup >= EXTRACT(EPOCH FROM %s::timestamp)::INTEGER "
+            "AND id_time_pickup < EXTRACT(EPOCH FROM %s::timestamp)::INTEGER"
+        )
+        params = tuple(period)
+    cursor.execute(
+        f"INSERT INTO {ROLLUP_LEVELS[0][1]} (period_start, {keys}, trip_count, total_amount_sum) "
+        f"SELECT to_timestamp(id_time_pickup - id_time_pickup % 3600) AT TIME ZONE 'UTC', "
+        f"{keys}, COUNT(*), SUM(total_amount) "
+        f"FROM {fact_table}{where} GROUP BY 1, {keys}",
+        params,
+    )
+
+    # Niveaux journalier et mensuel, chacun à partir du niveau inférieur
+    for (_, source), (level, table) in zip(ROLLUP_LEVELS, ROLLUP_LEVELS[1:]):
+        where, params = _period_filter("period_start", period)
+        cursor.execute(
+            f"INSERT INTO {table} (period_start, {keys}, trip_count, total_amount_sum) "
+            f"SELECT date_trunc('{level}', period_start), {keys}, "
+            f"SUM(trip_count), SUM(total_amount_sum) "
+            f"FROM {source}{where} GROUP BY 1, {keys}",
+            params,
+        )
+    cursor.close()
+
+
+def clear_rollups(conn) -> None:
+    """
+    Empty every level of the rollup pyramid, without committing.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"TRUNCATE {', '.join(table for _, table in ROLLUP_LEVELS)}")
+    cursor.close()
@@ -0,0 +1,149 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Tuple
+from data_cleaning import PERIOD_TOLERANCE
+from warehouse_schema import PARTITION_COLUMN
+
+
+class TripHashIndex:
+    """
+    Set of 64-bit trip hashes held as one sorted NumPy array.
+    """
+
+    def __init__(self, hashes: np.ndarray = None):
+        if hashes is None:
+            hashes = np.empty(0, dtype=np.uint64)
+        self.hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Return the mask of the hashes present in the index, for a whole array at once.
+        """
+        if len(self.hashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.searchsorted(self.hashes, hashes)
+        positions = np.minimum(positions, len(self.hashes) - 1)
+        return self.hashes[positions] == hashes
+
+    def add(self, hashes: np.ndarray) -> None:
+        """
+        Add hashes to the index.
+
+        Two sorted runs are concatenated, the stable sort (timsort) merges them in linear time.
+        """
+        new_hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+        new_hashes = new_hashes[~self.contains(new_hashes)]
+        self.hashes = np.sort(np.concatenate([self.hashes, new_hashes]), kind="stable")
+
+
+def trip_hashes(dataframe: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """
+    Hash the identifying columns of every trip into one uint64 per row.
+
+    The columns are hashed and combined by pandas over whole arrays, without a Python loop.
+
+    Parameters:
+        - dataframe (pd.DataFrame): The trips, with the canonical column names
+        - columns (List[str]): The columns identifying a trip (see datasets.py, dedup_keys)
+
+    Returns:
+        - np.ndarray: The hashes, in the order of the rows
+    """
+    return pd.util.hash_pandas_object(dataframe[columns], index=False).to_numpy(
+        dtype=np.uint64
+    )
+
+
+def drop_duplicate_trips(
+    dataframe: pd.DataFrame,
+    columns: List[str],
+    seen: TripHashIndex,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Drop the trips of a batch already loaded from the same file.
+
+    A trip is kept the first time its hash appears in the file, the kept hashes are added to
+    seen. A trip with a NULL identifying column (a location or a base left empty by the
+    dispatcher) cannot be told apart from another and is always kept, as in
+    drop_boundary_duplicates. The trips also published by a neighbouring file are dropped by
+    drop_boundary_duplicates, once the file is staged.
+
+    Parameters:
+        - dataframe (pd.DataFrame): The clean trips of the batch
+        - columns (List[str]): The columns identifying a trip
+        - seen (TripHashIndex): The hashes of the previous batches of the file, updated
+
+    Returns:
+        - Tuple[pd.DataFrame, int]: The kept trips and the number of duplicates dropped
+    """
+    complete = dataframe[columns].notna().all(axis=1).to_numpy()
+    hashes = trip_hashes(dataframe[complete], columns)
+
+    # First occurrence of each hash in the batch, then in the file
+    keep_complete = np.zeros(len(hashes), dtype=bool)
+    keep_complete[np.unique(hashes, return_index=True)[1]] = True
+    keep_complete &= ~seen.contains(hashes)
+    seen.add(hashes[keep_complete])
+
+    keep = ~complete
+    keep[complete] = keep_complete
+    duplicates = int(len(keep) - keep.sum())
+    if duplicates == 0:
+        return dataframe, 0
+    return dataframe[keep], duplicates
+
+
+def drop_boundary_duplicates(
+    cursor, table: str, staging: str, period, columns: List[str]
+) -> int:
+    """
+    Delete from a staging table the trips already loaded into the warehouse from another file.
+
+    A file keeps the pickups up to PERIOD_TOLERANCE outside its month (see data_cleaning.py),
+    so only the trips picked up within PERIOD_TOLERANCE of a month boundary can be published
+    in two consecutive files. They are looked up in the rows of the previous and next files
+    only (their source_month): in a partitioned table, Postgres scans those two partitions
+    and skips the others, the rows this load replaces included (the rows of an older load,
+    without source_month, are not looked up). Run under
+    lock_warehouse_table, in the transaction of the swap: the load of a neighbouring month
+    either committed before, and its rows are found here, or swaps after, and finds the rows
+    of this one. A trip with a NULL identifying column equals no other and is always kept.
+
+    Parameters:
+        - cursor (psycopg2.cursor): Cursor on the warehouse
+        - table (str): The warehouse table
+        - staging (str): The staging table of the file
+        - period (Tuple[pd.Timestamp, pd.Timestamp]): The [start, end) month of the file loaded
+        - columns (List[str]): The columns identifying a trip (see datasets.py, dedup_keys)
+
+    Returns:
+        - int: The number of trips deleted from the staging table
+    """
+    neighbours = ((period[0] - pd.DateOffset(months=1)).date(), period[1].date())
+    near_start = (period[0] + PERIOD_TOLERANCE).to_pydatetime()
+    near_end = (period[1] - PERIOD_TOLERANCE).to_pydatetime()
+    bounds = (
+        (period[0] - PERIOD_TOLERANCE).to_pydatetime(),
+        (period[1] + PERIOD_TOLERANCE).to_pydatetime(),
+    )
+    matches = " AND ".join(f"s.{column} = t.{column}" for column in columns)
+    cursor.execute(
+        f"DELETE FROM {staging} s USING {table} t "
+        "WHERE (s.tpep_pickup_datetime < %s OR s.tpep_pickup_datetime >= %s) "
+        "AND t.tpep_pickup_datetime >= %s AND t.tpep_pickup_datetime < %s "
+        "AND (t.tpep_pickup_datetime < %s OR t.tpep_pickup_datetime >= %s) "
+        f"AND t.{PARTITION_COLUMN} IN (%s, %s) AND {matches}",
+        (near_start, near_end) + bounds + (near_start, near_end) + neighbours,
+    )
+    return cursor.rowcount
@@ -0,0 +1,305 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+from io import StringIO
+from typing import List, Tuple
+import pandas as pd
+import pyarrow as pa
+from data_cleaning import PERIOD_TOLERANCE
+
+# Postgres type of each Arrow type of the canonical schemas (see parquet_reader.py):
+# Postgres has no one-byte integer, the int8 columns are stored as smallint
+POSTGRES_TYPES = {
+    pa.int8(): "smallint",
+    pa.int16(): "smallint",
+    pa.int32(): "integer",
+    pa.int64(): "bigint",
+    pa.float32(): "real",
+    pa.float64(): "double precision",
+    pa.timestamp("us"): "timestamp",
+    pa.string(): "text",
+}
+
+# Partition key of the warehouse tables: the month of the file each row was loaded from, so
+# that reloading a file replaces exactly its rows (a file also holds pickups of the day before
+# and after its month, see data_cleaning.PERIOD_TOLERANCE)
+PARTITION_COLUMN = "source_month"
+
+# Columns guaranteed by the cleaning stage (MISSING_TIMESTAMP rule) on every clean row
+NOT_NULL_COLUMNS = ["tpep_pickup_datetime", "tpep_dropoff_datetime"]
+
+# Constraint of the cleaning stage enforced by the tables (DROPOFF_BEFORE_PICKUP rule)
+TRIP_CHECK = "tpep_dropoff_datetime >= tpep_pickup_datetime"
+
+
+def warehouse_columns(schema: pa.Schema) -> List[Tuple[str, str]]:
+    """
+    Return the name and the Postgres type of each column of a canonical schema.
+    """
+    return [(field.name, POSTGRES_TYPES[field.type]) for field in schema]
+
+
+def warehouse_table_ddl(table: str, schema: pa.Schema) -> str:
+    """
+    Build the CREATE TABLE statement of a warehouse table, partitioned by month of file.
+
+    Parameters:
+        - table (str): The warehouse table
+        - schema (pa.Schema): The canonical schema of its dataset
+
+    Returns:
+        - str: The statement, a no-op if the table already exists
+    """
+    columns = [
+        f"{name} {sql_type}{' NOT NULL' if name in NOT_NULL_COLUMNS else ''}"
+        for name, sql_type in warehouse_columns(schema)
+    ]
+    columns.append(f"{PARTITION_COLUMN} date")
+    columns.append(f"CONSTRAINT {table}_trip_check CHECK ({TRIP_CHECK})")
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)}) "
+        f"PARTITION BY LIST ({PARTITION_COLUMN})"
+    )
+
+
+def reject_table_ddl(table: str, schema: pa.Schema) -> str:
+    """
+    Build the CREATE TABLE statement of the table of the rows rejected by the cleaning stage.
+
+    The rejected rows break the constraints of the warehouse table, every column is nullable.
+    """
+    columns = [f"{name} {sql_type}" for name, sql_type in warehouse_columns(schema)]
+    columns += ["reject_reason text", "source_file text"]
+    return f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})"
+
+
+def partition_name(table: str, period) -> str:
+    """
+    Return the name of the partition of a month, e.g. warehouse_2024_01.
+    """
+    return f"{table}_{period[0]:%Y_%m}"
+
+
+def staging_name(table: str, period) -> str:
+    """
+    Return the name of the staging table loading a month, e.g. warehouse_staging_2024_01.
+    """
+    return f"{table}_staging_{period[0]:%Y_%m}"
+
+
+def create_warehouse_table(cursor, table: str, schema: pa.Schema) -> bool:
+    """
+    Create a warehouse table and its default partition if they do not exist yet.
+
+    The default partition receives the rows of the files whose month cannot be read from the
+    name (source_month is NULL). A table created by an older load (DataFrame.to_sql, not
+    partitioned) is kept, with a source_month column added (NULL for its existing rows).
+
+    Parameters:
+        - cursor (psycopg2.cursor): Cursor on the warehouse
+        - table (str): The warehouse table
+        - schema (pa.Schema): The canonical schema of its dataset
+
+    Returns:
+        - bool: True if the table is partitioned, False for a table of an older load
+    """
+    cursor.execute(warehouse_table_ddl(table, schema))
+    if not is_partitioned(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {PARTITION_COLUMN} date")
+        return False
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    return True
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    """
+    Tell whether a table is partitioned.
+    """
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,)
+    )
+    row = cursor.fetchone()
+    return row is not None and row[0]
+
+
+def create_staging_table(cursor, table: str, period, source_month: bool = True) -> str:
+    """
+    Create an empty UNLOGGED staging table with the columns and constraints of a warehouse table.
+
+    The rows copied into it are not written to the WAL, and receive the month of the file as
+    source_month by default. A staging table left by a failed load is dropped first.
+
+    For a partitioned table the WAL saving is mostly deferred, not avoided: swap_warehouse_month
+    makes the table durable with SET LOGGED, which rewrites it and WAL-logs the whole rewrite
+    (unless wal_level is minimal). What remains saved is the WAL of the rows deleted before the
+    swap (duplicates) and of a load that fails validation. The legacy table copies the staging
+    rows with an INSERT ... SELECT, logged as usual.
+
+    Parameters:
+        - cursor (psycopg2.cursor): Cursor on the warehouse
+        - table (str): The warehouse table, or its table of rejected rows
+        - period (Tuple[pd.Timestamp, pd.Timestamp]): The [start, end) month of the file loaded
+        - source_month (bool): Whether the table has a source_month column (not the rejects)
+
+    Returns:
+        - str: The name of the staging table
+    """
+    staging = staging_name(table, period)
+    cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+    cursor.execute(
+        f"CREATE UNLOGGED TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    if source_month:
+        cursor.execute(
+            f"ALTER TABLE {staging} ALTER COLUMN {PARTITION_COLUMN} SET DEFAULT %s",
+            (period[0].date(),),
+        )
+    return staging
+
+
+def copy_warehouse_batch(cursor, dataframe: pd.DataFrame, table: str) -> None:
+    """
+    Append clean trips to a warehouse or staging table with a single COPY.
+    """
+    buffer = StringIO()
+    dataframe.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(dataframe.columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def validate_staging(cursor, table: str, staging: str, period, expected_rows: int) -> None:
+    """
+    Check a loaded staging table before it replaces its month, raise a ValueError if it is wrong.
+
+    The row count must match the rows copied, and every pickup must fall in the month of the
+    file, give or take PERIOD_TOLERANCE. The bounds are added as CHECK constraints: kept on
+    the partition, they let the planner skip it for the pickup ranges it cannot hold
+    (constraint_exclusion) and let ATTACH PARTITION skip its own scan.
+
+    Parameters:
+        - cursor (psycopg2.cursor): Cursor on the warehouse
+        - table (str): The warehouse table
+        - staging (str): The staging table
+        - period (Tuple[pd.Timestamp, pd.Timestamp]): The [start, end) month of the file loaded
+        - expected_rows (int): The number of rows copied into the staging table
+    """
+    cursor.execute(f"SELECT COUNT(*) FROM {staging}")
+    rows = cursor.fetchone()[0]
+    if rows != expected_rows:
+        raise ValueError(f"{staging} holds {rows} rows, {expected_rows} were copied")
+
+    partition = partition_name(table, period)
+    cursor.execute(
+        f"ALTER TABLE {staging} ADD CONSTRAINT {partition}_pickup_check "
+        "CHECK (tpep_pickup_datetime >= %s AND tpep_pickup_datetime < %s)",
+        (
+            (period[0] - PERIOD_TOLERANCE).to_pydatetime(),
+            (period[1] + PERIOD_TOLERANCE).to_pydatetime(),
+        ),
+    )
+    cursor.execute(
+        f"ALTER TABLE {staging} ADD CONSTRAINT {partition}_month_check "
+        f"CHECK ({PARTITION_COLUMN} IS NOT NULL AND {PARTITION_COLUMN} = %s)",
+        (period[0].date(),),
+    )
+
+
+def lock_warehouse_table(cursor, table: str) -> None:
+    """
+    Lock a warehouse table against the swaps of the other loads until the end of the transaction.
+
+    SHARE ROW EXCLUSIVE conflicts with itself but not with the readers. Taken before any other
+    lock on the table, it orders the swaps of concurrent loads instead of letting two of them
+    hold a shared lock and wait for each other's DETACH PARTITION (a deadlock).
+    """
+    cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+
+
+def replaced_rows(period, partitioned: bool, alias: str = None) -> Tuple[str, tuple]:
+    """
+    Return the condition and the parameters selecting the rows a reload of a file replaces.
+
+    In a partitioned table they are the rows of its source_month. The rows of a table of an
+    older load have no source_month: the pickups of the month of the file, give or take
+    PERIOD_TOLERANCE, are replaced as well.
+    """
+    prefix = f"{alias}." if alias else ""
+    if partitioned:
+        return f"{prefix}{PARTITION_COLUMN} = %s", (period[0].date(),)
+    return (
+        f"({prefix}{PARTITION_COLUMN} = %s OR ({prefix}{PARTITION_COLUMN} IS NULL "
+        f"AND {prefix}tpep_pickup_datetime >= %s AND {prefix}tpep_pickup_datetime < %s))",
+        (
+            period[0].date(),
+            (period[0] - PERIOD_TOLERANCE).to_pydatetime(),
+            (period[1] + PERIOD_TOLERANCE).to_pydatetime(),
+        ),
+    )
+
+
+def swap_warehouse_month(cursor, table: str, staging: str, period, partitioned: bool) -> None:
+    """
+    Replace the rows of a month of a warehouse table by a validated staging table.
+
+    For a partitioned table, the previous partition of the month is detached and dropped, and
+    the staging table, made durable with SET LOGGED, is attached in its place. A table of an
+    older load receives the staging rows in a single INSERT ... SELECT after the rows of the
+    file are deleted (see replaced_rows). Nothing is committed: readers see the previous month
+    until the caller commits.
+
+    SET LOGGED is not free: it rewrites the staging table and writes all of it to the WAL, so
+    the month costs about the WAL it would have cost with a logged staging table, written at
+    once under the swap lock rather than during the COPY.
+
+    Parameters:
+        - cursor (psycopg2.cursor): Cursor on the warehouse
+        - table (str): The warehouse table
+        - staging (str): The staging table, checked by validate_staging
+        - period (Tuple[pd.Timestamp, pd.Timestamp]): The [start, end) month of the file loaded
+        - partitioned (bool): Whether the warehouse table is partitioned
+    """
+    if not partitioned:
+        condition, params = replaced_rows(period, partitioned)
+        cursor.execute(f"DELETE FROM {table} WHERE {condition}", params)
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {staging}")
+        cursor.execute(f"DROP TABLE {staging}")
+        return
+
+    partition = partition_name(table, period)
+    cursor.execute(
+        "SELECT 1 FROM pg_inherits WHERE inhparent = to_regclass(%s) "
+        "AND inhrelid = to_regclass(%s)",
+        (table, partition),
+    )
+    if cursor.fetchone() is not None:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {partition}")
+        cursor.execute(f"DROP TABLE {partition}")
+
+    # Une partition non journalisée serait vidée après un arrêt brutal du serveur
+    cursor.execute(f"ALTER TABLE {staging} SET LOGGED")
+    cursor.execute(f"ALTER TABLE {staging} RENAME TO {partition}")
+    cursor.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES IN (%s)",
+        (period[0].date(),),
+    )
+
+
+def replace_rejected_rows(cursor, reject_table: str, file_key: str, staging: str = None) -> None:
+    """
+    Replace the quarantined rows of a file by the rows of a staging table, without committing.
+
+    Without staging table, the rows of the file are only deleted (before they are copied again
+    in the same transaction).
+    """
+    cursor.execute(f"DELETE FROM {reject_table} WHERE source_file = %s", (file_key,))
+    if staging is not None:
+        cursor.execute(f"INSERT INTO {reject_table} SELECT * FROM {staging}")
+        cursor.execute(f"DROP TABLE {staging}")
@@ -0,0 +1,125 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+from psycopg2 import sql
+from key_mapping import FACT_MEASURE_COLUMNS
+
+# Denormalized copy of fact_yellow_taxi read by the dashboard without any join
+WIDE_FACT_TABLE = "fact_yellow_taxi_wide"
+
+# Enum types encoding the labels of the wide table (4 bytes per value instead of the text):
+# type -> (dimension table, label column)
+WIDE_LABEL_TYPES = {
+    "zone_label": ("dimension_zone", "name_zone"),
+    "borough_label": ("dimension_zone", "borough"),
+    "vendor_label": ("dimension_vendor", "vendor_name"),
+    "payment_label": ("dimension_payment", "payment_method"),
+}
+
+
+def sync_label_types(conn) -> int:
+    """
+    Add the dimension labels missing from the enum types of the wide table, then commit.
+
+    A value added to an enum cannot be used before its transaction commits, so this runs
+    before the load transactions that cast the labels. The labels are cut to the 63 bytes an
+    enum value can hold by enum_label (see creation.sql), the same way as in the casts.
+
+    Args:
+        conn (psycopg2.connection): Connection to the datamart.
+
+    Returns:
+        int: The number of labels added.
+    """
+    cursor = conn.cursor()
+    added = 0
+    for type_name, (table, column) in WIDE_LABEL_TYPES.items():
+        cursor.execute(
+            f"SELECT DISTINCT enum_label({column}) FROM {table} "
+            f"WHERE {column} IS NOT NULL "
+            "EXCEPT SELECT e.enumlabel::text FROM pg_enum e "
+            "JOIN pg_type t ON e.enumtypid = t.oid WHERE t.typname = %s",
+            (type_name,),
+        )
+        for (label,) in cursor.fetchall():
+            cursor.execute(
+                sql.SQL("ALTER TYPE {} ADD VALUE IF NOT EXISTS {}").format(
+                    sql.Identifier(type_name), sql.Literal(label)
+                )
+            )
+            added += 1
+    cursor.close()
+    conn.commit()
+    return added
+
+
+def _label(alias: str, column: str, type_name: str) -> str:
+    """
+    Return the expression casting a dimension label to its enum type.
+    """
+    return f"enum_label({alias}.{column})::{type_name}"
+
+
+def refresh_wide_fact(conn, period=None, fact_table: str = "fact_yellow_taxi") -> None:
+    """
+    Rebuild the wide fact rows of a period from the star schema, without committing.
+
+    The dimensions are joined once here, at load time, instead of on every dashboard query:
+    the pickup and dropoff timestamps, the pickup time parts, the zone names and boroughs and
+    the vendor and payment labels are stored on each row.
+
+    Args:
+        conn (psycopg2.connection): Connection to the datamart.
+        period (tuple): [start, end) bounds on the pickup time, the whole fact table if None.
+        fact_table (str): The star schema fact table copied.
+    """
+    fact_where, wide_where, params = "", "", ()
+    if period is not None:
+        fact_where = (
+            " WHERE f.id_time_pickup >= EXTRACT(EPOCH FROM %s::timestamp)::INTEGER "
+            "AND f.id_time_pickup < EXTRACT(EPOCH FROM %s::timestamp)::INTEGER"
+        )
+        wide_where = " WHERE pickup_at >= %s AND pickup_at < %s"
+        params = tuple(period)
+
+    measures = ", ".join(FACT_MEASURE_COLUMNS)
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {WIDE_FACT_TABLE}{wide_where}", params)
+    cursor.execute(
+        f"INSERT INTO {WIDE_FACT_TABLE} (pickup_at, dropoff_at, zone_pickup, borough_pickup, "
+        "zone_dropoff, borough_dropoff, vendor_name, payment_method, pickup_year, pickup_month, "
+        f"pickup_day, pickup_isodow, pickup_hour, {measures}) "
+        "SELECT t.pickup_at, t.dropoff_at, "
+        f"{_label('zp', 'name_zone', 'zone_label')}, {_label('zp', 'borough', 'borough_label')}, "
+        f"{_label('zd', 'name_zone', 'zone_label')}, {_label('zd', 'borough', 'borough_label')}, "
+        f"{_label('v', 'vendor_name', 'vendor_label')}, "
+        f"{_label('p', 'payment_method', 'payment_label')}, "
+        "EXTRACT(YEAR FROM t.pickup_at)::smallint, EXTRACT(MONTH FROM t.pickup_at)::smallint, "
+        "EXTRACT(DAY FROM t.pickup_at)::smallint, EXTRACT(ISODOW FROM t.pickup_at)::smallint, "
+        f"EXTRACT(HOUR FROM t.pickup_at)::smallint, {measures} "
+        "FROM ("
+        "SELECT f.*, to_timestamp(f.id_time_pickup) AT TIME ZONE 'UTC' AS pickup_at, "
+        "to_timestamp(f.id_time_dropoff) AT TIME ZONE 'UTC' AS dropoff_at "
+        f"FROM {fact_table} f{fact_where}"
+        ") t "
+        "LEFT JOIN dimension_zone zp ON t.id_zone_pickup = zp.id_zone "
+        "LEFT JOIN dimension_zone zd ON t.id_zone_dropoff = zd.id_zone "
+        "LEFT JOIN dimension_vendor v ON t.id_vendor = v.id_vendor "
+        "LEFT JOIN dimension_payment p ON t.id_payment_type = p.id_payment_type",
+        params,
+    )
+    cursor.close()
+
+
+def clear_wide_fact(conn) -> None:
+    """
+    Empty the wide fact table, without committing.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"TRUNCATE {WIDE_FACT_TABLE}")
+    cursor.close()
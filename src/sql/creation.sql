@@ -67,6 +67,228 @@ CREATE TABLE IF NOT EXISTS fact_yellow_taxi (
     airport_fee DECIMAL(10, 2)  -- Frais aéroport
 );
 
+-- Table des faits - fact_green_taxi (mêmes colonnes que fact_yellow_taxi)
+CREATE TABLE IF NOT EXISTS fact_green_taxi (
+    id_vendor INT NOT NULL REFERENCES dimension_vendor(id_vendor) ON DELETE CASCADE,
+    id_time_pickup INT NOT NULL REFERENCES dimension_time(id_time) ON DELETE CASCADE,
+    id_time_dropoff INT NOT NULL REFERENCES dimension_time(id_time) ON DELETE CASCADE,
+    id_zone_pickup INT NOT NULL REFERENCES dimension_zone(id_zone) ON DELETE CASCADE,
+    id_zone_dropoff INT NOT NULL REFERENCES dimension_zone(id_zone) ON DELETE CASCADE,
+    id_payment_type INT NOT NULL REFERENCES dimension_payment(id_payment_type) ON DELETE SET NULL,
+    fare_amount DECIMAL(10, 2),
+    extra DECIMAL(10, 2),
+    mta_tax DECIMAL(10, 2),
+    tip_amount DECIMAL(10, 2),
+    tolls_amount DECIMAL(10, 2),
+    improvement_surcharge DECIMAL(10, 2),
+    total_amount DECIMAL(10, 2),
+    congestion_surcharge DECIMAL(10, 2),
+    airport_fee DECIMAL(10, 2)
+);
+
+-- Table des faits - fact_fhv_trip (VTC : ni compagnie, ni paiement, ni montants)
+CREATE TABLE IF NOT EXISTS fact_fhv_trip (
+    id_time_pickup INT NOT NULL REFERENCES dimension_time(id_time) ON DELETE CASCADE,
+    id_time_dropoff INT NOT NULL REFERENCES dimension_time(id_time) ON DELETE CASCADE,
+    id_zone_pickup INT NOT NULL REFERENCES dimension_zone(id_zone) ON DELETE CASCADE,
+    id_zone_dropoff INT NOT NULL REFERENCES dimension_zone(id_zone) ON DELETE CASCADE
+);
+
+-- Table des faits - fact_fhvhv_trip (VTC à fort volume : Uber, Lyft, ...)
+CREATE TABLE IF NOT EXISTS fact_fhvhv_trip (
+    id_time_pickup INT NOT NULL REFERENCES dimension_time(id_time) ON DELETE CASCADE,
+    id_time_dropoff INT NOT NULL REFERENCES dimension_time(id_time) ON DELETE CASCADE,
+    id_zone_pickup INT NOT NULL REFERENCES dimension_zone(id_zone) ON DELETE CASCADE,
+    id_zone_dropoff INT NOT NULL REFERENCES dimension_zone(id_zone) ON DELETE CASCADE,
+    trip_distance DECIMAL(10, 2),   -- Distance en miles (trip_miles)
+    trip_time INT,                  -- Durée en secondes
+    fare_amount DECIMAL(10, 2),     -- Tarif de base (base_passenger_fare)
+    tolls_amount DECIMAL(10, 2),    -- Péages (tolls)
+    bcf DECIMAL(10, 2),             -- Black Car Fund
+    sales_tax DECIMAL(10, 2),       -- Taxe de vente
+    congestion_surcharge DECIMAL(10, 2),
+    airport_fee DECIMAL(10, 2),
+    tip_amount DECIMAL(10, 2),      -- Pourboire (tips)
+    driver_pay DECIMAL(10, 2)       -- Rémunération du chauffeur
+);
+
+-- Table de suivi de la construction du data mart par mois (reprise après une erreur)
+CREATE TABLE IF NOT EXISTS datamart_build_checkpoint (
+    fact_table VARCHAR(63) NOT NULL DEFAULT 'fact_yellow_taxi',   -- Table des faits chargée
+    chunk_key VARCHAR(7) NOT NULL,      -- Mois chargé (YYYY-MM)
+    period_start TIMESTAMP NOT NULL,    -- Début (inclus) des prises en charge du mois
+    period_end TIMESTAMP NOT NULL,      -- Fin (exclue) des prises en charge du mois
+    rows_loaded BIGINT NOT NULL,        -- Nombre de lignes insérées dans la table des faits
+    unknown_keys BIGINT NOT NULL,       -- Nombre de clés rattachées aux membres inconnus
+    completed_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (fact_table, chunk_key)
+);
+
+-- Mise à niveau d'une table de suivi créée avant l'ajout des autres jeux de données
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'datamart_build_checkpoint' AND column_name = 'fact_table'
+    ) THEN
+        ALTER TABLE datamart_build_checkpoint
+            ADD COLUMN fact_table VARCHAR(63) NOT NULL DEFAULT 'fact_yellow_taxi';
+        ALTER TABLE datamart_build_checkpoint
+            DROP CONSTRAINT datamart_build_checkpoint_pkey,
+            ADD PRIMARY KEY (fact_table, chunk_key);
+    END IF;
+END $$;
+
+-- Version du contenu du data mart (une seule ligne), incrémentée par chaque chargement validé :
+-- clé des caches du dashboard et de son instantané
+CREATE TABLE IF NOT EXISTS datamart_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Indicateurs du dashboard tenus à jour à chaque lot chargé, par table des faits et par mois
+CREATE TABLE IF NOT EXISTS kpi_fact_summary (
+    fact_table VARCHAR(63) NOT NULL,
+    chunk_key VARCHAR(7) NOT NULL,      -- Mois de prise en charge (YYYY-MM)
+    trip_count BIGINT NOT NULL,         -- Nombre de trajets
+    total_amount_sum DECIMAL(18, 2),    -- Somme de total_amount (NULL sans montants)
+    zero_amount_count BIGINT,           -- Trajets à montant nul (annulés)
+    min_pickup TIMESTAMP,               -- Première prise en charge
+    max_pickup TIMESTAMP,               -- Dernière prise en charge
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (fact_table, chunk_key)
+);
+
+-- Pyramide d'agrégats temporels de fact_yellow_taxi (heure, jour, mois), recalculée à chaque mois chargé
+-- period_start : début de l'heure, du jour ou du mois de prise en charge
+CREATE TABLE IF NOT EXISTS rollup_hourly_yellow_taxi (
+    period_start TIMESTAMP NOT NULL,
+    id_zone_pickup INT NOT NULL,
+    id_vendor INT NOT NULL,
+    id_payment_type INT NOT NULL,
+    trip_count BIGINT NOT NULL,
+    total_amount_sum DECIMAL(18, 2),
+    PRIMARY KEY (period_start, id_zone_pickup, id_vendor, id_payment_type)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_daily_yellow_taxi (
+    period_start TIMESTAMP NOT NULL,
+    id_zone_pickup INT NOT NULL,
+    id_vendor INT NOT NULL,
+    id_payment_type INT NOT NULL,
+    trip_count BIGINT NOT NULL,
+    total_amount_sum DECIMAL(18, 2),
+    PRIMARY KEY (period_start, id_zone_pickup, id_vendor, id_payment_type)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_monthly_yellow_taxi (
+    period_start TIMESTAMP NOT NULL,
+    id_zone_pickup INT NOT NULL,
+    id_vendor INT NOT NULL,
+    id_payment_type INT NOT NULL,
+    trip_count BIGINT NOT NULL,
+    total_amount_sum DECIMAL(18, 2),
+    PRIMARY KEY (period_start, id_zone_pickup, id_vendor, id_payment_type)
+);
+
+-- Libellés des dimensions encodés en types énumérés (dictionnaire : 4 octets par valeur),
+-- complétés par wide_fact.sync_label_types avant chaque chargement
+DO $$
+BEGIN
+    CREATE TYPE zone_label AS ENUM ();
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$
+BEGIN
+    CREATE TYPE borough_label AS ENUM ();
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$
+BEGIN
+    CREATE TYPE vendor_label AS ENUM ();
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$
+BEGIN
+    CREATE TYPE payment_label AS ENUM ();
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Libellé accepté par un type énuméré : 63 octets au plus (NAMEDATALEN - 1), tronqué sans
+-- couper un caractère multi-octets (left() compte des caractères, pas des octets)
+CREATE OR REPLACE FUNCTION enum_label(value TEXT) RETURNS TEXT
+LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE AS $$
+DECLARE
+    label TEXT := left(value, 63);
+BEGIN
+    WHILE octet_length(label) > 63 LOOP
+        label := left(label, -1);
+    END LOOP;
+    RETURN label;
+END $$;
+
+-- Table des faits dénormalisée (optionnelle, DATAMART_WIDE_FACT) : fact_yellow_taxi avec les
+-- libellés et les parties de date déjà joints, lue par le dashboard sans jointure
+-- (colonnes rangées par taille décroissante pour limiter le remplissage d'alignement)
+CREATE TABLE IF NOT EXISTS fact_yellow_taxi_wide (
+    pickup_at TIMESTAMP NOT NULL,       -- Prise en charge
+    dropoff_at TIMESTAMP NOT NULL,      -- Dépose
+    zone_pickup zone_label,
+    borough_pickup borough_label,
+    zone_dropoff zone_label,
+    borough_dropoff borough_label,
+    vendor_name vendor_label,
+    payment_method payment_label,
+    pickup_year SMALLINT NOT NULL,
+    pickup_month SMALLINT NOT NULL,
+    pickup_day SMALLINT NOT NULL,
+    pickup_isodow SMALLINT NOT NULL,    -- 1 = lundi
+    pickup_hour SMALLINT NOT NULL,
+    fare_amount DECIMAL(10, 2),
+    extra DECIMAL(10, 2),
+    mta_tax DECIMAL(10, 2),
+    tip_amount DECIMAL(10, 2),
+    tolls_amount DECIMAL(10, 2),
+    improvement_surcharge DECIMAL(10, 2),
+    total_amount DECIMAL(10, 2),
+    congestion_surcharge DECIMAL(10, 2),
+    airport_fee DECIMAL(10, 2)
+);
+
+-- Index BRIN : les lignes sont insérées mois par mois, dans l'ordre des prises en charge
+CREATE INDEX IF NOT EXISTS idx_fact_wide_pickup_at ON fact_yellow_taxi_wide USING BRIN (pickup_at);
+
+-- Profils statistiques (sketches t-digest, HyperLogLog, histogrammes) de chaque mois chargé
+CREATE TABLE IF NOT EXISTS profile_fact_yellow_taxi (
+    batch_key VARCHAR(7) NOT NULL,      -- chunk_key de datamart_build_checkpoint
+    feature VARCHAR(63) NOT NULL,       -- Variable profilée (fare_amount, tip_rate, zone_mix, ...)
+    sketch_type VARCHAR(15) NOT NULL,   -- tdigest, hll ou histogram
+    row_count BIGINT NOT NULL,          -- Nombre de valeurs résumées par le sketch
+    payload BYTEA NOT NULL,             -- Tableaux NumPy compressés (np.savez_compressed)
+    PRIMARY KEY (batch_key, feature, sketch_type)
+);
+
+-- Métriques de qualité additives par partition (mois), combinées par le mode incrémental du DAG Soda
+CREATE TABLE IF NOT EXISTS dq_partition_metrics (
+    table_name VARCHAR(63) NOT NULL,
+    partition_key VARCHAR(7) NOT NULL,  -- chunk_key de datamart_build_checkpoint
+    metric VARCHAR(127) NOT NULL,       -- Métrique et colonne, par exemple missing_count:id_vendor
+    value BIGINT NOT NULL,
+    computed_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (table_name, partition_key, metric)
+);
+
+-- Filigrane du dernier scan de qualité réussi par table
+CREATE TABLE IF NOT EXISTS dq_scan_watermark (
+    table_name VARCHAR(63) PRIMARY KEY,
+    last_loaded_at TIMESTAMP NOT NULL,  -- completed_at du dernier chunk vérifié
+    last_scan_at TIMESTAMP NOT NULL
+);
+
 -- Création d'index sur les clés étrangères pour améliorer les performances des jointures
 CREATE INDEX IF NOT EXISTS idx_fact_vendor ON fact_yellow_taxi(id_vendor);
 CREATE INDEX IF NOT EXISTS idx_fact_time_pickup ON fact_yellow_taxi(id_time_pickup);
@@ -74,3 +296,15 @@ CREATE INDEX IF NOT EXISTS idx_fact_time_dropoff ON fact_yellow_taxi(id_time_dro
 CREATE INDEX IF NOT EXISTS idx_fact_zone_pickup ON fact_yellow_taxi(id_zone_pickup);
 CREATE INDEX IF NOT EXISTS idx_fact_zone_dropoff ON fact_yellow_taxi(id_zone_dropoff);
 CREATE INDEX IF NOT EXISTS idx_fact_payment_type ON fact_yellow_taxi(id_payment_type);
+CREATE INDEX IF NOT EXISTS idx_fact_green_time_pickup ON fact_green_taxi(id_time_pickup);
+CREATE INDEX IF NOT EXISTS idx_fact_fhv_time_pickup ON fact_fhv_trip(id_time_pickup);
+CREATE INDEX IF NOT EXISTS idx_fact_fhvhv_time_pickup ON fact_fhvhv_trip(id_time_pickup);
+
+-- Membres "inconnus" des dimensions: les clés de faits absentes d'une dimension y sont rattachées
+-- par l'étape de mapping des clés (key_mapping.py) au lieu de violer la clé étrangère
+INSERT INTO dimension_vendor (id_vendor, vendor_name) VALUES (-1, 'Unmapped Vendor') ON CONFLICT DO NOTHING;
+-- Attributs de l'epoch -1 (1969-12-31 23:59:59) pour respecter les contrôles Soda de dimension_time
+INSERT INTO dimension_time (id_time, year, month, day, hour, minute, seconde, week, trimester)
+VALUES (-1, 1969, 12, 31, 23, 59, 59, 1, 4) ON CONFLICT DO NOTHING;
+INSERT INTO dimension_zone (id_zone, borough, name_zone, service_zone) VALUES (-1, 'Unknown', 'Unknown', 'Unknown') ON CONFLICT DO NOTHING;
+INSERT INTO dimension_payment (id_payment_type, payment_method) VALUES (-1, 'Unmapped') ON CONFLICT DO NOTHING;
@@ -6,11 +6,19 @@
 ***********************************************************************
 """
 
+import importlib
 import streamlit as st
 from streamlit_option_menu import option_menu  # Importation de option_menu
-import streamlit_pages.home as home
-import streamlit_pages.data as data
-import streamlit_pages.dashboard as dashboard
+import config  # noqa: F401  Configuration partagée (.env, chemins), chargée une seule fois
+
+# Pages chargées à la demande (module, fonction d'affichage) : la page d'accueil n'importe ni
+# pandas, ni plotly, ni psycopg2, et un module déjà importé n'est pas rechargé aux exécutions suivantes
+PAGES = {
+    "Home": ("streamlit_pages.home", "show_home"),
+    "Data": ("streamlit_pages.data", "show_data"),
+    "Dashboard": ("streamlit_pages.dashboard", "show_dashboard"),
+    "Performance": ("streamlit_pages.performance", "show_performance"),
+}
 
 # Titre dans la barre latérale avec Flexbox pour aligner l'image et le titre
 st.sidebar.markdown(
@@ -61,8 +69,8 @@ def sideBar():
     with st.sidebar:
         selected = option_menu(
             menu_title="Menu Principal",
-            options=["Home", "Data", "Dashboard"],
-            icons=["house", "database", "graph-up"],
+            options=list(PAGES),
+            icons=["house", "database", "graph-up", "speedometer2"],
             menu_icon="cast",
             default_index=0,
             orientation="vertical",
@@ -73,12 +81,10 @@ def sideBar():
 
 # Fonction pour afficher le contenu en fonction de la page sélectionnée
 def render_content(selected_page):
-    if selected_page == "Home":
-        home.show_home()  # Appel de la fonction pour afficher la page d'accueil
-    elif selected_page == "Data":
-        data.show_data()  # Appel de la fonction pour afficher les données
-    elif selected_page == "Dashboard":
-        dashboard.show_dashboard()  # Appel de la fonction pour afficher le dashboard
+    if selected_page in PAGES:
+        module_name, function_name = PAGES[selected_page]
+        page = importlib.import_module(module_name)  # Import au premier affichage de la page
+        getattr(page, function_name)()
     else:
         st.title("Page Introuvable")
         st.write("Désolé, cette page n'existe pas.")
@@ -0,0 +1,74 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+# Configuration partagée par les pages : chargée une seule fois par processus Streamlit
+# (les modules importés sont conservés d'une exécution du script à l'autre)
+
+# Charger les variables d'environnement depuis le fichier .env
+load_dotenv()
+
+# Config datamart
+dm_dbms_username = os.getenv("DM_DBMS_USERNAME")
+dm_dbms_password = os.getenv("DM_DBMS_PASSWORD")
+dm_dbms_ip = os.getenv("DM_DBMS_IP")
+dm_dbms_port = os.getenv("DM_DBMS_PORT")
+dm_dbms_database = os.getenv("DM_DBMS_DATABASE")
+
+# Nombre de rendus de panneaux conservés par la page Performance (historique glissant)
+perf_history_size = int(os.getenv("DASHBOARD_PERF_HISTORY", "200"))
+
+# Requêtes des panneaux du dashboard exécutées en même temps (taille du pool de connexions)
+dashboard_max_workers = int(os.getenv("DASHBOARD_MAX_WORKERS", "6"))
+
+# Source des faits lus par le dashboard : star (schéma en étoile) ou wide (fact_yellow_taxi_wide,
+# construite par le pipeline avec DATAMART_WIDE_FACT=true)
+dashboard_fact_source = os.getenv("DASHBOARD_FACT_SOURCE", "star")
+
+# Mode approximatif (TABLESAMPLE) : activé par défaut ou non, et nombre de trajets visé par
+# l'échantillon quelle que soit la taille de fact_yellow_taxi
+dashboard_approximate = os.getenv("DASHBOARD_APPROXIMATE", "false").lower() == "true"
+dashboard_approx_sample_rows = int(os.getenv("DASHBOARD_APPROX_SAMPLE_ROWS", "1000000"))
+
+# Instantanés Arrow des panneaux écrits par le pipeline (voir src/data/dashboard_snapshot.py)
+dashboard_snapshot_dir = os.getenv(
+    "DASHBOARD_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot"),
+)
+
+# Cache de résultats partagé par les serveurs Streamlit (voir streamlit_pages/result_cache.py) :
+# moteur (sqlite ou none), fichier, taille maximale avant éviction LRU et durée de vie
+dashboard_result_cache = os.getenv("DASHBOARD_RESULT_CACHE", "sqlite")
+dashboard_result_cache_path = os.getenv(
+    "DASHBOARD_RESULT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "results.sqlite"),
+)
+dashboard_result_cache_max_mb = int(os.getenv("DASHBOARD_RESULT_CACHE_MAX_MB", "512"))
+dashboard_result_cache_ttl = int(os.getenv("DASHBOARD_RESULT_CACHE_TTL", "86400"))
+
+# Intervalle de vérification de la version des données du data mart (secondes)
+dashboard_data_version_ttl = int(os.getenv("DASHBOARD_DATA_VERSION_TTL", "60"))
+
+# Modules partagés avec le pipeline (src/data) : instrumentation, ...
+data_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+if data_dir not in sys.path:
+    sys.path.append(data_dir)
+
+
+# Paramètres de connexion au datamart pour psycopg2.connect(**datamart_params())
+def datamart_params():
+    return {
+        "host": dm_dbms_ip,
+        "port": dm_dbms_port,
+        "user": dm_dbms_username,
+        "password": dm_dbms_password,
+        "dbname": dm_dbms_database,
+    }
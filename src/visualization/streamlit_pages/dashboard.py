@@ -6,120 +6,126 @@
 ***********************************************************************
 """
 
-import os
+import time
 import streamlit as st
 import pandas as pd
-import psycopg2
+import psycopg2.pool
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from dotenv import load_dotenv
-
-# Charger les variables d'environnement depuis le fichier .env
-load_dotenv()
-
-# Config datamart
-dm_dbms_username = os.getenv("DM_DBMS_USERNAME")
-dm_dbms_password = os.getenv("DM_DBMS_PASSWORD")
-dm_dbms_ip = os.getenv("DM_DBMS_IP")
-dm_dbms_port = os.getenv("DM_DBMS_PORT")
-dm_dbms_database = os.getenv("DM_DBMS_DATABASE")
-
-
-# Fonction pour se connecter à PostgreSQL avec psycopg2
-def connect_to_db():
+from config import (
+    dashboard_approx_sample_rows,
+    dashboard_approximate,
+    dashboard_fact_source,
+    dashboard_max_workers,
+    dashboard_snapshot_dir,
+    datamart_params,
+)
+from instrumentation import CountingCursor
+from streamlit_pages.panel_loader import (
+    PANEL_TRANSFORMS,
+    TREND_STEPS,
+    load_concurrently,
+    panel_query,
+    query_panel,
+)
+from streamlit_pages.performance import explain_enabled, explain_query, profile_panel
+from streamlit_pages.result_cache import data_version, shared_cache
+from streamlit_pages.snapshot import current_version, open_snapshot, snapshot_panel
+from streamlit_pages.zone_cube import CUBE_DAYS, CUBE_HOURS, slice_zone_cube, top_zone_matrix
+
+# Requêtes (voir panel_loader.py) des panneaux de chaque analyse de la barre latérale
+ANALYSES = {
+    "Zones Fréquentées": ["zones_prise_en_charge", "zones_depot"],
+    "Tendances Temporelles": [
+        "trajets_par_mois",
+        "trajets_par_jour",
+        "trajets_par_jour_semaine",
+        "trajets_par_heure",
+    ],
+    "Heures de Pointe par Zone": ["zones_heures"],
+    "Méthodes de Paiement": ["paiements"],
+    "Fournisseurs de Taxis": ["fournisseurs"],
+}
+
+# Libellés des mois, des jours de la semaine et des heures
+MONTHS = {
+    1: "Jan",
+    2: "Fév",
+    3: "Mar",
+    4: "Avr",
+    5: "Mai",
+    6: "Juin",
+    7: "Juil",
+    8: "Aoû",
+    9: "Sep",
+    10: "Oct",
+    11: "Nov",
+    12: "Déc",
+}
+DAYS = {1: "Lun", 2: "Mar", 3: "Mer", 4: "Jeu", 5: "Ven", 6: "Sam", 7: "Dim"}
+HOURS = {i: f"{i}h" for i in range(24)}
+
+
+# Pool de connexions partagé par les sessions : une connexion par requête en cours
+@st.cache_resource
+def get_connection_pool():
     try:
-        # Connexion à PostgreSQL avec psycopg2
-        connection = psycopg2.connect(
-            host=dm_dbms_ip,
-            port=dm_dbms_port,
-            user=dm_dbms_username,
-            password=dm_dbms_password,
-            dbname=dm_dbms_database,
+        return psycopg2.pool.ThreadedConnectionPool(
+            1,
+            dashboard_max_workers,
+            **datamart_params(),
+            cursor_factory=CountingCursor,
         )
-        return connection
     except Exception as e:
         st.error(f"Erreur de connexion à la base de données : {e}")
         return None
 
 
-# Charger les données depuis PostgreSQL avec un cache pour éviter de charger tout le temps
-@st.cache_data(ttl=86400)  # Cache pendant 24 heures (modifiable)
-def load_data():
-    conn = connect_to_db()  # Connexion à la base de données avec psycopg2
-    if conn is None:
-        return pd.DataFrame()  # Retourne un DataFrame vide si la connexion échoue
-
-    query_fact = """
-        SELECT v.vendor_name, COALESCE(tp.month, td.month) as month, COALESCE(tp.week, td.week) as week, 
-               COALESCE(tp.day, td.day) as day, COALESCE(tp.hour, td.hour) as hour, zp.name_zone as zone_pickup, 
-               zd.name_zone as zone_dropoff, f.total_amount , p.payment_method
-        FROM fact_yellow_taxi f
-        JOIN dimension_payment p ON f.id_payment_type = p.id_payment_type
-        JOIN dimension_time tp ON f.id_time_pickup = tp.id_time
-        JOIN dimension_time td ON f.id_time_dropoff = td.id_time
-        JOIN dimension_vendor v ON f.id_vendor = v.id_vendor
-        JOIN dimension_zone zp ON f.id_zone_pickup = zp.id_zone
-        JOIN dimension_zone zd ON f.id_zone_dropoff = zd.id_zone
-        LIMIT 1000000
-    """
-    try:
-        # Exécuter la requête et retourner les résultats sous forme de DataFrame
-        df = pd.read_sql(query_fact, conn)
-        return df
-    except Exception as e:
-        st.error(f"Erreur lors du chargement des données : {e}")
-        return pd.DataFrame()  # Retourne un DataFrame vide en cas d'erreur
-    finally:
-        conn.close()  # Fermer la connexion à la base de données
-
-
-# Prétraitement des données pour les analyses (mappage des mois, jours, etc.)
-def preprocess_data(df):
-    months_dict = {
-        1: "Jan",
-        2: "Fév",
-        3: "Mar",
-        4: "Avr",
-        5: "Mai",
-        6: "Juin",
-        7: "Juil",
-        8: "Aoû",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Déc",
-    }
-    days_dict = {1: "Lun", 2: "Mar", 3: "Mer", 4: "Jeu", 5: "Ven", 6: "Sam", 7: "Dim"}
-    hours_dict = {i: f"{i}h" for i in range(24)}
-
-    df["month"] = df["month"].map(months_dict)
-    df["week"] = df["week"].map(days_dict)
-    df["hour"] = df["hour"].map(hours_dict)
-
-    # Groupement des données pour des analyses plus rapides
-    df_month = df.groupby("month").size().reset_index(name="Nombre de trajets")
-    df_week = df.groupby("week").size().reset_index(name="Nombre de trajets")
-    df_day = df.groupby("day").size().reset_index(name="Nombre de trajets")
-    df_hour = df.groupby("hour").size().reset_index(name="Nombre de trajets")
-
-    # Assurez-vous que les mois, jours, heures sont bien ordonnés
-    df_month["month"] = pd.Categorical(
-        df_month["month"], categories=months_dict.values(), ordered=True
-    )
-    df_week["week"] = pd.Categorical(
-        df_week["week"], categories=days_dict.values(), ordered=True
-    )
-    df_hour["hour"] = pd.Categorical(
-        df_hour["hour"], categories=[f"{i}h" for i in range(24)], ordered=True
+# Données d'un panneau avec un cache pour éviter de les charger tout le temps : cache du
+# processus puis cache partagé par les serveurs, tous deux indexés par la version des données
+# Appelée depuis les threads du chargeur : pas de spinner (hors du thread du script)
+@st.cache_data(ttl=86400, show_spinner=False)  # Cache pendant 24 heures (modifiable)
+@shared_cache
+def load_panel(_pool, name, explain=False, version=None, source="star", fraction=None):
+    return query_panel(
+        _pool,
+        panel_query(name, source, fraction),
+        explain_query if explain else None,
+        PANEL_TRANSFORMS.get(name),
     )
 
-    # Trier les DataFrames par les colonnes catégorielles
-    df_month = df_month.sort_values("month")
-    df_week = df_week.sort_values("week")
-    df_hour = df_hour.sort_values("hour")
 
-    return df, df_month, df_week, df_day, df_hour
+# Données d'un panneau : l'instantané Arrow publié par le pipeline s'il le contient,
+# sinon la requête sur le data mart (toujours la requête quand EXPLAIN est demandé)
+def load_panel_data(
+    pool, snapshot, name, explain=False, version=None, source="star", fraction=None
+):
+    if snapshot is not None and not explain:
+        result = snapshot_panel(*snapshot, name, PANEL_TRANSFORMS.get(name))
+        if result is not None:
+            return result
+    return load_panel(pool, name, explain, version, source, fraction)
+
+
+# Fraction des blocs de fact_yellow_taxi échantillonnée en mode approximatif : de quoi lire
+# environ dashboard_approx_sample_rows trajets, d'après le compteur de kpi_fact_summary (O(1))
+def sample_fraction(pool, version, source):
+    df, _ = load_panel(pool, "indicateurs", False, version, source)
+    trips = int(df["trajets"].iloc[0]) if len(df) else 0
+    if trips <= dashboard_approx_sample_rows:
+        return None
+    return round(dashboard_approx_sample_rows / trips, 6)
+
+
+# Libellés et ordre d'un décompte de trajets par mois, jour de la semaine ou heure
+def label_counts(df, column, labels=None):
+    df = df.rename(columns={"trajets": "Nombre de trajets"})
+    if labels is None:
+        return df.sort_values(column)
+    df[column] = pd.Categorical(
+        df[column].map(labels), categories=list(labels.values()), ordered=True
+    )
+    return df.sort_values(column)
 
 
 # Fonction de création de graphiques
@@ -222,171 +228,192 @@ def create_bar_chart_bis(
     return fig
 
 
-# Fonction pour afficher le dashboard
-def show_dashboard():
-    # Affichage du titre
-    st.title("📊 Dashboard Taxi-Tech")
+# Indicateurs principaux : montant total et pourcentage de trajets annulés
+def render_indicateurs(df, slot, profile):
+    total, pourcentage = slot
+    with profile.phase("pandas"):
+        total_amount = df["total_amount"].iloc[0]
+        nombre_total_trajets = df["trajets"].iloc[0]
+        pourcentage_interruption = (
+            df["trajets_annules"].iloc[0] / nombre_total_trajets * 100
+            if nombre_total_trajets
+            else 0.0
+        )
 
-    # Chargement et prétraitement des données
-    df = load_data()
-    df, df_month, df_week, df_day, df_hour = preprocess_data(df)
+    with profile.phase("rendu"):
+        with total:
+            st.info("Montant total des trajets", icon="💰")
+            st.metric(label="Somme totale", value=f"{total_amount:,.0f}$")
+        with pourcentage:
+            st.info("Pourcentage du nombre de trajets annulés", icon="💯")
+            st.metric(
+                label="Pourcentage d'interruption",
+                value=f"{pourcentage_interruption:.2f}%",
+            )
+        if nombre_total_trajets:
+            total.caption(
+                f"{nombre_total_trajets:,} trajets du "
+                f"{df['premiere_prise_en_charge'].iloc[0]:%d/%m/%Y} au "
+                f"{df['derniere_prise_en_charge'].iloc[0]:%d/%m/%Y}"
+            )
 
-    # Calculs des indicateurs principaux
-    total_amount = pd.to_numeric(df["total_amount"], errors="coerce").sum()
-    nombre_trajets_annules = len(df[df["total_amount"] == 0])
-    nombre_total_trajets = len(df)
-    pourcentage_interruption = (nombre_trajets_annules / nombre_total_trajets) * 100
 
-    # Affichage des résultats principaux
-    data, total, pourcentage = st.columns([4, 1, 1])
+# Aperçu des trajets
+def render_apercu(df, slot, profile):
+    with profile.phase("rendu"):
+        slot.write(df)
 
-    with data:
-        st.write(df.head())
-    with total:
-        st.info("Montant total des trajets", icon="💰")
-        st.metric(label="Somme totale", value=f"{total_amount:,.0f}$")
-    with pourcentage:
-        st.info("Pourcentage du nombre de trajets annulés", icon="💯")
-        st.metric(
-            label="Pourcentage d'interruption", value=f"{pourcentage_interruption:.2f}%"
-        )
 
-    st.markdown(""" --- """)
+# Barres d'erreur d'une estimation du mode approximatif (colonne <mesure>_ic), None sinon
+def error_bars(df, column):
+    if f"{column}_ic" not in df.columns:
+        return None
+    return dict(type="data", array=df[f"{column}_ic"], visible=True)
+
+
+# Zones les plus fréquentées (un graphique par requête, côte à côte)
+def render_zones(title):
+    def render(df, slot, profile):
+        with profile.phase("plotly"):
+            fig = go.Figure(
+                go.Bar(
+                    x=df["zone"],
+                    y=df["trajets"],
+                    error_y=error_bars(df, "trajets"),
+                    name=title,
+                )
+            )
 
-    # Sidebar pour choisir l'analyse
-    option = st.sidebar.selectbox(
-        "Choisissez l'analyse à effectuer",
-        [
-            "Zones Fréquentées",
-            "Tendances Temporelles",
-            "Méthodes de Paiement",
-            "Fournisseurs de Taxis",
-        ],
-    )
+            # Ajuster l'axe y pour commencer à une certaine valeur
+            fig.update_yaxes(range=[20000, df["trajets"].max() + 20000])
+
+            fig.update_layout(
+                title=f"Top 10 des {title}",
+                height=500,
+                showlegend=True,
+                title_font=dict(size=24),
+                margin=dict(t=80, b=40, l=40, r=40),
+                xaxis_title="Nom des zones",  # Titre de l'axe X
+                yaxis_title="Nombre de trajets",  # Titre de l'axe Y
+            )
 
-    if option == "Zones Fréquentées":
-        # Analyse des zones les plus fréquentées
-        st.header("📈 Zones les plus fréquentées")
+        with profile.phase("rendu"):
+            slot.plotly_chart(fig)
+
+    return render
+
+
+# Distribution des trajets dans le temps (mois, jour, jour de la semaine, heure)
+def render_time(column, labels, title, x_title, y_init_value):
+    def render(df, slot, profile):
+        with profile.phase("pandas"):
+            df = label_counts(df, column, labels)
+        with profile.phase("plotly"):
+            fig = create_bar_chart(
+                df,
+                column,
+                "Nombre de trajets",
+                title,
+                x_title,
+                "Nombre de trajets",
+                y_init_value,  # Valeur initiale sur l'axe des Y
+            )
+        with profile.phase("rendu"):
+            slot.plotly_chart(fig)
+
+    return render
+
+
+# Évolution des trajets sur toute la période chargée, au pas de temps choisi
+def render_evolution(df, slot, profile):
+    with profile.phase("plotly"):
+        fig = px.line(
+            df,
+            x="periode",
+            y="trajets",
+            labels={"periode": "Période", "trajets": "Nombre de trajets"},
+            title="Évolution du nombre de trajets",
+            hover_data={"montant": ":,.0f"},
+        )
+        fig.update_layout(
+            title_font=dict(family="Arial", size=24, color="black"),
+            template="none",
+            margin=dict(l=80, r=40, t=40, b=90),
+        )
 
-        pickup_counts = df["zone_pickup"].value_counts().head(10)
-        dropoff_counts = df["zone_dropoff"].value_counts().head(10)
+    with profile.phase("rendu"):
+        slot.plotly_chart(fig, use_container_width=True)
 
-        fig = make_subplots(rows=1, cols=2, shared_yaxes=True)
 
-        # Graphique zones de prise en charge
-        fig.add_trace(
-            go.Bar(
-                x=pickup_counts.index,
-                y=pickup_counts.values,
-                name="Zones de Prise en Charge",
-            ),
-            row=1,
-            col=1,
+# Carte de chaleur zone × (jour, heure) : les filtres indexent le cube gardé en cache
+def render_zones_heures(cube, slot, profile):
+    with slot:
+        col1, col2, col3 = st.columns(3)
+        borough = col1.selectbox(
+            "Arrondissement", ["Tous"] + sorted(set(cube["boroughs"])), key="cube_borough"
         )
-        # Graphique zones de dépôt
-        fig.add_trace(
-            go.Bar(
-                x=dropoff_counts.index, y=dropoff_counts.values, name="Zones de Dépôt"
-            ),
-            row=1,
-            col=2,
+        vendor = col2.selectbox(
+            "Fournisseur", ["Tous"] + list(cube["vendors"]), key="cube_vendor"
         )
+        top = col3.slider("Nombre de zones", 5, 60, 25, key="cube_top")
 
-        # Ajuster l'axe y pour commencer à une certaine valeur
-        fig.update_yaxes(
-            range=[20000, max(pickup_counts.values).max() + 20000], row=1, col=1
+    with profile.phase("pandas"):
+        counts, zones = slice_zone_cube(
+            cube,
+            None if borough == "Tous" else borough,
+            None if vendor == "Tous" else vendor,
         )
-        fig.update_yaxes(
-            range=[20000, max(dropoff_counts.values).max() + 20000], row=1, col=2
+        matrix, zones = top_zone_matrix(counts, zones, top)
+        columns = [
+            f"{DAYS[day + 1]} {HOURS[hour]}"
+            for day in range(CUBE_DAYS)
+            for hour in range(CUBE_HOURS)
+        ]
+
+    with profile.phase("plotly"):
+        fig = go.Figure(
+            go.Heatmap(
+                z=matrix,
+                x=columns,
+                y=zones,
+                colorscale="Viridis",
+                colorbar=dict(title="Trajets"),
+                hovertemplate="%{y}<br>%{x}<br>%{z:,} trajets<extra></extra>",
+            )
         )
-
+        fig.update_yaxes(autorange="reversed")
         fig.update_layout(
-            title="Top 10 des Zones de Prise en Charge et de Dépôt",
-            height=500,
-            showlegend=True,
-            title_font=dict(size=24),
-            margin=dict(t=80, b=40, l=40, r=40),
-            xaxis_title="Nom des zones",  # Titre de l'axe X pour les deux graphiques
-            yaxis_title="Nombre de trajets",  # Titre de l'axe Y pour les deux graphiques
+            title="Trajets par zone de prise en charge, jour et heure",
+            title_font=dict(family="Arial", size=24, color="black"),
+            height=max(400, 22 * len(zones) + 150),
+            margin=dict(l=200, r=40, t=60, b=60),
+            xaxis=dict(nticks=CUBE_DAYS * 2),
         )
-        st.plotly_chart(fig)
-
-    elif option == "Tendances Temporelles":
-        # Analyse des tendances temporelles
-        st.header("📈 Tendances Temporelles des Trajets")
-
-        col1, col2 = st.columns(2)
 
-        with col1:
-            # Trajets par mois
-            st.plotly_chart(
-                create_bar_chart(
-                    df_month,
-                    "month",
-                    "Nombre de trajets",
-                    "Distribution des trajets par mois",
-                    "Mois",
-                    "Nombre de trajets",
-                    100000,  # Valeur initiale sur l'axe des Y
-                )
+    with profile.phase("rendu"):
+        with slot:
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(
+                f"Cube de {cube['counts'].size:,} cellules ({cube['counts'].nbytes / 1e6:.1f} Mo) "
+                "gardé en cache : les filtres ne relancent aucune requête."
             )
-            # Trajets par jour
-            st.plotly_chart(
-                create_bar_chart(
-                    df_day,
-                    "day",
-                    "Nombre de trajets",
-                    "Distribution des trajets par jour",
-                    "Jour",
-                    "Nombre de trajets",
-                    15000,  # Valeur initiale sur l'axe des Y
-                )
-            )
-
-        with col2:
-            # Trajets par jour de la semaine
-            st.plotly_chart(
-                create_bar_chart(
-                    df_week,
-                    "week",
-                    "Nombre de trajets",
-                    "Distribution des trajets par jour de la semaine",
-                    "Jour de la semaine",
-                    "Nombre de trajets",
-                    20000,  # Valeur initiale sur l'axe des Y
-                )
-            )
-            # Trajets par heure
-            st.plotly_chart(
-                create_bar_chart(
-                    df_hour,
-                    "hour",
-                    "Nombre de trajets",
-                    "Distribution des trajets par heure",
-                    "Heure",
-                    "Nombre de trajets",
-                    3000,  # Valeur initiale sur l'axe des Y
-                )
-            )
-
-    elif option == "Méthodes de Paiement":
-        # Analyse des méthodes de paiement
-        st.header("📈 Répartition des Méthodes de Paiement")
 
-        # Calcul des valeurs uniques et leurs fréquences pour la colonne "payment_method"
-        payment_counts = df["payment_method"].value_counts()
 
+# Répartition des méthodes de paiement
+def render_paiements(df, slot, profile):
+    with profile.phase("plotly"):
         # Création de l'histogramme vertical (en mettant les méthodes de paiement sur l'axe vertical)
         fig = px.bar(
-            payment_counts,
-            y=payment_counts.index,  # Les méthodes de paiement sur l'axe Y
-            x=payment_counts.values,  # Fréquences de chaque méthode sur l'axe X
+            df,
+            y="payment_method",  # Les méthodes de paiement sur l'axe Y
+            x="trajets",  # Fréquences de chaque méthode sur l'axe X
             labels={  # Labels des axes
-                "y": "Méthode de Paiement",  # Label de l'axe Y
-                "x": "Nombre de Transactions",  # Label de l'axe X
+                "payment_method": "Méthode de Paiement",  # Label de l'axe Y
+                "trajets": "Nombre de Transactions",  # Label de l'axe X
             },
-            color=payment_counts.index,  # Colorier les barres par méthode de paiement
-            # color_discrete_sequence=px.colors.qualitative.Set1,  # Palette de couleurs
+            color="payment_method",  # Colorier les barres par méthode de paiement
+            # Intervalle de confiance en mode approximatif
+            error_x="trajets_ic" if "trajets_ic" in df.columns else None,
         )
 
         # Ajout des légendes et autres options de style
@@ -395,80 +422,42 @@ def show_dashboard():
             yaxis_title="Méthode de Paiement",  # Titre de l'axe Y
             showlegend=True,  # Afficher la légende
             legend_title="Méthodes de Paiement",  # Titre de la légende
-            legend_orientation="v",  # Orientation horizontale de la légende
-            # legend=dict(x=1, y=1),  # Position de la légende en dessous du graphique
-        )
-
-        # Affichage du graphique dans Streamlit
-        st.plotly_chart(fig)
-        """
-        payment_counts = df["payment_method"].value_counts()
-        fig = px.pie(
-            payment_counts,
-            names=payment_counts.index,
-            values=payment_counts.values,
-            title="Répartition des Méthodes de Paiement",
+            legend_orientation="v",  # Orientation verticale de la légende
         )
-        st.plotly_chart(fig)
-        """
-    elif option == "Fournisseurs de Taxis":
-        # Analyse des fournisseurs de taxis
-        st.header("📈 Performance des Fournisseurs de Taxis")
 
-        vendor_counts = df.groupby("vendor_name").size().reset_index(name="trajets")
+    # Affichage du graphique dans Streamlit
+    with profile.phase("rendu"):
+        slot.plotly_chart(fig)
 
-        # Extraire la valeur maximale de "trajets" pour définir la plage de l'axe Y
-        valeur_initiale_max = vendor_counts["trajets"].max()
 
+# Nombre de trajets et montant moyen par fournisseur
+def render_fournisseurs(df, slot, profile):
+    with profile.phase("plotly"):
         fig1 = create_bar_chart_bis(
-            vendor_counts,
+            df,
             "vendor_name",
             "trajets",
             "Nombre de Trajets par Fournisseur",
             "Nom des fournisseurs",
             "Nombre de Trajets",
-            valeur_initiale_max,
+            df["trajets"].max(),  # Valeur maximale de "trajets" pour la plage de l'axe Y
             color="trajets",  # Colorier les barres en fonction du trajet
         )
 
-        # Calcul du montant moyen par fournisseur
-        vendor_amount = (
-            df.groupby("vendor_name")["total_amount"]
-            .mean()
-            .reset_index(name="montant_moyen")
-        )
-
-        # Formater les valeurs de 'montant_moyen' avec 2 décimales
-        vendor_amount["montant_moyen"] = vendor_amount["montant_moyen"].apply(
-            lambda x: f"{x:.2f}"
-        )
-
-        # Ajouter la colonne 'montant_moyen' comme texte pour les labels des barres
-        vendor_amount["label"] = (
-            vendor_amount["vendor_name"] + ": " + vendor_amount["montant_moyen"]
-        )
-
-        # Création de l'histogramme vertical (en mettant les fournisseurs sur l'axe X et montant_moyen sur l'axe Y)
+        # Création de l'histogramme vertical (fournisseurs sur l'axe X, montant moyen sur l'axe Y)
         fig2 = px.bar(
-            vendor_amount,
+            df.round({"montant_moyen": 2}),
             x="vendor_name",  # Les fournisseurs sur l'axe X
             y="montant_moyen",  # Montant moyen sur l'axe Y
             title="Montant Moyen par Fournisseur",
             color="montant_moyen",  # Colorier les barres par montant moyen
-            # text="label",  # Afficher les labels avec le montant moyen sur chaque barre
-            color_continuous_scale="Viridis",  # px.colors.sequential.Blues,  # Palette de couleurs (dégradé bleu)
+            color_continuous_scale="Viridis",  # Palette de couleurs
+            # Intervalle de confiance en mode approximatif
+            error_y="montant_moyen_ic" if "montant_moyen_ic" in df.columns else None,
         )
 
-        # Convertir la colonne 'montant_moyen' en valeurs numériques (en cas de valeurs non numériques, elles seront converties en NaN)
-        vendor_amount["montant_moyen"] = pd.to_numeric(
-            vendor_amount["montant_moyen"], errors="coerce"
-        )
-
-        # Calculer la valeur maximale après conversion en numérique
-        valeur_max = vendor_amount["montant_moyen"].max()
-
         # Ajuster l'échelle de l'axe Y (utiliser "montant_moyen" pour calculer la plage)
-        fig2.update_yaxes(range=[20, valeur_max + 5])
+        fig2.update_yaxes(range=[20, df["montant_moyen"].max() + 5])
 
         # Ajout des légendes et autres options de style
         fig2.update_layout(
@@ -485,5 +474,155 @@ def show_dashboard():
             margin=dict(t=40, b=40, l=40, r=40),  # Marges autour du graphique
         )
 
-        st.plotly_chart(fig1)
-        st.plotly_chart(fig2)
+    with profile.phase("rendu"):
+        with slot:
+            st.plotly_chart(fig1)
+            st.plotly_chart(fig2)
+
+
+# Fonction d'affichage de chaque panneau : (données, emplacement, mesures)
+PANEL_RENDERERS = {
+    "indicateurs": render_indicateurs,
+    "apercu": render_apercu,
+    "zones_prise_en_charge": render_zones("Zones de Prise en Charge"),
+    "zones_depot": render_zones("Zones de Dépôt"),
+    "trajets_par_mois": render_time(
+        "month", MONTHS, "Distribution des trajets par mois", "Mois", 100000
+    ),
+    "trajets_par_jour": render_time(
+        "day", None, "Distribution des trajets par jour", "Jour", 15000
+    ),
+    "trajets_par_jour_semaine": render_time(
+        "week",
+        DAYS,
+        "Distribution des trajets par jour de la semaine",
+        "Jour de la semaine",
+        20000,
+    ),
+    "trajets_par_heure": render_time(
+        "hour", HOURS, "Distribution des trajets par heure", "Heure", 3000
+    ),
+    **{f"evolution_{label}": render_evolution for label in TREND_STEPS},
+    "zones_heures": render_zones_heures,
+    "paiements": render_paiements,
+    "fournisseurs": render_fournisseurs,
+}
+
+
+# Fonction pour afficher le dashboard
+def show_dashboard():
+    # Affichage du titre
+    st.title("📊 Dashboard Taxi-Tech")
+
+    # Sidebar pour choisir l'analyse
+    option = st.sidebar.selectbox(
+        "Choisissez l'analyse à effectuer",
+        list(ANALYSES),
+    )
+
+    names = ["indicateurs", "apercu"] + ANALYSES[option]
+    if option == "Tendances Temporelles":
+        # Pas de temps de la courbe d'évolution : la requête lit le niveau d'agrégat adapté
+        step = st.sidebar.selectbox("Pas de temps de l'évolution", list(TREND_STEPS))
+        names.append(f"evolution_{step}")
+
+    # Source des faits des requêtes : schéma en étoile ou table dénormalisée
+    source = (
+        "wide"
+        if st.sidebar.toggle(
+            "Table des faits dénormalisée",
+            value=dashboard_fact_source == "wide",
+            help="Lit fact_yellow_taxi_wide (sans jointure) au lieu du schéma en étoile",
+        )
+        else "star"
+    )
+
+    # Agrégats calculés sur un échantillon des faits, avec leurs intervalles de confiance
+    approximate = st.sidebar.toggle(
+        "Mode approximatif",
+        value=dashboard_approximate,
+        help="Zones, paiements et fournisseurs estimés sur un échantillon (TABLESAMPLE)",
+    )
+
+    # Instantané ouvert une fois par page : tous ses panneaux viennent de la même version
+    snapshot_version = current_version()
+    snapshot = None
+    if snapshot_version is not None:
+        snapshot = (open_snapshot(dashboard_snapshot_dir, snapshot_version), snapshot_version)
+
+    pool = get_connection_pool()
+    if pool is None and snapshot is None:
+        return
+
+    # Fraction échantillonnée (None : requêtes exactes, l'instantané reste prioritaire)
+    fraction = None
+    if approximate and pool is not None and snapshot is None:
+        fraction = sample_fraction(pool, data_version(), source)
+
+    # Emplacements des panneaux, remplis dans l'ordre d'arrivée des résultats
+    data, total, pourcentage = st.columns([4, 1, 1])
+    slots = {"indicateurs": (total, pourcentage), "apercu": data.empty()}
+
+    st.markdown(""" --- """)
+    if snapshot is not None:
+        st.caption(f"Données de l'instantané du data mart {snapshot_version}")
+    if fraction is not None:
+        st.caption(
+            f"Mode approximatif : {fraction:.2%} des blocs de fact_yellow_taxi "
+            "(TABLESAMPLE SYSTEM), barres d'erreur : intervalle de confiance à 95 %"
+        )
+
+    if option == "Zones Fréquentées":
+        # Analyse des zones les plus fréquentées
+        st.header("📈 Zones les plus fréquentées")
+        col1, col2 = st.columns(2)
+        slots["zones_prise_en_charge"] = col1.empty()
+        slots["zones_depot"] = col2.empty()
+
+    elif option == "Tendances Temporelles":
+        # Analyse des tendances temporelles
+        st.header("📈 Tendances Temporelles des Trajets")
+        slots[f"evolution_{step}"] = st.empty()
+        col1, col2 = st.columns(2)
+        slots["trajets_par_mois"] = col1.empty()
+        slots["trajets_par_jour"] = col1.empty()
+        slots["trajets_par_jour_semaine"] = col2.empty()
+        slots["trajets_par_heure"] = col2.empty()
+
+    elif option == "Heures de Pointe par Zone":
+        # Carte de chaleur des zones de prise en charge selon le jour et l'heure
+        st.header("📈 Heures de Pointe par Zone")
+        slots["zones_heures"] = st.container()
+
+    elif option == "Méthodes de Paiement":
+        # Analyse des méthodes de paiement
+        st.header("📈 Répartition des Méthodes de Paiement")
+        slots["paiements"] = st.empty()
+
+    elif option == "Fournisseurs de Taxis":
+        # Analyse des fournisseurs de taxis
+        st.header("📈 Performance des Fournisseurs de Taxis")
+        slots["fournisseurs"] = st.container()
+
+    # Toutes les requêtes de la page sont envoyées en même temps, chaque panneau est
+    # affiché dès que son résultat arrive (mesures par panneau pour la page Performance)
+    explain = explain_enabled()
+    version = data_version()
+    with profile_panel(f"Page complète : {option}"):
+        requested_at = time.time()
+        results = load_concurrently(
+            lambda name: load_panel_data(
+                pool, snapshot, name, explain, version, source, fraction
+            ),
+            names,
+            dashboard_max_workers,
+        )
+        for name, result, error in results:
+            if error is not None:
+                st.error(f"Erreur lors du chargement des données ({name}) : {error}")
+                continue
+            df, query_info = result
+            with profile_panel(name) as profile:
+                # Données chargées pendant cet appel : le cache n'avait pas de résultat
+                profile.set_query(query_info, query_info["loaded_at"] < requested_at)
+                PANEL_RENDERERS[name](df, slots[name], profile)
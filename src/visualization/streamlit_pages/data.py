@@ -6,35 +6,18 @@
 ***********************************************************************
 """
 
-import os
 import streamlit as st
 import psycopg2
 import pandas as pd
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Construct the endpoint URL from the environment variables
-# Config datamart
-dm_dbms_username = os.getenv("DM_DBMS_USERNAME")
-dm_dbms_password = os.getenv("DM_DBMS_PASSWORD")
-dm_dbms_ip = os.getenv("DM_DBMS_IP")
-dm_dbms_port = os.getenv("DM_DBMS_PORT")
-dm_dbms_database = os.getenv("DM_DBMS_DATABASE")
+from config import datamart_params
+from streamlit_pages.result_cache import data_version, shared_cache
 
 
 # Fonction pour se connecter à PostgreSQL
 def connect_to_db():
     try:
         # Connexion à PostgreSQL
-        connection = psycopg2.connect(
-            host=dm_dbms_ip,
-            port=dm_dbms_port,
-            user=dm_dbms_username,
-            password=dm_dbms_password,
-            dbname=dm_dbms_database,
-        )
+        connection = psycopg2.connect(**datamart_params())
         return connection
     except Exception as e:
         st.error(f"Erreur de connexion à la base de données : {e}")
@@ -42,11 +25,14 @@ def connect_to_db():
 
 
 # Fonction pour obtenir le nombre total de lignes d'une table avec un cache pour éviter de charger tout le temps
+# (cache du processus puis cache partagé par les serveurs, indexés par la version des données ;
+# les erreurs ne sont pas mises en cache)
 @st.cache_data(ttl=86400)  # Cache pendant 24 heure (modifiable)
-def get_table_row_count(table_name):
+@shared_cache
+def get_table_row_count(table_name, version=None):
     conn = connect_to_db()
     if conn is None:
-        return 0
+        raise ConnectionError("Connexion à la base de données impossible")
 
     try:
         query = f"SELECT COUNT(*) FROM {table_name}"
@@ -54,28 +40,32 @@ def get_table_row_count(table_name):
         result = pd.read_sql(query, conn)
         row_count = result.iloc[0, 0]  # Extraire le nombre de lignes de la réponse
         return row_count
-    except Exception as e:
-        st.error(
-            f"Erreur lors de la récupération du nombre de lignes pour {table_name}: {e}"
-        )
-        return 0
     finally:
         conn.close()
 
 
-# Fonction pour afficher une table spécifique avec un spinner de chargement et pagination avec un cache pour éviter de charger tout le temps
-@st.cache_data(ttl=86400)  # Cache pendant 24 heure (modifiable)
-def show_table(query, table_name, limit=1000000):
+# Fonction pour charger une table avec pagination avec un cache pour éviter de charger tout le temps
+@st.cache_data(ttl=86400, show_spinner=False)  # Cache pendant 24 heure (modifiable)
+@shared_cache
+def load_table(query, limit=1000000, version=None):
     conn = connect_to_db()
     if conn is None:
-        return
+        raise ConnectionError("Connexion à la base de données impossible")
 
+    try:
+        # Ajouter une clause LIMIT pour limiter le nombre de résultats
+        query_with_limit = query + f" LIMIT {limit}"
+        return pd.read_sql(query_with_limit, conn)
+    finally:
+        conn.close()
+
+
+# Fonction pour afficher une table spécifique avec un spinner de chargement
+def show_table(query, table_name, limit=1000000):
     try:
         # Afficher le spinner pendant que les données sont récupérées
         with st.spinner(f"Chargement des données de {table_name}..."):
-            # Ajouter une clause LIMIT pour limiter le nombre de résultats
-            query_with_limit = query + f" LIMIT {limit}"
-            df = pd.read_sql(query_with_limit, conn)
+            df = load_table(query, limit, data_version())
 
         # Affichage des données dans Streamlit une fois le chargement terminé
         st.write(f"### {table_name}")
@@ -83,8 +73,6 @@ def show_table(query, table_name, limit=1000000):
 
     except Exception as e:
         st.error(f"Erreur lors de la récupération des données pour {table_name}: {e}")
-    finally:
-        conn.close()
 
 
 # Fonction principale pour afficher les différentes tables
@@ -108,7 +96,13 @@ def show_data():
     )
 
     # Récupérer le nombre total de lignes pour la table sélectionnée
-    total_rows = get_table_row_count(selected_table)
+    try:
+        total_rows = get_table_row_count(selected_table, data_version())
+    except Exception as e:
+        st.error(
+            f"Erreur lors de la récupération du nombre de lignes pour {selected_table}: {e}"
+        )
+        total_rows = 0
 
     # Si aucune ligne n'est trouvée, afficher un message d'erreur
     if total_rows == 0:
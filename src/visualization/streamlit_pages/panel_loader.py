@@ -0,0 +1,299 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from streamlit_pages.zone_cube import build_zone_cube
+
+# Niveaux de la pyramide d'agrégats temporels (voir src/data/rollup.py), du plus grossier
+# au plus fin, avec les champs de date que chacun permet de calculer
+ROLLUP_LEVELS = [
+    ("rollup_monthly_yellow_taxi", {"year", "quarter", "month"}),
+    ("rollup_daily_yellow_taxi", {"year", "quarter", "month", "week", "day", "isodow"}),
+    ("rollup_hourly_yellow_taxi", {"year", "quarter", "month", "week", "day", "isodow", "hour"}),
+]
+
+# Pas de temps des courbes d'évolution : (libellé, champ de date_trunc)
+TREND_STEPS = {"mois": "month", "semaine": "week", "jour": "day", "heure": "hour"}
+
+
+# Niveau le plus grossier de la pyramide qui répond à une requête sur ces champs de date
+def rollup_table(fields):
+    for table, answerable in ROLLUP_LEVELS:
+        if set(fields) <= answerable:
+            return table
+    raise ValueError(f"Aucun niveau d'agrégat pour les champs {sorted(fields)}")
+
+
+# Décompte des trajets selon un champ de date, lu au niveau d'agrégat le plus grossier
+def rollup_count_query(field, alias):
+    return f"""
+        SELECT EXTRACT({field.upper()} FROM period_start)::int AS {alias},
+               SUM(trip_count)::int8 AS trajets
+        FROM {rollup_table({field})}
+        GROUP BY 1
+    """
+
+
+# Évolution des trajets et des montants sur toute la période chargée, un point par pas de temps
+def trend_query(step):
+    return f"""
+        SELECT date_trunc('{step}', period_start) AS periode,
+               SUM(trip_count)::int8 AS trajets,
+               COALESCE(SUM(total_amount_sum), 0)::float8 AS montant
+        FROM {rollup_table({step})}
+        GROUP BY 1
+        ORDER BY 1
+    """
+
+
+# Requêtes d'agrégation des panneaux du dashboard : chacune est indépendante des autres,
+# elles sont envoyées en même temps sur des connexions différentes du pool
+PANEL_QUERIES = {
+    # Compteurs tenus à jour par la construction du data mart : une ligne par mois chargé
+    "indicateurs": """
+        SELECT COALESCE(SUM(total_amount_sum), 0)::float8 AS total_amount,
+               COALESCE(SUM(zero_amount_count), 0)::int8 AS trajets_annules,
+               COALESCE(SUM(trip_count), 0)::int8 AS trajets,
+               MIN(min_pickup) AS premiere_prise_en_charge,
+               MAX(max_pickup) AS derniere_prise_en_charge
+        FROM kpi_fact_summary
+        WHERE fact_table = 'fact_yellow_taxi'
+    """,
+    "apercu": """
+        SELECT v.vendor_name, tp.month, tp.week, tp.day, tp.hour, zp.name_zone AS zone_pickup,
+               zd.name_zone AS zone_dropoff, f.total_amount::float8 AS total_amount, p.payment_method
+        FROM fact_yellow_taxi f
+        JOIN dimension_payment p ON f.id_payment_type = p.id_payment_type
+        JOIN dimension_time tp ON f.id_time_pickup = tp.id_time
+        JOIN dimension_vendor v ON f.id_vendor = v.id_vendor
+        JOIN dimension_zone zp ON f.id_zone_pickup = zp.id_zone
+        JOIN dimension_zone zd ON f.id_zone_dropoff = zd.id_zone
+        LIMIT 5
+    """,
+    "zones_prise_en_charge": """
+        SELECT z.name_zone AS zone, COUNT(*) AS trajets
+        FROM fact_yellow_taxi f
+        JOIN dimension_zone z ON f.id_zone_pickup = z.id_zone
+        GROUP BY z.name_zone
+        ORDER BY trajets DESC
+        LIMIT 10
+    """,
+    "zones_depot": """
+        SELECT z.name_zone AS zone, COUNT(*) AS trajets
+        FROM fact_yellow_taxi f
+        JOIN dimension_zone z ON f.id_zone_dropoff = z.id_zone
+        GROUP BY z.name_zone
+        ORDER BY trajets DESC
+        LIMIT 10
+    """,
+    # Tendances temporelles : lues dans la pyramide d'agrégats plutôt que dans les faits
+    "trajets_par_mois": rollup_count_query("month", "month"),
+    "trajets_par_jour_semaine": rollup_count_query("isodow", "week"),
+    "trajets_par_jour": rollup_count_query("day", "day"),
+    "trajets_par_heure": rollup_count_query("hour", "hour"),
+    **{f"evolution_{label}": trend_query(step) for label, step in TREND_STEPS.items()},
+    # Cube zone × jour de la semaine × heure (et fournisseur) : une seule passe d'agrégation
+    "zones_heures": f"""
+        SELECT c.id_vendor, v.vendor_name, c.id_zone_pickup AS id_zone, z.name_zone, z.borough,
+               c.jour, c.heure, c.trajets
+        FROM (
+            SELECT id_vendor, id_zone_pickup,
+                   EXTRACT(ISODOW FROM period_start)::int AS jour,
+                   EXTRACT(HOUR FROM period_start)::int AS heure,
+                   SUM(trip_count)::int8 AS trajets
+            FROM {rollup_table({"isodow", "hour"})}
+            GROUP BY 1, 2, 3, 4
+        ) c
+        LEFT JOIN dimension_vendor v ON c.id_vendor = v.id_vendor
+        LEFT JOIN dimension_zone z ON c.id_zone_pickup = z.id_zone
+    """,
+    "paiements": """
+        SELECT p.payment_method, COUNT(*) AS trajets
+        FROM fact_yellow_taxi f
+        JOIN dimension_payment p ON f.id_payment_type = p.id_payment_type
+        GROUP BY p.payment_method
+        ORDER BY trajets DESC
+    """,
+    "fournisseurs": """
+        SELECT v.vendor_name, COUNT(*) AS trajets, AVG(f.total_amount)::float8 AS montant_moyen
+        FROM fact_yellow_taxi f
+        JOIN dimension_vendor v ON f.id_vendor = v.id_vendor
+        GROUP BY v.vendor_name
+    """,
+}
+
+
+# Variantes des requêtes qui joignent les dimensions, lues dans la table des faits dénormalisée
+# fact_yellow_taxi_wide (voir src/data/wide_fact.py) : aucune jointure à l'exécution
+WIDE_PANEL_QUERIES = {
+    "apercu": """
+        SELECT vendor_name::text AS vendor_name, pickup_month AS month,
+               EXTRACT(WEEK FROM pickup_at)::int AS week, pickup_day AS day, pickup_hour AS hour,
+               zone_pickup::text AS zone_pickup, zone_dropoff::text AS zone_dropoff,
+               total_amount::float8 AS total_amount, payment_method::text AS payment_method
+        FROM fact_yellow_taxi_wide
+        LIMIT 5
+    """,
+    "zones_prise_en_charge": """
+        SELECT zone_pickup::text AS zone, COUNT(*) AS trajets
+        FROM fact_yellow_taxi_wide
+        GROUP BY zone_pickup
+        ORDER BY trajets DESC
+        LIMIT 10
+    """,
+    "zones_depot": """
+        SELECT zone_dropoff::text AS zone, COUNT(*) AS trajets
+        FROM fact_yellow_taxi_wide
+        GROUP BY zone_dropoff
+        ORDER BY trajets DESC
+        LIMIT 10
+    """,
+    "paiements": """
+        SELECT payment_method::text AS payment_method, COUNT(*) AS trajets
+        FROM fact_yellow_taxi_wide
+        GROUP BY payment_method
+        ORDER BY trajets DESC
+    """,
+    "fournisseurs": """
+        SELECT vendor_name::text AS vendor_name, COUNT(*) AS trajets,
+               AVG(total_amount)::float8 AS montant_moyen
+        FROM fact_yellow_taxi_wide
+        GROUP BY vendor_name
+    """,
+}
+
+# Sources des faits du dashboard : schéma en étoile ou table dénormalisée
+FACT_SOURCES = {"star": PANEL_QUERIES, "wide": {**PANEL_QUERIES, **WIDE_PANEL_QUERIES}}
+
+# Panneaux calculables en mode approximatif : (clé de regroupement dans fact_yellow_taxi,
+# dimension et libellé joints après l'agrégation, nombre de lignes gardées)
+APPROXIMATE_PANELS = {
+    "zones_prise_en_charge": ("id_zone_pickup", "dimension_zone", "id_zone", "name_zone", "zone", 10),
+    "zones_depot": ("id_zone_dropoff", "dimension_zone", "id_zone", "name_zone", "zone", 10),
+    "paiements": (
+        "id_payment_type",
+        "dimension_payment",
+        "id_payment_type",
+        "payment_method",
+        "payment_method",
+        None,
+    ),
+    "fournisseurs": ("id_vendor", "dimension_vendor", "id_vendor", "vendor_name", "vendor_name", None),
+}
+
+# Graine de TABLESAMPLE : le même échantillon d'une exécution à l'autre (résultats en cache stables)
+APPROXIMATE_SEED = 42
+
+# Quantile de la loi normale de l'intervalle de confiance à 95 %
+CONFIDENCE_Z = 1.96
+
+
+# Requête approximative d'un panneau sur une fraction des blocs de fact_yellow_taxi.
+# TABLESAMPLE SYSTEM tire chaque bloc avec la probabilité f : les totaux sont divisés par f
+# (Horvitz-Thompson) et leur variance est estimée bloc par bloc, (1 - f) / f² × Σ y_b²,
+# ce qui tient compte de la corrélation des trajets d'un même bloc. La moyenne est un ratio
+# dont la variance est linéarisée.
+def approximate_query(name, fraction, seed=APPROXIMATE_SEED):
+    key, dimension, dimension_key, label, alias, limit = APPROXIMATE_PANELS[name]
+    f = fraction
+    return f"""
+        WITH blocs AS (
+            SELECT {key} AS cle, COUNT(*)::float8 AS n, SUM(total_amount)::float8 AS montant
+            FROM fact_yellow_taxi TABLESAMPLE SYSTEM ({100 * f:.6f}) REPEATABLE ({seed})
+            GROUP BY (ctid::text::point)[0], {key}
+        ), sommes AS (
+            SELECT cle, SUM(n) AS sn, SUM(n * n) AS snn, COALESCE(SUM(montant), 0) AS sa,
+                   COALESCE(SUM(montant * montant), 0) AS saa, COALESCE(SUM(montant * n), 0) AS san
+            FROM blocs
+            GROUP BY cle
+        ), estimations AS (
+            SELECT cle, sn, snn, sa, saa, san, sa / sn AS ratio
+            FROM sommes
+        )
+        SELECT d.{label} AS {alias},
+               (e.sn / {f})::int8 AS trajets,
+               ({CONFIDENCE_Z} * sqrt({1 - f} * e.snn) / {f})::float8 AS trajets_ic,
+               e.ratio AS montant_moyen,
+               ({CONFIDENCE_Z} * sqrt(GREATEST({1 - f} * (e.saa - 2 * e.ratio * e.san
+                   + e.ratio * e.ratio * e.snn), 0)) / e.sn)::float8 AS montant_moyen_ic
+        FROM estimations e
+        LEFT JOIN {dimension} d ON e.cle = d.{dimension_key}
+        ORDER BY trajets DESC
+        {"" if limit is None else f"LIMIT {limit}"}
+    """
+
+
+# Requête d'un panneau pour une source des faits, approximative si une fraction est donnée
+# (seuls les panneaux de APPROXIMATE_PANELS parcourent les faits, les autres restent exacts)
+def panel_query(name, source="star", fraction=None):
+    if fraction is not None and name in APPROXIMATE_PANELS:
+        return approximate_query(name, fraction)
+    return FACT_SOURCES[source][name]
+
+
+# Mise en forme des résultats gardée en cache à la place du DataFrame (par panneau)
+PANEL_TRANSFORMS = {"zones_heures": build_zone_cube}
+
+
+# Exécution d'une requête sur une connexion empruntée au pool, avec ses mesures
+# (forme attendue par PanelProfile.set_query de la page Performance)
+def query_panel(pool, sql, explain=None, transform=None):
+    query_info = {
+        "sql": sql,
+        "loaded_at": time.time(),
+        "rows": 0,
+        "bytes": 0,
+        "phases": {},
+        "explain": None,
+    }
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        cursor.execute(sql)
+        executed = time.perf_counter()
+        rows = cursor.fetchall()
+        fetched = time.perf_counter()
+        df = pd.DataFrame(rows, columns=[column[0] for column in cursor.description])
+        result = df if transform is None else transform(df)
+        built = time.perf_counter()
+        cursor.close()
+
+        query_info["rows"] = len(df)
+        query_info["bytes"] = int(df.memory_usage(deep=True).sum())
+        query_info["phases"] = {
+            "requete": executed - start,
+            "transfert": fetched - executed,
+            "pandas": built - fetched,
+        }
+        if explain is not None:
+            # Temps d'exécution côté serveur : le reste de l'appel est du transfert
+            query_info["explain"] = explain(conn, sql)
+            server = (query_info["explain"]["execution_ms"] or 0.0) / 1000
+            query_info["phases"]["requete"] = min(server, executed - start)
+            query_info["phases"]["transfert"] = fetched - start - query_info["phases"]["requete"]
+        return result, query_info
+    finally:
+        # Transaction en lecture seule terminée avant de rendre la connexion au pool
+        conn.rollback()
+        pool.putconn(conn)
+
+
+# Chargement simultané des panneaux : les résultats sont rendus dans l'ordre d'arrivée,
+# la page complète attend la requête la plus lente et non la somme de toutes les requêtes
+def load_concurrently(load, names, max_workers):
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as executor:
+        futures = {executor.submit(load, name): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                yield name, future.result(), None
+            except Exception as e:
+                yield name, None, e
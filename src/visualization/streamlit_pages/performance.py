@@ -0,0 +1,227 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import streamlit as st
+import pandas as pd
+from config import perf_history_size
+from streamlit_pages.result_cache import get_result_cache
+
+# Phases mesurées pour chaque rendu, dans l'ordre d'exécution
+PHASES = ["requete", "transfert", "pandas", "plotly", "rendu"]
+
+# Historique partagé par toutes les sessions du processus Streamlit
+_history = deque(maxlen=perf_history_size)
+_history_lock = threading.Lock()
+
+
+class PanelProfile:
+    """
+    Mesures d'un rendu de panneau : durée de chaque phase, requête SQL, volumes et cache.
+
+    Les phases requete et transfert viennent du chargement des données (voir set_query),
+    les phases pandas, plotly et rendu sont mesurées dans le panneau avec phase().
+    """
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.sql = None
+        self.explain = None
+        self.rows = 0
+        self.bytes = 0
+        self.cache = None
+        self.duration = 0.0
+        self.timestamp = datetime.now().isoformat(timespec="seconds")
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def set_query(self, query_info, cache_hit, count_phases=True):
+        # Sur un succès du cache, aucune requête n'a été envoyée pendant ce rendu
+        # count_phases=False : données partagées, leur chargement est compté dans un autre rendu
+        self.sql = query_info["sql"]
+        self.rows = query_info["rows"]
+        self.bytes = query_info["bytes"]
+        self.cache = "hit" if cache_hit else "miss"
+        if not cache_hit and count_phases:
+            self.explain = query_info.get("explain")
+            for name in ["requete", "transfert", "pandas"]:
+                self.phases[name] += query_info["phases"].get(name, 0.0)
+
+    def to_record(self):
+        return {
+            "horodatage": self.timestamp,
+            "panneau": self.panel,
+            "cache": self.cache,
+            "total_s": round(self.duration, 4),
+            **{f"{name}_s": round(value, 4) for name, value in self.phases.items()},
+            "lignes": self.rows,
+            "octets": self.bytes,
+            "sql": self.sql,
+            "explain": self.explain,
+        }
+
+
+# Mesure d'un rendu de panneau, ajouté à l'historique à la fin du bloc
+@contextmanager
+def profile_panel(panel):
+    profile = PanelProfile(panel)
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.duration = time.perf_counter() - start
+        with _history_lock:
+            _history.append(profile.to_record())
+
+
+# Copie de l'historique, le plus récent en dernier
+def history():
+    with _history_lock:
+        return list(_history)
+
+
+# EXPLAIN (ANALYZE, BUFFERS) demandé depuis la page Performance
+# (clé hors widget : l'état d'un widget est effacé quand sa page n'est plus affichée)
+def explain_enabled():
+    return st.session_state.get("perf_explain", False)
+
+
+# Exécution d'EXPLAIN (ANALYZE, BUFFERS) : la requête est exécutée une seconde fois
+def explain_query(conn, query):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return summarize_plan(plan[0])
+
+
+# Temps exclusif de chaque nœud du plan (temps du nœud moins celui de ses enfants)
+def _plan_nodes(node, nodes):
+    loops = node.get("Actual Loops", 1)
+    total = node.get("Actual Total Time", 0.0) * loops
+    children = node.get("Plans", [])
+    children_total = sum(
+        child.get("Actual Total Time", 0.0) * child.get("Actual Loops", 1) for child in children
+    )
+    nodes.append(
+        {
+            "noeud": node.get("Node Type"),
+            "relation": node.get("Relation Name"),
+            "exclusif_ms": round(max(total - children_total, 0.0), 3),
+            "lignes": node.get("Actual Rows", 0) * loops,
+        }
+    )
+    for child in children:
+        _plan_nodes(child, nodes)
+    return nodes
+
+
+# Résumé d'un plan EXPLAIN (FORMAT JSON) : temps, tampons et nœuds les plus coûteux
+def summarize_plan(plan):
+    root = plan["Plan"]
+    nodes = sorted(_plan_nodes(root, []), key=lambda node: -node["exclusif_ms"])
+    return {
+        "planification_ms": plan.get("Planning Time"),
+        "execution_ms": plan.get("Execution Time"),
+        "tampons_lus_cache": root.get("Shared Hit Blocks", 0),
+        "tampons_lus_disque": root.get("Shared Read Blocks", 0),
+        "tampons_temporaires": root.get("Temp Written Blocks", 0),
+        "noeuds_couteux": nodes[:5],
+    }
+
+
+# Statistiques par panneau, les plus lents en premier
+def panel_statistics(records):
+    df = pd.DataFrame(records)
+    phase_columns = [f"{name}_s" for name in PHASES]
+    stats = df.groupby("panneau").agg(
+        rendus=("total_s", "size"),
+        moyenne_s=("total_s", "mean"),
+        p95_s=("total_s", lambda values: values.quantile(0.95)),
+        max_s=("total_s", "max"),
+        succes_cache=("cache", lambda values: (values == "hit").mean()),
+        **{column: (column, "mean") for column in phase_columns},
+    )
+    return stats.sort_values("p95_s", ascending=False).round(4)
+
+
+# Fonction pour afficher la page de performance
+def show_performance():
+    st.title("⏱️ Performance du Dashboard")
+
+    # Options de profilage
+    st.session_state["perf_explain"] = st.sidebar.toggle(
+        "EXPLAIN (ANALYZE, BUFFERS)",
+        value=explain_enabled(),
+        help="Exécute une seconde fois les requêtes non servies par le cache pour obtenir leur plan",
+    )
+    shared = get_result_cache()
+    if st.sidebar.button("Vider le cache des données"):
+        st.cache_data.clear()
+        if shared is not None:
+            shared.clear()
+        st.sidebar.success("Cache vidé : les prochains rendus interrogeront la base")
+    if shared is not None:
+        stats = shared.stats()
+        st.sidebar.caption(
+            f"Cache partagé : {stats['resultats']} résultats, "
+            f"{stats['octets'] / 1e6:.1f} / {stats['octets_max'] / 1e6:.0f} Mo"
+        )
+
+    records = history()
+    if not records:
+        st.info("Aucun rendu mesuré : ouvrez le Dashboard pour alimenter l'historique.")
+        return
+
+    # Panneaux les plus lents sur l'historique glissant
+    st.header("🐢 Panneaux les plus lents")
+    st.caption(f"{len(records)} derniers rendus (historique limité à {perf_history_size})")
+    st.dataframe(panel_statistics(records), use_container_width=True)
+
+    # Derniers rendus, les plus récents en premier
+    st.header("🕒 Derniers rendus")
+    recent = pd.DataFrame(records[::-1]).drop(columns=["sql", "explain"])
+    st.dataframe(recent, use_container_width=True, hide_index=True)
+
+    # Détail des requêtes : SQL exécuté et résumé du plan
+    st.header("🔎 Requêtes")
+    queried = [
+        record
+        for record in records[::-1]
+        if record["cache"] == "miss" and record["requete_s"] > 0
+    ]
+    if not queried:
+        st.write("Toutes les données ont été servies par le cache.")
+        return
+    for record in queried[:5]:
+        with st.expander(
+            f"{record['horodatage']} - {record['panneau']} : {record['total_s']:.3f} s, "
+            f"{record['lignes']:,} lignes, {record['octets'] / 1e6:.1f} Mo"
+        ):
+            st.code(record["sql"], language="sql")
+            if record["explain"] is None:
+                st.write("Plan non collecté (activez EXPLAIN dans la barre latérale).")
+            else:
+                st.json({k: v for k, v in record["explain"].items() if k != "noeuds_couteux"})
+                st.dataframe(pd.DataFrame(record["explain"]["noeuds_couteux"]), hide_index=True)
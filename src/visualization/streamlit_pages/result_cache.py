@@ -0,0 +1,184 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import inspect
+import zlib
+import functools
+import streamlit as st
+import psycopg2
+from config import (
+    dashboard_data_version_ttl,
+    dashboard_result_cache,
+    dashboard_result_cache_max_mb,
+    dashboard_result_cache_path,
+    dashboard_result_cache_ttl,
+    datamart_params,
+)
+
+# Niveau de compression zlib des résultats (compromis entre taille et temps de lecture)
+COMPRESSION_LEVEL = 6
+
+# Valeur absente du cache (None est un résultat valide)
+MISSING = object()
+
+
+class SQLiteResultCache:
+    """
+    Cache de résultats dans un fichier SQLite partagé par les processus et les serveurs.
+
+    Les résultats sont sérialisés avec pickle et compressés avec zlib. Chaque lecture met à jour
+    la date d'accès : au-delà de max_bytes, les résultats lus le moins récemment sont supprimés.
+    Le fichier survit aux redémarrages, les serveurs repartent avec un cache déjà rempli.
+    """
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            # WAL : les lectures des autres processus ne sont pas bloquées par une écriture
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed_at)")
+
+    # Une connexion par opération : le cache est utilisé depuis les threads du chargeur
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM results WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return MISSING
+            conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value):
+        payload = zlib.compress(
+            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), COMPRESSION_LEVEL
+        )
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            # Éviction LRU : on garde les résultats les plus récemment lus qui tiennent dans max_bytes
+            conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS kept "
+                "FROM results) WHERE kept > ?)",
+                (self.max_bytes,),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        return {"resultats": entries, "octets": size, "octets_max": self.max_bytes}
+
+
+# Moteurs de cache disponibles (DASHBOARD_RESULT_CACHE) : none désactive le cache partagé
+CACHE_BACKENDS = {
+    "sqlite": lambda: SQLiteResultCache(
+        dashboard_result_cache_path,
+        dashboard_result_cache_max_mb * 1024 * 1024,
+        dashboard_result_cache_ttl,
+    ),
+    "none": lambda: None,
+}
+
+
+# Cache partagé ouvert une fois par processus Streamlit
+@st.cache_resource
+def get_result_cache():
+    try:
+        return CACHE_BACKENDS[dashboard_result_cache]()
+    except Exception as e:
+        print(f"Cache de résultats partagé indisponible : {e}")
+        return None
+
+
+# Version des données du data mart (table datamart_version, incrémentée par chaque chargement
+# validé, complet ou de dimensions compris), vérifiée périodiquement.
+# Elle fait partie de la clé des résultats : un rechargement invalide tous les serveurs.
+@st.cache_data(ttl=dashboard_data_version_ttl, show_spinner=False)
+def data_version():
+    try:
+        conn = psycopg2.connect(**datamart_params())
+    except Exception:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM datamart_version")
+        row = cursor.fetchone()
+        cursor.close()
+        return None if row is None else str(row[0])
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+
+# Clé d'un appel : module, fonction et arguments, sauf ceux préfixés par _ (comme st.cache_data)
+def cache_key(function, args, kwargs):
+    bound = inspect.signature(function).bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = {name: value for name, value in bound.arguments.items() if not name.startswith("_")}
+    raw = repr((function.__module__, function.__qualname__, sorted(arguments.items())))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# Décorateur : résultat lu dans le cache partagé s'il y est, sinon calculé puis enregistré.
+# Les fonctions décorées reçoivent la version des données en argument pour qu'elle fasse
+# partie de la clé (et de celle de st.cache_data placé au-dessus).
+def shared_cache(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        cache = get_result_cache()
+        if cache is None:
+            return function(*args, **kwargs)
+        key = cache_key(function, args, kwargs)
+        try:
+            value = cache.get(key)
+        except Exception as e:
+            print(f"Lecture du cache de résultats impossible : {e}")
+            value = MISSING
+        if value is not MISSING:
+            return value
+
+        value = function(*args, **kwargs)
+        try:
+            cache.set(key, value)
+        except Exception as e:
+            print(f"Écriture dans le cache de résultats impossible : {e}")
+        return value
+
+    return wrapper
@@ -0,0 +1,60 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import time
+import pyarrow as pa
+import streamlit as st
+from config import dashboard_snapshot_dir
+
+# Fichier contenant la version de l'instantané publié (voir src/data/dashboard_snapshot.py)
+SNAPSHOT_POINTER = "CURRENT"
+
+
+# Version de l'instantané publié, None si le pipeline n'en a encore écrit aucun
+def current_version(directory=dashboard_snapshot_dir):
+    try:
+        with open(os.path.join(directory, SNAPSHOT_POINTER)) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# Tables des panneaux d'un instantané, mappées en mémoire et non copiées : partagées par les
+# sessions du processus et, par le cache de pages du système, par tous les serveurs de la machine
+# (deux versions au plus : la nouvelle et celle encore lue par les sessions en cours)
+@st.cache_resource(max_entries=2, show_spinner=False)
+def open_snapshot(directory, version):
+    path = os.path.join(directory, version)
+    tables = {}
+    for entry in sorted(os.listdir(path)):
+        if entry.endswith(".arrow"):
+            source = pa.memory_map(os.path.join(path, entry), "r")
+            tables[entry[: -len(".arrow")]] = pa.ipc.open_file(source).read_all()
+    return tables
+
+
+# Données d'un panneau lues dans un instantané ouvert par open_snapshot, avec les mesures
+# attendues par PanelProfile.set_query (aucune requête : seule la conversion pandas est mesurée)
+def snapshot_panel(tables, version, name, transform=None):
+    table = tables.get(name)
+    if table is None:
+        return None
+
+    start = time.perf_counter()
+    df = table.to_pandas()
+    result = df if transform is None else transform(df)
+    query_info = {
+        "sql": f"-- Instantané Arrow {version} : {name}.arrow",
+        "loaded_at": time.time(),
+        "rows": table.num_rows,
+        "bytes": table.nbytes,
+        "phases": {"pandas": time.perf_counter() - start},
+        "explain": None,
+    }
+    return result, query_info
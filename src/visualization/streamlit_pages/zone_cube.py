@@ -0,0 +1,62 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+
+# Axes des jours (ISODOW 1 = lundi) et des heures du cube
+CUBE_DAYS = 7
+CUBE_HOURS = 24
+
+
+# Cube dense fournisseur × zone de prise en charge × jour de la semaine × heure construit
+# à partir du résultat (format long) de la requête d'agrégation, en une seule affectation
+def build_zone_cube(df):
+    vendor_ids, vendor_index = np.unique(df["id_vendor"].to_numpy(), return_inverse=True)
+    zone_ids, zone_index = np.unique(df["id_zone"].to_numpy(), return_inverse=True)
+
+    counts = np.zeros((len(vendor_ids), len(zone_ids), CUBE_DAYS, CUBE_HOURS), dtype=np.int32)
+    counts[
+        vendor_index,
+        zone_index,
+        df["jour"].to_numpy() - 1,
+        df["heure"].to_numpy(),
+    ] = df["trajets"].to_numpy()
+
+    # Libellés de chaque indice des axes fournisseur et zone
+    vendors = df.drop_duplicates("id_vendor").set_index("id_vendor")["vendor_name"]
+    zones = df.drop_duplicates("id_zone").set_index("id_zone")
+    return {
+        "counts": counts,
+        "vendors": vendors.reindex(vendor_ids).fillna("Inconnu").to_numpy(dtype=str),
+        "zones": zones["name_zone"].reindex(zone_ids).fillna("Inconnue").to_numpy(dtype=str),
+        "boroughs": zones["borough"].reindex(zone_ids).fillna("Inconnu").to_numpy(dtype=str),
+    }
+
+
+# Sélection d'un arrondissement et/ou d'un fournisseur par indexation du cube (sans requête)
+# Retourne les trajets zone × jour × heure et les noms des zones retenues
+def slice_zone_cube(cube, borough=None, vendor=None):
+    counts = cube["counts"]
+    if vendor is not None:
+        counts = counts[cube["vendors"] == vendor]
+    counts = counts.sum(axis=0)
+    zones = cube["zones"]
+    if borough is not None:
+        mask = cube["boroughs"] == borough
+        counts, zones = counts[mask], zones[mask]
+    return counts, zones
+
+
+# Matrice zone × (jour, heure) des zones les plus fréquentées, la plus chargée en haut
+# (les zones sans trajet dans la sélection sont écartées)
+def top_zone_matrix(counts, zones, top):
+    matrix = counts.reshape(len(zones), CUBE_DAYS * CUBE_HOURS)
+    totals = matrix.sum(axis=1)
+    order = np.argsort(totals)[::-1][:top]
+    order = order[totals[order] > 0]
+    return matrix[order], zones[order]
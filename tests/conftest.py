@@ -0,0 +1,16 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import os
+import sys
+
+# The modules of src/data and src/visualization import their siblings by name, as when they
+# are run from their own directory (python dump_to_sql.py, streamlit run app.py)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("src/data", "src/visualization"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
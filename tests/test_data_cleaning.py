@@ -0,0 +1,72 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import pandas as pd
+from data_cleaning import clean_trips, period_from_file_name
+
+PERIOD = period_from_file_name("yellow_tripdata_2024-01.parquet")
+
+
+def make_trips(rows):
+    return pd.DataFrame(
+        rows,
+        columns=[
+            "tpep_pickup_datetime",
+            "tpep_dropoff_datetime",
+            "trip_distance",
+            "fare_amount",
+            "total_amount",
+        ],
+    ).astype({"tpep_pickup_datetime": "datetime64[ns]", "tpep_dropoff_datetime": "datetime64[ns]"})
+
+
+def test_period_from_file_name():
+    assert PERIOD == (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01"))
+    assert period_from_file_name("yellow_tripdata.parquet") is None
+
+
+def test_clean_trips_reason_codes():
+    trips = make_trips(
+        [
+            ("2024-01-10 08:00", "2024-01-10 08:20", 3.0, 12.0, 15.0),  # clean
+            (None, "2024-01-10 08:20", 3.0, 12.0, 15.0),
+            ("2023-12-20 08:00", "2023-12-20 08:20", 3.0, 12.0, 15.0),
+            ("2024-01-10 08:20", "2024-01-10 08:00", 3.0, 12.0, 15.0),
+            ("2024-01-10 08:00", "2024-01-10 08:20", 0.0, 12.0, 15.0),
+            ("2024-01-10 08:00", "2024-01-10 08:20", 3.0, -12.0, -15.0),
+            ("2024-01-31 23:50", "2024-02-01 00:10", 3.0, 12.0, 15.0),  # within the tolerance
+        ]
+    )
+    clean, rejected, counts = clean_trips(trips, PERIOD)
+
+    assert list(clean.index) == [0, 6]
+    assert list(rejected["reject_reason"]) == [
+        "MISSING_TIMESTAMP",
+        "OUT_OF_RANGE_TIMESTAMP",
+        "DROPOFF_BEFORE_PICKUP",
+        "ZERO_DISTANCE",
+        "NEGATIVE_AMOUNT",
+    ]
+    assert counts["NEGATIVE_AMOUNT"] == 1
+
+
+def test_clean_trips_first_rule_wins():
+    # Zero distance and negative amount: quarantined with the first rule, counted for both
+    trips = make_trips([("2024-01-10 08:00", "2024-01-10 08:20", 0.0, -1.0, -1.0)])
+    _, rejected, counts = clean_trips(trips, PERIOD)
+
+    assert list(rejected["reject_reason"]) == ["ZERO_DISTANCE"]
+    assert counts["ZERO_DISTANCE"] == counts["NEGATIVE_AMOUNT"] == 1
+
+
+def test_clean_trips_selected_rules():
+    trips = make_trips([("2024-01-10 08:00", "2024-01-10 08:20", 0.0, 12.0, 15.0)])
+    clean, rejected, counts = clean_trips(trips, PERIOD, ["MISSING_TIMESTAMP"])
+
+    assert len(clean) == 1 and rejected.empty
+    assert list(counts) == ["MISSING_TIMESTAMP"]
@@ -0,0 +1,77 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import pandas as pd
+import pytest
+import datawarehouse_to_datamart_olap as olap
+
+MONTHS = [
+    (pd.Timestamp(f"2024-{month:02d}-01"), pd.Timestamp(f"2024-{month + 1:02d}-01"))
+    for month in (1, 2, 3)
+]
+
+
+class FakeConnection:
+    def cursor(self):
+        raise AssertionError("no query expected outside the patched functions")
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def checkpoints(monkeypatch):
+    """
+    Replace the database side of build_datamart_chunked, the checkpoints being kept in a set.
+    """
+    recorded = {"2024-01"}
+    loaded = []
+
+    def load_chunk(dm_conn, wh_conn, key_maps, start, end, batch_size, **kwargs):
+        if start in fail_on:
+            raise RuntimeError("connection lost")
+        loaded.append(start.strftime("%Y-%m"))
+        recorded.add(start.strftime("%Y-%m"))
+        return 0, {}
+
+    fail_on = set()
+    monkeypatch.setattr(olap, "connect_to_db", FakeConnection)
+    monkeypatch.setattr(olap, "connect_to_warehouse", FakeConnection)
+    monkeypatch.setattr(olap, "prepare_dimensions", lambda *args: None)
+    monkeypatch.setattr(olap, "load_dimension_key_maps", lambda *args: {})
+    monkeypatch.setattr(olap, "list_warehouse_months", lambda *args: MONTHS)
+    monkeypatch.setattr(olap, "completed_chunks", lambda *args: set(recorded))
+    monkeypatch.setattr(olap, "load_datamart_chunk", load_chunk)
+    return recorded, loaded, fail_on
+
+
+def test_build_skips_completed_chunks(checkpoints):
+    recorded, loaded, _ = checkpoints
+
+    assert olap.build_datamart_chunked()
+    assert loaded == ["2024-02", "2024-03"]
+    assert recorded == {"2024-01", "2024-02", "2024-03"}
+
+
+def test_build_resumes_after_failure(checkpoints):
+    recorded, loaded, fail_on = checkpoints
+
+    fail_on.add(MONTHS[2][0])
+    assert not olap.build_datamart_chunked()
+    assert loaded == ["2024-02"]
+
+    # The next run only loads the month left without checkpoint
+    fail_on.clear()
+    assert olap.build_datamart_chunked()
+    assert loaded == ["2024-02", "2024-03"]
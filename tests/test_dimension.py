@@ -0,0 +1,92 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import pandas as pd
+from dimension import (
+    DEFAULT_VENDOR_NAME,
+    PAYMENT_METHODS,
+    _array_type,
+    payment_members,
+    upsert_dimension,
+    vendor_members,
+)
+
+
+class RecordingCursor:
+    """
+    Cursor recording the statements instead of sending them to PostgreSQL.
+    """
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.rowcount = -1
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+        self.rowcount = len(params[0]) if params else 0
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return RecordingCursor(self.statements)
+
+
+def test_array_type():
+    assert _array_type(pd.Series([1, 2])) == "bigint[]"
+    assert _array_type(pd.Series([1.5])) == "double precision[]"
+    assert _array_type(pd.Series([True])) == "boolean[]"
+    assert _array_type(pd.Series(pd.to_datetime(["2024-01-01"]))) == "timestamp[]"
+    assert _array_type(pd.Series(["a", None])) == "text[]"
+
+
+def test_upsert_dimension_single_statement():
+    conn = RecordingConnection()
+    members = pd.DataFrame({"id_vendor": [1, 2, 1], "vendor_name": ["a", None, "c"]})
+
+    assert upsert_dimension(conn, "dimension_vendor", "id_vendor", members) == 2
+
+    [(query, params)] = conn.statements
+    assert query.startswith(
+        "INSERT INTO dimension_vendor (id_vendor, vendor_name) "
+        "SELECT * FROM unnest(%s::bigint[], %s::text[]) ON CONFLICT (id_vendor) "
+    )
+    assert "DO UPDATE SET vendor_name = EXCLUDED.vendor_name" in query
+    assert "WHERE (dimension_vendor.vendor_name) IS DISTINCT FROM (EXCLUDED.vendor_name)" in query
+    # The last occurrence of a key wins, missing values are shipped as NULL
+    assert params == [[2, 1], [None, "c"]]
+
+
+def test_upsert_dimension_without_scd_columns():
+    conn = RecordingConnection()
+    members = pd.DataFrame({"id_payment_type": [1], "payment_method": ["Cash"]})
+
+    upsert_dimension(conn, "dimension_payment", "id_payment_type", members, scd_columns=[])
+
+    [(query, _)] = conn.statements
+    assert query.endswith("ON CONFLICT (id_payment_type) DO NOTHING")
+
+
+def test_upsert_dimension_empty():
+    conn = RecordingConnection()
+    assert upsert_dimension(conn, "dimension_vendor", "id_vendor", vendor_members([])) == 0
+    assert conn.statements == []
+
+
+def test_members():
+    vendors = vendor_members([2, None, 7, 2])
+    assert list(vendors["id_vendor"]) == [2, 7]
+    assert list(vendors["vendor_name"]) == ["VeriFone Inc.", DEFAULT_VENDOR_NAME]
+
+    payments = payment_members()
+    assert dict(zip(payments["id_payment_type"], payments["payment_method"])) == PAYMENT_METHODS
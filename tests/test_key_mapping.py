@@ -0,0 +1,40 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+from key_mapping import UNKNOWN_KEY, KeyMap, natural_key_values
+
+
+def test_key_map_lookup():
+    key_map = KeyMap(np.array([30, 10, 20]), np.array([3, 1, 2]))
+    values = np.array([20, 10, 99, 30, 5])
+    valid = np.array([True, True, True, True, False])
+
+    keys, missing = key_map.map(values, valid)
+
+    assert len(key_map) == 3
+    assert list(keys) == [2, 1, UNKNOWN_KEY, 3, UNKNOWN_KEY]
+    assert list(missing) == [False, False, True, False, True]
+
+
+def test_empty_key_map():
+    keys, missing = KeyMap(np.array([]), np.array([])).map(np.array([1, 2]), np.ones(2, bool))
+
+    assert list(keys) == [UNKNOWN_KEY, UNKNOWN_KEY]
+    assert missing.all()
+
+
+def test_natural_key_values():
+    values, valid = natural_key_values(pd.Series([1.0, None, 3.0]))
+    assert list(values) == [1, 0, 3]
+    assert list(valid) == [True, False, True]
+
+    epochs, valid = natural_key_values(pd.Series(pd.to_datetime(["1970-01-01 00:01", None])))
+    assert epochs[0] == 60
+    assert list(valid) == [True, False]
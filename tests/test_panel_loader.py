@@ -0,0 +1,36 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+from streamlit_pages.panel_loader import (
+    APPROXIMATE_PANELS,
+    FACT_SOURCES,
+    approximate_query,
+    panel_query,
+)
+
+
+def test_approximate_query():
+    query = approximate_query("zones_prise_en_charge", 0.01, seed=7)
+
+    assert "TABLESAMPLE SYSTEM (1.000000) REPEATABLE (7)" in query
+    assert "GROUP BY (ctid::text::point)[0], id_zone_pickup" in query
+    assert "(e.sn / 0.01)::int8 AS trajets" in query
+    assert "LEFT JOIN dimension_zone d ON e.cle = d.id_zone" in query
+    assert "LIMIT 10" in query
+
+
+def test_approximate_query_without_limit():
+    name = next(name for name, panel in APPROXIMATE_PANELS.items() if panel[-1] is None)
+    assert "LIMIT" not in approximate_query(name, 0.1)
+
+
+def test_panel_query():
+    assert panel_query("zones_depot", fraction=0.05) == approximate_query("zones_depot", 0.05)
+    assert panel_query("indicateurs", fraction=0.05) == FACT_SOURCES["star"]["indicateurs"]
+    assert panel_query("fournisseurs", source="wide") == FACT_SOURCES["wide"]["fournisseurs"]
+
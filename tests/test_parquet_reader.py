@@ -0,0 +1,76 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import io
+import math
+import pyarrow as pa
+import pyarrow.parquet as pq
+from parquet_reader import iter_trip_batches, read_trip_parquet, trip_table_to_pandas
+
+
+def parquet_bytes(table: pa.Table) -> io.BytesIO:
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_schema_drift_renames_and_missing_columns():
+    # Older file: other names and case, no airport_fee, an extra column
+    source = parquet_bytes(
+        pa.table(
+            {
+                "VendorID": pa.array([1, 2], pa.int64()),
+                "Trip_Pickup_DateTime": pa.array([0, 60_000_000_000], pa.timestamp("ns")),
+                "Fare_Amt": pa.array([10.5, 20.25], pa.float64()),
+                "store_and_fwd_flag": ["N", "Y"],
+            }
+        )
+    )
+    table = read_trip_parquet(source)
+
+    assert table.schema.field("vendorid").type == pa.int8()
+    assert table.schema.field("tpep_pickup_datetime").type == pa.timestamp("us")
+    assert table.column("fare_amount").to_pylist() == [10.5, 20.25]
+    assert table.column("airport_fee").null_count == 2
+    assert "store_and_fwd_flag" not in table.column_names
+
+
+def test_column_projection():
+    source = parquet_bytes(pa.table({"VendorID": [1], "trip_distance": [2.0]}))
+    table = read_trip_parquet(source, columns=["trip_distance"])
+
+    assert table.column_names == ["trip_distance"]
+
+
+def test_float_counts_become_integers():
+    source = parquet_bytes(pa.table({"passenger_count": [1.0, 2.0, None]}))
+    frame = trip_table_to_pandas(read_trip_parquet(source, columns=["passenger_count"]))
+
+    assert str(frame["passenger_count"].dtype) == "Int8"
+    assert frame["passenger_count"].tolist()[:2] == [1, 2]
+
+
+def test_out_of_range_values_are_nulled():
+    source = parquet_bytes(
+        pa.table(
+            {
+                "passenger_count": [1.0, 300.0, math.nan, -1.0],
+                "PULocationID": pa.array([132, 70_000, 1, 40_000], pa.int64()),
+                "total_amount": [12.5, 1e300, 3.0, -math.inf],
+            }
+        )
+    )
+    columns = ["passenger_count", "pulocationid", "total_amount"]
+    batches = list(iter_trip_batches(source, 2, columns=columns))
+    table = pa.concat_tables(batches)
+
+    # Wrapped by an unchecked cast, 300 would become 44 and 70000 would become 4464
+    assert table.column("passenger_count").to_pylist() == [1, None, None, -1]
+    assert table.column("pulocationid").to_pylist() == [132, None, 1, None]
+    assert table.column("total_amount").to_pylist() == [12.5, None, 3.0, None]
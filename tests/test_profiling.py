@@ -0,0 +1,96 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+from profiling import (
+    HyperLogLog,
+    TDigest,
+    baseline_profile,
+    compare_profiles,
+    sketch_from_bytes,
+    sketch_to_bytes,
+)
+
+
+def test_tdigest_quantiles():
+    values = np.random.default_rng(0).random(100_000)
+    digest = TDigest()
+    for chunk in np.array_split(values, 10):
+        digest.update(chunk)
+
+    assert digest.count() == len(values)
+    assert len(digest.means) < 1_000
+    for q in (0.01, 0.5, 0.9, 0.99):
+        assert abs(digest.quantile(q) - np.quantile(values, q)) < 0.01
+
+
+def test_tdigest_merge_and_serialization():
+    left, right = TDigest(), TDigest()
+    left.update(np.arange(0, 5_000))
+    right.update(np.arange(5_000, 10_000))
+    left.merge(right)
+
+    restored = sketch_from_bytes("tdigest", sketch_to_bytes(left))
+
+    assert restored.count() == 10_000
+    assert abs(restored.quantile(0.5) - 5_000) < 100
+
+
+def test_hyperloglog_distinct_count():
+    sketch = HyperLogLog()
+    sketch.update(np.arange(50_000) % 20_000)
+
+    # Standard error 1.04 / sqrt(4096), about 1.6 %
+    assert abs(sketch.count() - 20_000) < 20_000 * 0.05
+
+
+def test_hyperloglog_merge():
+    left, right = HyperLogLog(), HyperLogLog()
+    left.update(np.arange(0, 1_000))
+    right.update(np.arange(500, 1_500))
+    left.merge(right)
+
+    restored = sketch_from_bytes("hll", sketch_to_bytes(left))
+
+    assert abs(restored.count() - 1_500) < 1_500 * 0.05
+
+
+def test_distinct_baseline_is_the_mean_of_the_months():
+    # Three months of 10 000 distinct ids each, disjoint: their union holds 30 000
+    months = []
+    for month in range(3):
+        sketch = HyperLogLog()
+        sketch.update(np.arange(month * 10_000, (month + 1) * 10_000))
+        months.append({("id_zone_pickup", "hll"): sketch})
+    baseline, distinct_counts = baseline_profile(months)
+
+    assert ("id_zone_pickup", "hll") not in baseline
+    assert abs(distinct_counts[("id_zone_pickup", "hll")] - 10_000) < 10_000 * 0.05
+
+    current = HyperLogLog()
+    current.update(np.arange(90_000, 100_000))
+    assert compare_profiles({("id_zone_pickup", "hll"): current}, baseline, distinct_counts) == []
+
+    current.update(np.arange(100_000, 120_000))
+    assert compare_profiles({("id_zone_pickup", "hll"): current}, baseline, distinct_counts)
+
+
+def test_quantile_drift_against_merged_baseline():
+    months = []
+    for _ in range(3):
+        digest = TDigest()
+        digest.update(np.arange(1, 1_001, dtype=float))
+        months.append({("fare_amount", "tdigest"): digest})
+    baseline, _ = baseline_profile(months)
+
+    shifted = TDigest()
+    shifted.update(np.arange(1, 1_001, dtype=float) * 2)
+    alerts = compare_profiles({("fare_amount", "tdigest"): shifted}, baseline)
+
+    assert baseline[("fare_amount", "tdigest")].count() == 3_000
+    assert alerts and alerts[0].startswith("fare_amount: p50")
@@ -0,0 +1,47 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import numpy as np
+import pandas as pd
+from trip_dedup import TripHashIndex, drop_duplicate_trips
+
+
+def test_trip_hash_index():
+    index = TripHashIndex(np.array([5, 1, 5], dtype=np.uint64))
+    index.add(np.array([3, 1, 9], dtype=np.uint64))
+
+    assert len(index) == 4
+    assert list(index.hashes) == [1, 3, 5, 9]
+    assert list(index.contains(np.array([9, 2, 1, 10], dtype=np.uint64))) == [
+        True,
+        False,
+        True,
+        False,
+    ]
+    assert not TripHashIndex().contains(np.array([1], dtype=np.uint64)).any()
+
+
+def test_drop_duplicate_trips_across_batches():
+    seen = TripHashIndex()
+    batch = pd.DataFrame({"a": [1, 1, 2], "b": [1, 1, 2]})
+
+    kept, duplicates = drop_duplicate_trips(batch, ["a", "b"], seen)
+    assert list(kept.index) == [0, 2] and duplicates == 1
+
+    kept, duplicates = drop_duplicate_trips(batch, ["a", "b"], seen)
+    assert kept.empty and duplicates == 3
+
+
+def test_drop_duplicate_trips_keeps_null_keys():
+    seen = TripHashIndex()
+    batch = pd.DataFrame({"a": [None, None, 1.0], "b": [1, 1, 1]})
+
+    kept, duplicates = drop_duplicate_trips(batch, ["a", "b"], seen)
+
+    assert list(kept.index) == [0, 1, 2] and duplicates == 0
+    assert len(seen) == 1
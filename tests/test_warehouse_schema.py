@@ -0,0 +1,96 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import datetime
+import pandas as pd
+import pytest
+from warehouse_schema import replaced_rows, swap_warehouse_month, validate_staging
+
+PERIOD = (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01"))
+
+
+class RecordingCursor:
+    """
+    Cursor recording the statements, each fetchone() returning the next of the given rows.
+    """
+
+    def __init__(self, *rows):
+        self.rows = list(rows)
+        self.statements = []
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+
+def test_validate_staging():
+    cursor = RecordingCursor((10,))
+
+    validate_staging(cursor, "warehouse", "warehouse_staging_2024_01", PERIOD, 10)
+
+    assert cursor.statements[0] == "SELECT COUNT(*) FROM warehouse_staging_2024_01"
+    assert "ADD CONSTRAINT warehouse_2024_01_pickup_check" in cursor.statements[1]
+    assert "ADD CONSTRAINT warehouse_2024_01_month_check" in cursor.statements[2]
+
+
+def test_validate_staging_row_count_mismatch():
+    cursor = RecordingCursor((9,))
+
+    with pytest.raises(ValueError, match="holds 9 rows, 10 were copied"):
+        validate_staging(cursor, "warehouse", "warehouse_staging_2024_01", PERIOD, 10)
+    assert len(cursor.statements) == 1
+
+
+def test_swap_partitioned_month():
+    cursor = RecordingCursor((1,))
+
+    swap_warehouse_month(cursor, "warehouse", "warehouse_staging_2024_01", PERIOD, True)
+
+    assert cursor.statements[1:] == [
+        "ALTER TABLE warehouse DETACH PARTITION warehouse_2024_01",
+        "DROP TABLE warehouse_2024_01",
+        "ALTER TABLE warehouse_staging_2024_01 SET LOGGED",
+        "ALTER TABLE warehouse_staging_2024_01 RENAME TO warehouse_2024_01",
+        "ALTER TABLE warehouse ATTACH PARTITION warehouse_2024_01 FOR VALUES IN (%s)",
+    ]
+
+
+def test_swap_first_load_of_partitioned_month():
+    cursor = RecordingCursor(None)
+
+    swap_warehouse_month(cursor, "warehouse", "warehouse_staging_2024_01", PERIOD, True)
+
+    assert not any("DETACH" in query or "DROP" in query for query in cursor.statements)
+    assert cursor.statements[-1].startswith("ALTER TABLE warehouse ATTACH PARTITION")
+
+
+def test_swap_legacy_table():
+    cursor = RecordingCursor()
+
+    swap_warehouse_month(cursor, "warehouse", "warehouse_staging_2024_01", PERIOD, False)
+
+    condition, _ = replaced_rows(PERIOD, False)
+    assert cursor.statements == [
+        f"DELETE FROM warehouse WHERE {condition}",
+        "INSERT INTO warehouse SELECT * FROM warehouse_staging_2024_01",
+        "DROP TABLE warehouse_staging_2024_01",
+    ]
+
+
+def test_replaced_rows():
+    assert replaced_rows(PERIOD, True, alias="t") == (
+        "t.source_month = %s",
+        (datetime.date(2024, 1, 1),),
+    )
+
+    condition, params = replaced_rows(PERIOD, False)
+    assert "source_month IS NULL" in condition
+    assert params[0] == datetime.date(2024, 1, 1)
+    assert params[1] < PERIOD[0] and params[2] > PERIOD[1]
@@ -0,0 +1,61 @@
+"""
+***********************************************************************
+************** Author:   Christian KEMGANG NGUESSOP *******************
+************** Project:   datamart                  *******************
+************** Version:  1.0.0                      *******************
+***********************************************************************
+"""
+
+import pandas as pd
+from streamlit_pages.zone_cube import (
+    CUBE_DAYS,
+    CUBE_HOURS,
+    build_zone_cube,
+    slice_zone_cube,
+    top_zone_matrix,
+)
+
+ROWS = pd.DataFrame(
+    {
+        "id_vendor": [1, 1, 2, 2],
+        "vendor_name": ["A", "A", "B", "B"],
+        "id_zone": [10, 20, 10, 30],
+        "name_zone": ["Z10", "Z20", "Z10", "Z30"],
+        "borough": ["Manhattan", "Queens", "Manhattan", "Manhattan"],
+        "jour": [1, 7, 1, 3],
+        "heure": [0, 23, 0, 12],
+        "trajets": [5, 2, 4, 1],
+    }
+)
+
+
+def test_build_zone_cube():
+    cube = build_zone_cube(ROWS)
+
+    assert cube["counts"].shape == (2, 3, CUBE_DAYS, CUBE_HOURS)
+    assert list(cube["vendors"]) == ["A", "B"]
+    assert list(cube["zones"]) == ["Z10", "Z20", "Z30"]
+    assert cube["counts"][0, 1, 6, 23] == 2
+    assert cube["counts"].sum() == ROWS["trajets"].sum()
+
+
+def test_slice_zone_cube():
+    cube = build_zone_cube(ROWS)
+
+    counts, zones = slice_zone_cube(cube, borough="Manhattan")
+    assert list(zones) == ["Z10", "Z30"]
+    assert counts[0, 0, 0] == 9
+
+    counts, zones = slice_zone_cube(cube, vendor="B")
+    assert counts.sum() == 5 and len(zones) == 3
+
+
+def test_top_zone_matrix():
+    counts, zones = slice_zone_cube(build_zone_cube(ROWS), vendor="A")
+    matrix, top_zones = top_zone_matrix(counts, zones, top=5)
+
+    # Busiest zone first, Z30 has no trip of vendor A
+    assert list(top_zones) == ["Z10", "Z20"]
+    assert matrix.shape == (2, CUBE_DAYS * CUBE_HOURS)
+    assert list(matrix.sum(axis=1)) == [5, 2]
+    assert len(top_zone_matrix(counts, zones, top=1)[1]) == 1